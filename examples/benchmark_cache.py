@@ -0,0 +1,63 @@
+import time
+import numpy as np
+from haltere_forces import waveform
+from haltere_forces.halteres import Halteres
+from parameters import drosophila_param
+from parameters import calliphora_param
+
+# Compares the cost of repeatedly accessing the Halteres kinematics and forces
+# with the kinematics and waveform caches cleared before every call (i.e.
+# recomputed from scratch) and with the caches kept warm. Then compares a
+# sweep over the haltere length, with a new Halteres instance per length,
+# with and without the filtered_triangle waveform cache.
+
+num_repeat = 20
+omega = np.deg2rad(np.array([300.0, 0.0, 0.0]))
+
+def time_call(hsim, func, clear_cache):
+    func(hsim)
+    t0 = time.perf_counter()
+    for i in range(num_repeat):
+        if clear_cache:
+            hsim.clear_cache()
+            waveform.cache_clear()
+        func(hsim)
+    t1 = time.perf_counter()
+    return (t1 - t0)/num_repeat
+
+calls = {
+        'kinematics' : lambda hsim: hsim.kinematics,
+        'force'      : lambda hsim: hsim.force(omega),
+        }
+
+print()
+print(f'{"preset":<12} {"call":<11} {"num_pt":>8} {"uncached (ms)":>14} {"cached (ms)":>12} {"speedup":>8}')
+for name, param in [('drosophila', drosophila_param), ('calliphora', calliphora_param)]:
+    for call_name, func in calls.items():
+        for num_pt in (1000, 10000, 100000):
+            hsim = Halteres(param={**param, 'num_pt': num_pt})
+            dt_uncached = time_call(hsim, func, clear_cache=True)
+            dt_cached = time_call(hsim, func, clear_cache=False)
+            speedup = dt_uncached/dt_cached
+            print(f'{name:<12} {call_name:<11} {num_pt:>8} {1e3*dt_uncached:>14.3f} {1e3*dt_cached:>12.3f} {speedup:>8.1f}')
+print()
+
+def length_sweep(param, num_pt):
+    t0 = time.perf_counter()
+    for length in np.linspace(1.0e-4, 5.0e-4, num_repeat):
+        hsim = Halteres(param={**param, 'num_pt': num_pt, 'length': length})
+        hsim.force(omega)
+    t1 = time.perf_counter()
+    return (t1 - t0)/num_repeat
+
+print(f'{"preset":<12} {"call":<11} {"num_pt":>8} {"no cache (ms)":>14} {"cache (ms)":>12} {"speedup":>8}')
+for name, param in [('drosophila', drosophila_param), ('calliphora', calliphora_param)]:
+    for num_pt in (1000, 10000, 100000):
+        waveform.set_cache_size(0)
+        dt_uncached = length_sweep(param, num_pt)
+        waveform.set_cache_size(waveform.FILTERED_TRIANGLE_CACHE_SIZE)
+        dt_cached = length_sweep(param, num_pt)
+        speedup = dt_uncached/dt_cached
+        print(f'{name:<12} {"length":<11} {num_pt:>8} {1e3*dt_uncached:>14.3f} {1e3*dt_cached:>12.3f} {speedup:>8.1f}')
+print(waveform.cache_info())
+print()
@@ -0,0 +1,57 @@
+import time
+import tracemalloc
+import numpy as np
+from haltere_forces.halteres import Halteres
+from haltere_forces.halteres import calc_haltere_force
+from parameters import drosophila_param as param
+
+# Measures the runtime and peak memory of calc_haltere_force at N = 1e6 for
+# constant and time-varying body rotations, with and without the optional
+# angular and linear acceleration terms, and when computing only the lateral
+# coriolis force into a preallocated output buffer.
+
+num_pt = 1_000_000
+num_repeat = 3
+
+hsim = Halteres(param={**param, 'num_pt': num_pt})
+kinematics = (
+        param['mass'],
+        hsim.pos_left,
+        hsim.vel_left,
+        hsim.acc_left,
+        hsim.axis_left,
+        hsim.lat_proj_axis_left,
+        )
+
+omega = np.deg2rad(np.array([300.0, 200.0, 100.0]))
+omega_t = np.outer(np.sin(2*np.pi*hsim.t), omega)
+cases = {
+        'constant omega'                 : (omega, None, None),
+        'constant omega, domega, lin_acc': (omega, omega, np.array([0.0, 0.0, 1.0])),
+        'time-varying omega'             : (omega_t, None, None),
+        'time-varying omega, domega'     : (omega_t, omega_t, None),
+        }
+selected = {
+        'components'  : ('coriolis',), 
+        'projections' : ('lateral',), 
+        'vectors'     : False, 
+        'out'         : {'lateral': {'coriolis': np.empty(num_pt)}},
+        }
+
+print()
+print(f'{"case":<34} {"selection":<9} {"time (ms)":>10} {"peak memory (MB)":>17}')
+for name, (omega_, domega_, lin_acc_) in cases.items():
+    for selection, options in (('all', {}), ('lateral', selected)):
+        dt = np.inf
+        for i in range(num_repeat):
+            t0 = time.perf_counter()
+            calc_haltere_force(*kinematics, omega_, domega_, lin_acc_, **options)
+            t1 = time.perf_counter()
+            dt = min(dt, t1 - t0)
+        tracemalloc.start()
+        force = calc_haltere_force(*kinematics, omega_, domega_, lin_acc_, **options)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del force
+        print(f'{name:<34} {selection:<9} {1e3*dt:>10.1f} {peak/1e6:>17.1f}')
+print()
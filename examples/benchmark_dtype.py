@@ -0,0 +1,81 @@
+import time
+import tracemalloc
+import numpy as np
+from haltere_forces.halteres import Halteres
+from parameters import drosophila_param as param
+
+# Compares single (np.float32) with double precision haltere forces. For the
+# 'gradient' and 'analytic' kinematics reports the maximum error of the
+# single precision forces relative to the largest double precision value of
+# each, and the best time and peak memory (tracemalloc) of computing the
+# kinematics and forces from scratch, and of a batch of constant rotations
+# (lateral coriolis projections only, as for sweeps).
+
+num_repeat = 3
+omega = np.deg2rad(np.array([300.0, 200.0, 100.0]))
+domega = np.array([10.0, -5.0, 2.0])
+rng = np.random.default_rng(0)
+omega_batch = np.deg2rad(rng.uniform(-500.0, 500.0, (64, 3)))
+batch_options = {
+        'batch'       : True, 
+        'components'  : ('coriolis',), 
+        'projections' : ('lateral',), 
+        'vectors'     : False,
+        }
+
+
+def measure(func):
+    dt = np.inf
+    for i in range(num_repeat):
+        t0 = time.perf_counter()
+        func()
+        t1 = time.perf_counter()
+        dt = min(dt, t1 - t0)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dt, peak
+
+
+def rel_error(force32, force64):
+    """ Maximum relative errors of the total and lateral coriolis forces """
+    err = {}
+    for name, get in (
+            ('total', lambda f: f['left']['total']),
+            ('radial total', lambda f: f['left']['radial']['total']),
+            ('lateral total', lambda f: f['left']['lateral']['total']),
+            ('lateral coriolis', lambda f: f['left']['lateral']['coriolis']),
+            ):
+        a, b = get(force32), get(force64)
+        err[name] = np.abs(a - b).max()/np.abs(b).max()
+    return err
+
+
+for kinematics in ('gradient', 'analytic'):
+    print()
+    print(f'{kinematics} kinematics')
+    print(f'{"num_pt":>9} {"dtype":>8} {"force (ms)":>11} {"peak (MB)":>10} '
+            f'{"batch (ms)":>11} {"peak (MB)":>10}   max relative error')
+    for num_pt in (10_000, 100_000, 1_000_000):
+        force = {}
+        for dtype in (np.float64, np.float32):
+            hsim = Halteres(param={**param, 'num_pt': num_pt, 
+                'kinematics': kinematics, 'dtype': dtype})
+            def single():
+                hsim.clear_cache()
+                return hsim.force(omega, domega)
+            dt_single, peak_single = measure(single)
+            force[dtype] = single()
+            batch_pt = min(num_pt, 100_000)
+            hsim_batch = Halteres(param={**param, 'num_pt': batch_pt, 
+                'kinematics': kinematics, 'dtype': dtype})
+            hsim_batch.kinematics
+            dt_batch, peak_batch = measure(lambda: hsim_batch.force(omega_batch, **batch_options))
+            line = (f'{num_pt:>9} {np.dtype(dtype).name:>8} {1e3*dt_single:>11.2f} '
+                    f'{peak_single/1e6:>10.1f} {1e3*dt_batch:>11.2f} {peak_batch/1e6:>10.1f}')
+            if dtype is np.float32:
+                err = rel_error(force[np.float32], force[np.float64])
+                line += '   ' + ', '.join(f'{k} {v:.1e}' for k, v in err.items())
+            print(line, flush=True)
+print()
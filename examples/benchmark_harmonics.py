@@ -0,0 +1,71 @@
+import time
+import tracemalloc
+import numpy as np
+from haltere_forces.halteres import Halteres
+from haltere_forces import harmonics
+from parameters import drosophila_param as param
+
+# Compares reducing the lateral coriolis forces of a long simulation, for a
+# batch of body angular velocities, to the amplitude and phase of the first
+# few harmonics of each stroke cycle by computing the full force traces and
+# demodulating them with an FFT, with the streaming demodulation of
+# harmonics.force_harmonics. Each is timed from scratch, kinematics included.
+# Reports the time, the peak memory (tracemalloc), the size of the output and
+# the maximum difference of the coefficients.
+
+num_harmonic = 3
+samples_per_cycle = 500
+rng = np.random.default_rng(0)
+omega = np.deg2rad(rng.uniform(-500.0, 500.0, (8, 3)))
+options = {
+        'batch'       : True,
+        'components'  : ('coriolis',),
+        'projections' : ('lateral',),
+        }
+
+
+def fft_harmonics(hsim):
+    force = hsim.force(omega, vectors=False, **options)
+    num_cycle = hsim.param['num_cycle']
+    coef = {}
+    for side in ('left', 'right'):
+        x = force[side]['lateral']['coriolis'][...,:-1]
+        x = x.reshape(x.shape[:-1] + (num_cycle, samples_per_cycle))
+        c = np.fft.rfft(x, axis=-1)[...,:num_harmonic + 1]/samples_per_cycle
+        c[...,1:] *= 2.0
+        coef[side] = c
+    return coef
+
+
+def streaming_harmonics(hsim):
+    coef = harmonics.force_harmonics(hsim, omega, num_harmonic=num_harmonic, **options)
+    return {side: coef[side]['lateral']['coriolis'] for side in coef}
+
+
+def measure(func, param):
+    t0 = time.perf_counter()
+    func(Halteres(param=param))
+    dt = time.perf_counter() - t0
+    tracemalloc.start()
+    coef = func(Halteres(param=param))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dt, peak, coef
+
+
+print()
+print(f'{"num_cycle":>10} {"num_pt":>9} {"method":<10} {"time (ms)":>10} '
+        f'{"peak (MB)":>10} {"output (kB)":>12} {"max rel diff":>13}')
+for num_cycle in (10, 100, 1000, 4000):
+    num_pt = num_cycle*samples_per_cycle + 1
+    case_param = {**param, 'num_pt': num_pt, 'num_cycle': num_cycle, 'kinematics': 'analytic'}
+    results = {}
+    for name, func in (('fft', fft_harmonics), ('streaming', streaming_harmonics)):
+        dt, peak, coef = measure(func, case_param)
+        results[name] = coef
+        diff = max(np.abs(coef[s] - results['fft'][s]).max()/np.abs(results['fft'][s]).max() 
+                for s in coef)
+        output = sum(c.nbytes for c in coef.values())
+        print(f'{num_cycle:>10} {num_pt:>9} {name:<10} {1e3*dt:>10.1f} '
+                f'{peak/1e6:>10.1f} {output/1e3:>12.1f} {diff:>13.1e}', flush=True)
+print()
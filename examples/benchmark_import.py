@@ -0,0 +1,34 @@
+import sys
+import subprocess
+import numpy as np
+
+# Measures the cold start cost of importing the package modules, each in a
+# fresh interpreter, and which of the heavy optional dependencies they load.
+
+modules = ['haltere_forces', 'haltere_forces.halteres', 'haltere_forces.waveform']
+heavy = ['scipy.signal', 'scipy.constants', 'sympy', 'quaternionic', 'numba']
+num_repeat = 7
+
+script = """
+import sys, time
+t0 = time.perf_counter()
+import {module}
+t1 = time.perf_counter()
+loaded = [m for m in {heavy} if m in sys.modules]
+print(t1 - t0, ','.join(loaded))
+"""
+
+print()
+print(f'{"module":<26} {"median (ms)":>12} {"min (ms)":>9}  heavy dependencies loaded')
+for module in modules:
+    times = []
+    for i in range(num_repeat):
+        result = subprocess.run(
+                [sys.executable, '-c', script.format(module=module, heavy=heavy)],
+                capture_output=True, text=True, check=True,
+                )
+        dt, loaded = result.stdout.split(' ', 1)
+        times.append(float(dt))
+    loaded = loaded.strip() or 'none'
+    print(f'{module:<26} {1e3*np.median(times):>12.1f} {1e3*min(times):>9.1f}  {loaded}')
+print()
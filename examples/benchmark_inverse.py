@@ -0,0 +1,38 @@
+import time
+import numpy as np
+from haltere_forces.halteres import Halteres
+from haltere_forces.inverse import Decoder
+from parameters import drosophila_param as param
+
+# Decodes batches of lateral haltere force traces, computed for random
+# constant body angular velocities, back to omega. Reports the decode rate
+# and the maximum error relative to the largest angular velocity, with and
+# without estimating the angular acceleration.
+
+num_repeat = 3
+rng = np.random.default_rng(0)
+hsim = Halteres(param=dict(param))
+
+print()
+print(f'{"num_trace":>10} {"domega":>7} {"setup (ms)":>11} {"decode (ms)":>12} '
+        f'{"decodes/s":>10} {"max rel err":>12}')
+for num_trace in (10, 100, 1000, 5000):
+    omega = np.deg2rad(rng.uniform(-500.0, 500.0, (num_trace, 3)))
+    force = hsim.force(omega, batch=True, components=('total',), 
+            projections=('lateral',), vectors=False)
+    force_left = force['left']['lateral']['total']
+    force_right = force['right']['lateral']['total']
+    for domega in (False, True):
+        t0 = time.perf_counter()
+        decoder = Decoder(hsim, domega=domega)
+        t_setup = time.perf_counter() - t0
+        dt = np.inf
+        for i in range(num_repeat):
+            t0 = time.perf_counter()
+            estimate = decoder.decode(force_left, force_right)
+            t1 = time.perf_counter()
+            dt = min(dt, t1 - t0)
+        err = np.abs(estimate['omega'] - omega[:,np.newaxis,:]).max()/np.abs(omega).max()
+        print(f'{num_trace:>10} {str(domega):>7} {1e3*t_setup:>11.2f} {1e3*dt:>12.2f} '
+                f'{num_trace/dt:>10.0f} {err:>12.1e}')
+print()
@@ -0,0 +1,40 @@
+import time
+import numpy as np
+from haltere_forces.halteres import Halteres
+from haltere_forces import kernels
+from parameters import drosophila_param as param
+
+# Compares the time to compute the haltere forces from scratch (kinematics
+# included) with the quaternion + gradient pipeline, the analytic kinematics
+# and the generated closed form kernels, for all outputs and for the lateral
+# projections only.
+
+num_repeat = 3
+omega = np.deg2rad(np.array([300.0, 200.0, 100.0]))
+domega = np.array([10.0, -5.0, 2.0])
+lateral = {'projections': ('lateral',), 'vectors': False}
+
+cases = {
+        'quaternion + gradient' : ({'rotation': 'quaternion'}, lambda h: h.force(omega, domega)),
+        'analytic'              : ({'kinematics': 'analytic'}, lambda h: h.force(omega, domega)),
+        'kernel'                : ({'kinematics': 'analytic'}, lambda h: h.kernel_force(omega, domega)),
+        'analytic, lateral'     : ({'kinematics': 'analytic'}, lambda h: h.force(omega, domega, **lateral)),
+        'kernel, lateral'       : ({'kinematics': 'analytic'}, 
+            lambda h: h.kernel_force(omega, domega, lateral_only=True)),
+        }
+
+kernels.load_kernels()
+print()
+print(f'{"num_pt":>8} {"method":<22} {"time (ms)":>10}')
+for num_pt in (10_000, 100_000, 1_000_000):
+    for name, (options, func) in cases.items():
+        hsim = Halteres(param={**param, 'num_pt': num_pt, **options})
+        dt = np.inf
+        for i in range(num_repeat):
+            hsim.clear_cache()
+            t0 = time.perf_counter()
+            func(hsim)
+            t1 = time.perf_counter()
+            dt = min(dt, t1 - t0)
+        print(f'{num_pt:>8} {name:<22} {1e3*dt:>10.2f}')
+print()
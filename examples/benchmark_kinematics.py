@@ -0,0 +1,30 @@
+import time
+import numpy as np
+from haltere_forces.halteres import Halteres
+from parameters import drosophila_param as param
+
+# Compares the accuracy and cost of the lateral Coriolis force computed with
+# the 'gradient' and 'analytic' kinematics modes as a function of the number
+# of sample points. The reference is the analytic mode at high resolution.
+
+omega = np.deg2rad(np.array([300.0, 200.0, 100.0]))
+num_pt_list = [51, 101, 201, 1001, 10001, 100001]
+
+def coriolis(num_pt, mode):
+    hsim = Halteres(param={**param, 'num_pt': num_pt, 'kinematics': mode})
+    t0 = time.perf_counter()
+    force = hsim.force(omega)
+    t1 = time.perf_counter()
+    return hsim.t, force['left']['lateral']['coriolis'], t1 - t0
+
+t_ref, f_ref, _ = coriolis(400001, 'analytic')
+
+print()
+print(f'{"num_pt":>8} {"mode":<10} {"max rel error":>14} {"time (ms)":>10}')
+for num_pt in num_pt_list:
+    for mode in ('gradient', 'analytic'):
+        t, f, dt = coriolis(num_pt, mode)
+        f_interp = np.interp(t, t_ref, f_ref)
+        err = np.absolute(f - f_interp).max()/np.absolute(f_ref).max()
+        print(f'{num_pt:>8} {mode:<10} {err:>14.2e} {1e3*dt:>10.3f}')
+print()
@@ -0,0 +1,65 @@
+import time
+import numpy as np
+from haltere_forces.measured import MeasuredWaveform
+
+# Fits smoothing splines to batches of measured haltere angle traces, with
+# jittered frame times, 5% dropped frames and tracking noise, as a single
+# vectorized MeasuredWaveform and trial by trial. Reports the fit times, the
+# time to evaluate the angles and derivatives of all trials at 1000 times,
+# and the errors of the angular accelerations compared with second central
+# differences (np.gradient) of the raw frames.
+
+frequency = 200.0
+sample_rate = 20000.0
+num_frame = 1000
+cutoff_freq = 1000.0
+noise = np.deg2rad(0.2)
+amplitude = np.deg2rad(80.0)
+rng = np.random.default_rng(0)
+
+
+def make_trials(num_trial):
+    t = np.arange(num_frame)/sample_rate
+    t = t + rng.uniform(-0.1, 0.1, (num_trial, num_frame))/sample_rate
+    phase = rng.uniform(0.0, 2.0*np.pi, (num_trial, 1))
+    angle = amplitude*np.sin(2.0*np.pi*frequency*t + phase)
+    angle += noise*rng.standard_normal(angle.shape)
+    angle[rng.random(angle.shape) < 0.05] = np.nan
+    return t, angle, phase
+
+
+def acc_error(ddx, t, phase):
+    w = 2.0*np.pi*frequency
+    exact = -w**2*amplitude*np.sin(w*t + phase)
+    return np.nanmax(np.abs(ddx - exact))/(w**2*amplitude)
+
+
+print()
+print(f'{"trials":>7} {"batch fit (ms)":>15} {"loop fit (ms)":>14} {"speedup":>8} '
+        f'{"eval (ms)":>10} {"spline acc err":>15} {"gradient acc err":>17}')
+for num_trial in (10, 100, 1000, 4000):
+    t, angle, phase = make_trials(num_trial)
+
+    t0 = time.perf_counter()
+    measured = MeasuredWaveform(t, angle, cutoff_freq)
+    t1 = time.perf_counter()
+    num_loop = min(num_trial, 100)
+    for i in range(num_loop):
+        MeasuredWaveform(t[i], angle[i], cutoff_freq)
+    t2 = time.perf_counter()
+    t_eval = np.linspace(0.005, 0.045, 1000)
+    _, _, ddx = measured(t_eval)
+    t3 = time.perf_counter()
+
+    batch_time = t1 - t0
+    loop_time = (t2 - t1)*num_trial/num_loop
+    spline_err = acc_error(ddx, t_eval, phase)
+
+    # Second differences of the frames, ignoring those next to dropped frames
+    ddx_grad = np.gradient(np.gradient(angle, axis=1), axis=1)*sample_rate**2
+    gradient_err = acc_error(ddx_grad[:,10:-10], t[:,10:-10], phase)
+
+    print(f'{num_trial:>7} {1e3*batch_time:>15.1f} {1e3*loop_time:>14.1f} '
+            f'{loop_time/batch_time:>8.1f} {1e3*(t3 - t2):>10.1f} '
+            f'{spline_err:>15.2e} {gradient_err:>17.2e}')
+print()
@@ -0,0 +1,42 @@
+import time
+import tracemalloc
+import numpy as np
+from haltere_forces import waveform
+
+# Compares the 'filtfilt' and 'periodic' filter methods of filtered_triangle:
+# runtime and peak memory as the number of cycles grows with a fixed number
+# of points per period, and the error at the ends of the trace relative to
+# the periodic steady state for decreasing filter cutoff frequencies.
+
+frequency = 200.0
+period = 1.0/frequency
+amplitude = np.deg2rad(90.0)
+pts_per_period = 1000
+
+def run(num_cycle, method, cutoff_freq=2*frequency):
+    waveform.cache_clear()
+    num_pt = num_cycle*pts_per_period + 1
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    _, x = waveform.filtered_triangle(num_pt, num_cycle, amplitude, period, 
+            cutoff_frequency=cutoff_freq, method=method)
+    t1 = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return x, t1 - t0, peak
+
+print()
+print(f'{"num_cycle":>9} {"method":<9} {"time (ms)":>10} {"peak memory (MB)":>17}')
+for num_cycle in (1, 10, 100, 1000):
+    for method in ('filtfilt', 'periodic'):
+        _, dt, peak = run(num_cycle, method)
+        print(f'{num_cycle:>9} {method:<9} {1e3*dt:>10.2f} {peak/1e6:>17.2f}')
+
+print()
+print(f'{"cutoff (Hz)":>11} {"filtfilt max error (rad)":>25}')
+for cutoff_freq in (2*frequency, frequency, 0.5*frequency, 0.25*frequency):
+    x_filtfilt, _, _ = run(1, 'filtfilt', cutoff_freq)
+    x_periodic, _, _ = run(1, 'periodic', cutoff_freq)
+    err = np.absolute(x_filtfilt - x_periodic).max()
+    print(f'{cutoff_freq:>11.1f} {err:>25.2e}')
+print()
@@ -0,0 +1,59 @@
+import time
+import numpy as np
+from haltere_forces.halteres import Halteres
+from haltere_forces.population import Population
+from parameters import drosophila_param
+
+# Compares computing the kinematics and forces of populations of flies, with
+# per-fly mass, length, separation and tilt angle drawn from normal
+# distributions, one Halteres per fly with a Population computing all flies
+# in a single pass. Reports the times from scratch, kinematics included but
+# not the first computation of the (cached) waveform, and the maximum 
+# difference of the lateral forces relative to their range.
+
+num_pt = 1001
+rng = np.random.default_rng(0)
+omega = np.deg2rad(np.array([300.0, 200.0, 100.0]))
+domega = np.array([10.0, -5.0, 2.0])
+options = {'projections': ('lateral',), 'vectors': False}
+
+
+def population_param(num_fly):
+    param = {**drosophila_param, 'num_pt': num_pt}
+    for key in ('mass', 'length', 'separation'):
+        param[key] = param[key]*rng.normal(1.0, 0.1, num_fly)
+    param['tilt_angle'] = param['tilt_angle'] + np.deg2rad(rng.normal(0.0, 3.0, num_fly))
+    return param
+
+
+def per_fly(param):
+    population = Population(param=param)
+    lateral = np.empty((population.num_individual, num_pt))
+    for i in range(population.num_individual):
+        hsim = Halteres(param=population.individual_param(i))
+        force = hsim.force(omega, domega, **options)
+        lateral[i] = force['left']['lateral']['total']
+    return lateral
+
+
+def population(param):
+    force = Population(param=param).force(omega, domega, **options)
+    return force['left']['lateral']['total']
+
+
+Halteres(param={**drosophila_param, 'num_pt': num_pt}).angle
+
+print()
+print(f'{"flies":>6} {"per fly (s)":>12} {"population (s)":>15} {"speedup":>8} '
+        f'{"max rel diff":>13}')
+for num_fly in (10, 100, 1000):
+    param = population_param(num_fly)
+    t0 = time.perf_counter()
+    lateral_per_fly = per_fly(param)
+    t1 = time.perf_counter()
+    lateral_population = population(param)
+    t2 = time.perf_counter()
+    diff = np.abs(lateral_population - lateral_per_fly).max()/np.ptp(lateral_per_fly)
+    print(f'{num_fly:>6} {t1 - t0:>12.3f} {t2 - t1:>15.3f} '
+            f'{(t1 - t0)/(t2 - t1):>8.1f} {diff:>13.2e}')
+print()
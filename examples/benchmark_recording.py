@@ -0,0 +1,57 @@
+import os
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+from haltere_forces.halteres import Halteres
+from haltere_forces import recordings
+from parameters import drosophila_param as param
+
+# Computes the lateral Coriolis and angular acceleration forces for a long,
+# memory-mapped body rate recording in chunks and reports the runtime and the
+# peak memory allocated, compared with the size of the recording on disk. The
+# analytic kinematics are used as they are also computed chunk by chunk. 
+
+num_rec = 20_000_000
+sample_rate = 100_000.0
+num_cycle = 39_000
+num_pt = 4_000_001
+chunk_size = 100_000
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    filename = os.path.join(tmp_dir, 'omega.npy')
+    omega = np.lib.format.open_memmap(filename, mode='w+', shape=(num_rec, 3))
+    for i in range(0, num_rec, 1_000_000):
+        t = np.arange(i, min(i + 1_000_000, num_rec))/sample_rate
+        omega[i:i + len(t)] = np.deg2rad(300.0)*np.stack(
+                [np.sin(2*np.pi*t), np.cos(3*np.pi*t), np.sin(np.pi*t)], axis=1
+                )
+    omega.flush()
+    del omega
+
+    hsim = Halteres(param={
+        **param, 
+        'num_pt': num_pt, 
+        'num_cycle': num_cycle, 
+        'kinematics': 'analytic',
+        })
+    recording = recordings.load_recording(filename, sample_rate=sample_rate)
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    max_coriolis = 0.0
+    for t, force in recordings.iter_force(hsim, recording, chunk_size=chunk_size, 
+            components=('coriolis', 'angular_acc'), projections=('lateral',), 
+            vectors=False):
+        max_coriolis = max(max_coriolis, np.absolute(force['left']['lateral']['coriolis']).max())
+    t1 = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print()
+    print(f'recording size  : {os.path.getsize(filename)/1e6:.1f} MB')
+    print(f'simulated time  : {hsim.t[-1]:.3f} s, {num_pt} samples')
+    print(f'runtime         : {t1 - t0:.2f} s')
+    print(f'peak memory     : {peak/1e6:.1f} MB')
+    print(f'max coriolis    : {max_coriolis:.3e} N')
+    print()
@@ -0,0 +1,40 @@
+import time
+import numpy as np
+from haltere_forces.halteres import Halteres
+from parameters import drosophila_param as param
+
+# Compares the time to compute a tuning curve, the lateral coriolis and total
+# forces for a batch of body angular velocities, with the batched force and
+# with the precomputed response basis. The basis is computed once (included
+# in the first time) and reused for each batch.
+
+num_repeat = 3
+rng = np.random.default_rng(0)
+options = {'projections': ('lateral',)}
+
+print()
+print(f'{"num_omega":>10} {"component":<10} {"force (ms)":>11} '
+        f'{"basis (ms)":>11} {"first (ms)":>11} {"max rel err":>12}')
+for num_omega in (10, 100, 1000):
+    omega = np.deg2rad(rng.uniform(-500.0, 500.0, (num_omega, 3)))
+    for component in ('coriolis', 'total'):
+        hsim = Halteres(param=dict(param))
+        hsim.kinematics
+        t0 = time.perf_counter()
+        hsim.response_force(omega, batch=True, components=(component,), **options)
+        t_first = time.perf_counter() - t0
+        dt = {'force': np.inf, 'basis': np.inf}
+        for i in range(num_repeat):
+            t0 = time.perf_counter()
+            force = hsim.force(omega, batch=True, components=(component,), vectors=False, **options)
+            t1 = time.perf_counter()
+            response = hsim.response_force(omega, batch=True, components=(component,), **options)
+            t2 = time.perf_counter()
+            dt['force'] = min(dt['force'], t1 - t0)
+            dt['basis'] = min(dt['basis'], t2 - t1)
+        f = force['left']['lateral'][component]
+        r = response['left']['lateral'][component]
+        err = np.abs(f - r).max()/np.abs(f).max()
+        print(f'{num_omega:>10} {component:<10} {1e3*dt["force"]:>11.2f} '
+                f'{1e3*dt["basis"]:>11.2f} {1e3*t_first:>11.2f} {err:>12.1e}')
+print()
@@ -0,0 +1,46 @@
+import sys
+import time
+import numpy as np
+from haltere_forces.halteres import Halteres
+from parameters import drosophila_param as param
+
+# Compares the 'matrix' and 'quaternion' rotation backends: the time taken to
+# compute the rotated haltere kinematics and the maximum difference between
+# the kinematics and forces they produce.
+
+num_repeat = 5
+omega = np.deg2rad(np.array([300.0, 200.0, 100.0]))
+quantities = ['axis_left', 'axis_right', 'pos_left', 'pos_right',
+        'lat_proj_axis_left', 'lat_proj_axis_right']
+
+def run(num_pt, method):
+    hsim = Halteres(param={**param, 'num_pt': num_pt, 'rotation': method})
+    dt = np.inf
+    for i in range(num_repeat):
+        hsim.clear_cache()
+        hsim.angle
+        t0 = time.perf_counter()
+        values = {k: getattr(hsim, k) for k in quantities}
+        t1 = time.perf_counter()
+        dt = min(dt, t1 - t0)
+    force = hsim.force(omega)
+    values['coriolis_left'] = force['left']['lateral']['coriolis']
+    values['coriolis_right'] = force['right']['lateral']['coriolis']
+    return values, dt
+
+run(1000, 'matrix')
+print()
+print(f'quaternionic imported on matrix path: {"quaternionic" in sys.modules}')
+run(1000, 'quaternion')
+
+print()
+print(f'{"num_pt":>8} {"matrix (ms)":>12} {"quaternion (ms)":>16} {"max rel diff":>13}')
+for num_pt in (1000, 10000, 100000, 1000000):
+    values_mat, dt_mat = run(num_pt, 'matrix')
+    values_qn, dt_qn = run(num_pt, 'quaternion')
+    diff = max(
+            np.absolute(values_mat[k] - values_qn[k]).max()/np.absolute(values_qn[k]).max()
+            for k in values_mat
+            )
+    print(f'{num_pt:>8} {1e3*dt_mat:>12.3f} {1e3*dt_qn:>16.3f} {diff:>13.2e}')
+print()
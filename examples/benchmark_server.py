@@ -0,0 +1,103 @@
+import os
+import time
+import signal
+import tempfile
+import multiprocessing
+import numpy as np
+from haltere_forces.halteres import Halteres
+from haltere_forces.server import ForceServer
+from haltere_forces.server import ForceClient
+from parameters import drosophila_param
+
+# Compares computing forces in fresh processes, as independent scripts and
+# notebooks do, with requesting them from a ForceServer which keeps the
+# kinematics warm. Reports the time of the first force computation of a
+# fresh process, the latency of requests to the server with new body rates
+# and with repeated ones, few enough for their results to stay cached, and
+# the throughput of concurrent clients, whose requests the server coalesces
+# into batch evaluations.
+
+num_pt = 10000
+num_client = 4
+num_request = 50
+param = {**drosophila_param, 'num_pt': num_pt}
+address = os.path.join(tempfile.mkdtemp(), 'haltere-forces.sock')
+rng = np.random.default_rng(0)
+omegas = np.deg2rad(rng.normal(0.0, 300.0, (num_client*num_request, 3)))
+
+
+def serve():
+    server = ForceServer(address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+def fresh_force(queue):
+    t0 = time.perf_counter()
+    Halteres(param=dict(param)).force(omegas[0])
+    queue.put(time.perf_counter() - t0)
+
+
+def client_requests(index, queue):
+    with ForceClient(address) as client:
+        t0 = time.perf_counter()
+        for omega in omegas[index::num_client]:
+            client.force(param, omega)
+        queue.put(time.perf_counter() - t0)
+
+
+def latency(client, omegas):
+    times = []
+    for omega in omegas:
+        t0 = time.perf_counter()
+        client.force(param, omega)
+        times.append(time.perf_counter() - t0)
+    return 1e3*np.array(times)
+
+
+if __name__ == '__main__':
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=fresh_force, args=(queue,))
+    process.start()
+    fresh = queue.get()
+    process.join()
+
+    server = multiprocessing.Process(target=serve)
+    server.start()
+    while not os.path.exists(address):
+        time.sleep(0.01)
+
+    with ForceClient(address) as client:
+        t0 = time.perf_counter()
+        client.force(param, omegas[0])
+        first = time.perf_counter() - t0
+        new = latency(client, omegas[1:num_request])
+        repeated = latency(client, omegas[1:11])
+
+        processes = [multiprocessing.Process(target=client_requests, args=(i, queue))
+                for i in range(num_client)]
+        t0 = time.perf_counter()
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        elapsed = time.perf_counter() - t0
+        stats = client.stats()
+
+    print()
+    print(f'num_pt {num_pt}')
+    print(f'fresh process, first force        {1e3*fresh:8.2f} ms')
+    print(f'server, first request             {1e3*first:8.2f} ms')
+    print(f'server, new body rates      p50   {np.median(new):8.2f} ms')
+    print(f'server, repeated request    p50   {np.median(repeated):8.2f} ms')
+    print(f'{num_client} clients x {num_request} requests         {elapsed:8.2f} s, '
+            f'{num_client*num_request/elapsed:.0f} requests/s')
+    print(f'server stats {stats}')
+    print()
+    os.kill(server.pid, signal.SIGINT)
+    server.join()
+    os.rmdir(os.path.dirname(address))
@@ -0,0 +1,82 @@
+import time
+import tracemalloc
+import numpy as np
+from haltere_forces.halteres import Halteres
+from haltere_forces.stepper import ForceStepper
+from parameters import drosophila_param
+
+# Steps a ForceStepper through a closed loop flight simulation, with body
+# rates which change at every step, as a controller would supply them.
+# Reports the percentiles of the step latency, the memory allocated per step
+# and the maximum difference of the forces from Halteres.force_at, relative
+# to the largest force, for several table sizes. The latency of
+# Halteres.force_at for a single sample is reported for comparison.
+
+num_step = 100000
+dt = 1.0e-5
+rng = np.random.default_rng(0)
+hsim = Halteres(param=drosophila_param)
+omega = np.deg2rad(rng.normal(0.0, 300.0, (num_step, 3)))
+domega = rng.normal(0.0, 10.0, (num_step, 3))
+
+
+def run(stepper, num):
+    latency = np.empty(num, dtype=np.int64)
+    for i in range(num):
+        t0 = time.perf_counter_ns()
+        stepper.step(omega[i], domega[i])
+        latency[i] = time.perf_counter_ns() - t0
+    return latency
+
+
+def max_error(stepper, num=1000):
+    stepper.reset()
+    err = 0.0
+    scale = 0.0
+    for i in range(num):
+        force = stepper.step(omega[i], domega[i])
+        exact = hsim.force_at(stepper.t, omega[i], domega[i])
+        err = max(err, np.abs(force.vectors - exact.vectors).max(),
+                np.abs(force.projections - exact.projections).max())
+        scale = max(scale, np.abs(exact.vectors).max())
+    return err/scale
+
+
+def allocated_per_step(stepper, num=10000):
+    tracemalloc.start()
+    stepper.step(omega[0], domega[0])
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for i in range(num):
+        stepper.step(omega[i], domega[i])
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before)/num, peak - before
+
+
+def force_at_latency(num=2000):
+    latency = np.empty(num, dtype=np.int64)
+    for i in range(num):
+        t0 = time.perf_counter_ns()
+        hsim.force_at(dt*i, omega[i], domega[i])
+        latency[i] = time.perf_counter_ns() - t0
+    return 1e-3*latency
+
+
+force_at_latency(100)
+p50, p99 = np.percentile(force_at_latency(), (50, 99))
+print()
+print(f'Halteres.force_at of a single sample, p50 {p50:.1f} us, p99 {p99:.1f} us')
+print()
+print(f'{"table":>6} {"p50 (us)":>9} {"p99 (us)":>9} {"p99.9 (us)":>11} {"max (us)":>9} '
+        f'{"net bytes/step":>15} {"peak bytes":>11} {"max rel err":>12}')
+for num_table in (256, 1024, 4096, 16384):
+    stepper = ForceStepper(hsim, dt=dt, num_table=num_table)
+    run(stepper, 1000)
+    latency = 1e-3*run(stepper, num_step)
+    p50, p99, p999 = np.percentile(latency, (50, 99, 99.9))
+    net, peak = allocated_per_step(stepper)
+    err = max_error(stepper)
+    print(f'{num_table:>6} {p50:>9.2f} {p99:>9.2f} {p999:>11.2f} {latency.max():>9.1f} '
+            f'{net:>15.2f} {peak:>11} {err:>12.2e}')
+print()
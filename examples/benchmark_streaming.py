@@ -0,0 +1,50 @@
+import time
+import tracemalloc
+import numpy as np
+from haltere_forces.halteres import Halteres
+from parameters import drosophila_param as param
+
+# Compares the runtime and peak memory of computing the lateral Coriolis force
+# for a long simulation in one shot with force and in chunks with iter_force,
+# and checks that the concatenated chunks are identical to the one shot result.
+
+num_pt = 2_000_000
+chunk_size = 50_000
+omega = np.deg2rad(np.array([300.0, 200.0, 100.0]))
+options = {'components': ('coriolis',), 'projections': ('lateral',), 'vectors': False}
+
+def one_shot(hsim):
+    force = hsim.force(omega, **options)
+    return force['left']['lateral']['coriolis']
+
+def streamed(hsim):
+    chunks = [f['left']['lateral']['coriolis'] 
+            for _, f in hsim.iter_force(omega, chunk_size=chunk_size, **options)]
+    return np.concatenate(chunks)
+
+def run(func, waveform, mode):
+    hsim = Halteres(param={
+        **param, 
+        'num_pt': num_pt, 
+        'num_cycle': 200, 
+        'waveform': waveform,
+        'kinematics': mode,
+        })
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    f = func(hsim)
+    t1 = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return f, t1 - t0, peak
+
+print()
+print(f'{"waveform":<18} {"mode":<9} {"method":<9} {"time (ms)":>10} {"peak memory (MB)":>17} {"identical":>10}')
+for waveform in ('triangle', 'filtered_triangle'):
+    for mode in ('gradient', 'analytic'):
+        f_ref, dt, peak = run(one_shot, waveform, mode)
+        print(f'{waveform:<18} {mode:<9} {"force":<9} {1e3*dt:>10.1f} {peak/1e6:>17.1f}')
+        f, dt, peak = run(streamed, waveform, mode)
+        same = np.array_equal(f, f_ref)
+        print(f'{waveform:<18} {mode:<9} {"iter":<9} {1e3*dt:>10.1f} {peak/1e6:>17.1f} {str(same):>10}')
+print()
@@ -0,0 +1,188 @@
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import numpy as np
+from haltere_forces import waveform
+from haltere_forces.halteres import Halteres
+from haltere_forces.halteres import calc_haltere_force
+from haltere_forces.halteres import project
+from haltere_forces.halteres import reshape_to_nx3
+from parameters import drosophila_param
+from parameters import calliphora_param
+
+# Benchmark suite for the waveform and force hot paths. Records the best wall
+# time and the peak memory allocated (tracemalloc) for each case, preset and
+# number of points, optionally saves the results and compares them with a
+# stored baseline, e.g.
+#
+#   python benchmark_suite.py --num-pt 1e3 1e4 1e5 --save results.json
+#   python benchmark_suite.py --baseline benchmark_baseline.json
+#
+# Exits with status 1 if any case uses more peak memory than the baseline by
+# more than the threshold. The peak memory is deterministic whereas the wall
+# times depend on the machine and its load, so the times are only compared,
+# with --time-threshold, against a baseline recorded on the same machine, e.g.
+#
+#   python benchmark_suite.py --baseline benchmark_baseline.json --time-threshold 1.5
+
+presets = {
+        'drosophila' : drosophila_param,
+        'calliphora' : calliphora_param,
+        }
+
+omega = np.deg2rad(np.array([300.0, 200.0, 100.0]))
+domega = np.array([10.0, -5.0, 2.0])
+lin_acc = np.array([0.0, 0.0, 1.0])
+
+
+def triangle(param, num_pt):
+    t = np.linspace(0, param['num_cycle']/param['frequency'], num_pt)
+    period = 1.0/param['frequency']
+    return lambda: waveform.triangle(t, param['amplitude'], period)
+
+
+def filtered_triangle(param, num_pt):
+    def run():
+        waveform.cache_clear()
+        waveform.filtered_triangle(
+                num_pt,
+                num_cycle=param['num_cycle'],
+                amplitude=param['amplitude'],
+                period=1.0/param['frequency'],
+                cutoff_frequency=param['cutoff_freq'],
+                )
+    return run
+
+
+def kinematics(param, num_pt):
+    hsim = Halteres(param={**param, 'num_pt': num_pt})
+    def run():
+        waveform.cache_clear()
+        hsim.clear_cache()
+        hsim.kinematics
+    return run
+
+
+def force(param, num_pt):
+    hsim = Halteres(param={**param, 'num_pt': num_pt})
+    hsim.kinematics
+    return lambda: hsim.force(omega, domega, lin_acc)
+
+
+def calc_force(param, num_pt):
+    hsim = Halteres(param={**param, 'num_pt': num_pt})
+    args = (
+            param['mass'],
+            hsim.pos_left,
+            hsim.vel_left,
+            hsim.acc_left,
+            hsim.axis_left,
+            hsim.lat_proj_axis_left,
+            )
+    return lambda: calc_haltere_force(*args, omega, domega, lin_acc)
+
+
+def project_(param, num_pt):
+    hsim = Halteres(param={**param, 'num_pt': num_pt})
+    a, b = hsim.pos_left, hsim.axis_left
+    return lambda: project(a, b)
+
+
+def reshape(param, num_pt):
+    return lambda: reshape_to_nx3(num_pt, omega)
+
+
+cases = {
+        'triangle'           : triangle,
+        'filtered_triangle'  : filtered_triangle,
+        'kinematics'         : kinematics,
+        'force'              : force,
+        'calc_haltere_force' : calc_force,
+        'project'            : project_,
+        'reshape_to_nx3'     : reshape,
+        }
+
+
+def measure(run, num_pt):
+    num_repeat = max(3, min(20, int(2e6//num_pt)))
+    run()
+    dt = np.inf
+    for i in range(num_repeat):
+        t0 = time.perf_counter()
+        run()
+        t1 = time.perf_counter()
+        dt = min(dt, t1 - t0)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'time': dt, 'peak': peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Benchmark suite for the waveform and force hot paths')
+    parser.add_argument('--num-pt', nargs='+', type=float,
+            default=[1e3, 1e4, 1e5, 1e6, 1e7])
+    parser.add_argument('--presets', nargs='+', choices=list(presets),
+            default=list(presets))
+    parser.add_argument('--cases', nargs='+', choices=list(cases),
+            default=list(cases))
+    parser.add_argument('--save', help='file to save the results to (json)')
+    parser.add_argument('--baseline', help='baseline results to compare with (json)')
+    parser.add_argument('--threshold', type=float, default=1.2,
+            help='peak memory ratio to the baseline reported as a regression')
+    parser.add_argument('--time-threshold', type=float,
+            help='time ratio to the baseline reported as a regression '
+            '(default: times are not compared)')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    regressions = []
+    print()
+    print(f'{"case":<19} {"preset":<11} {"num_pt":>9} {"time (ms)":>11} '
+            f'{"peak (MB)":>10} {"time ratio":>11} {"peak ratio":>11}')
+    for name in args.cases:
+        for preset in args.presets:
+            for num_pt in (int(n) for n in args.num_pt):
+                key = f'{name}/{preset}/{num_pt}'
+                result = measure(cases[name](presets[preset], num_pt), num_pt)
+                results[key] = result
+                line = (f'{name:<19} {preset:<11} {num_pt:>9} '
+                        f'{1e3*result["time"]:>11.3f} {result["peak"]/1e6:>10.2f}')
+                if key in baseline:
+                    time_ratio = result['time']/baseline[key]['time']
+                    peak_ratio = (result['peak'] + 1)/(baseline[key]['peak'] + 1)
+                    line += f' {time_ratio:>11.2f} {peak_ratio:>11.2f}'
+                    slower = (args.time_threshold is not None
+                            and time_ratio > args.time_threshold)
+                    if slower or peak_ratio > args.threshold:
+                        regressions.append(key)
+                        line += '  regression'
+                print(line, flush=True)
+    print()
+
+    if args.save:
+        info = {
+                'python'   : platform.python_version(),
+                'numpy'    : np.__version__,
+                'machine'  : platform.machine(),
+                'platform' : platform.platform(),
+                }
+        with open(args.save, 'w') as f:
+            json.dump({'info': info, 'results': results}, f, indent=2)
+    if regressions:
+        print(f'{len(regressions)} regressions: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
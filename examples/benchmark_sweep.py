@@ -0,0 +1,40 @@
+import os
+import time
+import itertools
+import numpy as np
+from haltere_forces.halteres import Halteres
+from haltere_forces.sweep import sweep
+from parameters import drosophila_param as param
+
+# Times a parameter sweep computed one Halteres instance at a time and with
+# the sweep engine for increasing numbers of worker processes.
+
+param = {**param, 'num_pt': 5000}
+grid = {
+        'tilt_angle' : np.deg2rad(np.linspace(20.0, 50.0, 4)),
+        'amplitude'  : np.deg2rad(np.linspace(60.0, 90.0, 4)),
+        'mass'       : np.linspace(1.0e-9, 3.0e-9, 4),
+        'length'     : np.linspace(2.0e-4, 4.0e-4, 4),
+        }
+omega = np.deg2rad(300.0)*np.eye(3)
+
+t0 = time.perf_counter()
+for values in itertools.product(*grid.values()):
+    hsim = Halteres(param={**param, **dict(zip(grid, values))})
+    for w in omega:
+        hsim.force(w, components=('coriolis',), projections=('lateral',), vectors=False)
+t1 = time.perf_counter()
+dt_loop = t1 - t0
+
+print()
+print(f'cases: {np.prod([len(v) for v in grid.values()])}, omegas: {len(omega)}, num_pt: {param["num_pt"]}')
+print(f'{"method":<16} {"time (s)":>9} {"speedup":>8}')
+print(f'{"loop":<16} {dt_loop:>9.2f} {1.0:>8.1f}')
+num_workers = 1
+while num_workers <= (os.cpu_count() or 1):
+    t0 = time.perf_counter()
+    result = sweep(param, grid, omega, num_workers=num_workers)
+    t1 = time.perf_counter()
+    print(f'{f"sweep ({num_workers})":<16} {t1 - t0:>9.2f} {dt_loop/(t1 - t0):>8.1f}')
+    num_workers *= 2
+print()
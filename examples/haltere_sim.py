@@ -31,11 +31,14 @@ omega_list = [omega_mag*item for item in omega_list]
 force_gravity = hsim.force(np.zeros((3,))) ['left']['gravity'][0,2]
 print(f'force gravity: {force_gravity}')
 
-for omega_deg in omega_list:
+# Compute forces for all angular velocities in one batched evaluation
+omega_batch = np.deg2rad(np.array(omega_list))
+force_batch = hsim.force(omega_batch, batch=True)
 
-    omega = np.deg2rad(omega_deg)
-    force = hsim.force(omega)
+for i, omega_deg in enumerate(omega_list):
 
+    force_left = force_batch['left']['lateral']['coriolis'][i]
+    force_right = force_batch['right']['lateral']['coriolis'][i]
 
     fig, ax = plt.subplots(3,1,sharex=True)
     omega_str = np.array2string(omega_deg, precision=2, separator=',')
@@ -45,13 +48,13 @@ for omega_deg in omega_list:
     ax[0].set_ylabel('angle (rad)')
     ax[0].grid(True)
 
-    ax[1].plot(t, force['left']['lateral']['coriolis'], 'b')
-    #ax[1].plot(t, force['left']['lateral']['total'], 'r')
+    ax[1].plot(t, force_left, 'b')
+    #ax[1].plot(t, force_batch['left']['lateral']['total'][i], 'r')
     ax[1].set_ylabel('force left (N)')
     ax[1].grid(True)
     
-    ax[2].plot(t, force['right']['lateral']['coriolis'], 'b')
-    #ax[2].plot(t, force['right']['lateral']['total'], 'r')
+    ax[2].plot(t, force_right, 'b')
+    #ax[2].plot(t, force_batch['right']['lateral']['total'][i], 'r')
     ax[2].set_ylabel('force right (N)')
     ax[2].grid(True)
     ax[2].set_xlabel('t (s)')
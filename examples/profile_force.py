@@ -0,0 +1,26 @@
+import numpy as np
+from haltere_forces import profiling
+from haltere_forces import waveform
+from haltere_forces.halteres import Halteres
+from parameters import drosophila_param as param
+
+# Profiles the stages of a force calculation from scratch: waveform
+# generation, rotations, differentiation (the Halteres.vel_* and acc_*
+# properties in gradient mode), the force terms and the projections. The
+# kinematics and waveform caches are cleared after a warm-up call so that
+# every stage is recomputed.
+
+omega = np.deg2rad(np.array([300.0, 200.0, 100.0]))
+omega_t = np.outer(np.sin(np.linspace(0.0, 2*np.pi, 100_000)), omega)
+
+for rotation in ('matrix', 'quaternion'):
+    hsim = Halteres(param={**param, 'num_pt': 100_000, 'rotation': rotation})
+    hsim.force(omega)
+    hsim.clear_cache()
+    waveform.cache_clear()
+    with profiling.profile() as prof:
+        hsim.force(omega_t, omega_t)
+    print()
+    print(f'rotation = {rotation}')
+    print(prof.report())
+print()
@@ -0,0 +1,87 @@
+import time
+import numpy as np
+from haltere_forces.halteres import Halteres
+from haltere_forces import simplified_coriolis as sc
+from parameters import drosophila_param as param
+
+# Accuracy report of the closed form coriolis forces in simplified_coriolis
+# against calc_haltere_force (via Halteres.force) for pitch, roll, yaw,
+# arbitrary and time-varying body rotations, for both haltere sides and both
+# kinematics modes, followed by the cost of a batch of rotations. Errors are
+# the max abs difference relative to the max abs calc_haltere_force value.
+
+num_pt = 10_000
+rate = np.deg2rad(300.0)
+
+def rel_err(f, f_ref):
+    return np.absolute(f - f_ref).max()/np.absolute(f_ref).max()
+
+hsim = Halteres(param={**param, 'num_pt': num_pt})
+omega_t = rate*np.stack([
+    np.sin(2*np.pi*50*hsim.t), 
+    np.cos(2*np.pi*30*hsim.t), 
+    np.sin(2*np.pi*20*hsim.t),
+    ], axis=1)
+cases = {
+        'pitch'        : (np.array([rate, 0.0, 0.0]), 'pitch'),
+        'roll'         : (np.array([0.0, rate, 0.0]), 'roll'),
+        'yaw'          : (np.array([0.0, 0.0, rate]), 'yaw'),
+        'arbitrary'    : (rate*np.array([1.0, -0.5, 0.7]), None),
+        'time-varying' : (omega_t, None),
+        }
+single_axis = {
+        'pitch' : (0, sc.coriolis_from_pitch, sc.lateral_coriolis_from_pitch),
+        'roll'  : (1, sc.coriolis_from_roll, sc.lateral_coriolis_from_roll),
+        'yaw'   : (2, sc.coriolis_from_yaw, sc.lateral_coriolis_from_yaw),
+        }
+
+print()
+print(f'{"omega":<13} {"side":<6} {"kinematics":<11} {"vector err":>11} '
+        f'{"lateral err":>12} {"single axis err":>16}')
+for mode in ('analytic', 'gradient'):
+    hsim = Halteres(param={**param, 'num_pt': num_pt, 'kinematics': mode})
+    args = (param['mass'], param['length'], param['tilt_angle'])
+    for name, (omega, axis_name) in cases.items():
+        force = hsim.force(omega, components=('coriolis',))
+        for side in ('left', 'right'):
+            f_ref = force[side]['coriolis']
+            f_lat_ref = force[side]['lateral']['coriolis']
+            f = sc.coriolis(*args, omega, hsim.angle, hsim.dangle, side=side)
+            f_lat = sc.lateral_coriolis(*args, omega, hsim.angle, hsim.dangle, side=side)
+            line = (f'{name:<13} {side:<6} {mode:<11} {rel_err(f, f_ref):>11.2e} '
+                    f'{rel_err(f_lat, f_lat_ref):>12.2e}')
+            if axis_name is not None:
+                i, func, lat_func = single_axis[axis_name]
+                kwargs = {} if axis_name == 'pitch' else {'side': side}
+                err = max(
+                        rel_err(func(*args, omega[i], hsim.angle, hsim.dangle, **kwargs), f_ref),
+                        rel_err(lat_func(*args, omega[i], hsim.angle, hsim.dangle, **kwargs), f_lat_ref),
+                        )
+                line += f' {err:>16.2e}'
+            print(line)
+
+# Cost for a batch of constant rotations
+num_batch = 100
+omegas = rate*np.random.default_rng(0).uniform(-1.0, 1.0, (num_batch, 3))
+hsim = Halteres(param={**param, 'num_pt': num_pt, 'kinematics': 'analytic'})
+hsim.kinematics
+
+t0 = time.perf_counter()
+hsim.clear_cache()
+f_ref = hsim.force(omegas, batch=True, components=('coriolis',), 
+        projections=('lateral',), vectors=False)
+t1 = time.perf_counter()
+dt_full = t1 - t0
+
+t0 = time.perf_counter()
+f = {side: sc.lateral_coriolis(*args, omegas, hsim.angle, hsim.dangle, side=side, batch=True)
+        for side in ('left', 'right')}
+t1 = time.perf_counter()
+dt_simple = t1 - t0
+err = max(rel_err(f[side], f_ref[side]['lateral']['coriolis']) for side in f)
+
+print()
+print(f'batch of {num_batch} rotations, num_pt = {num_pt}, lateral coriolis')
+print(f'Halteres.force (from scratch) : {1e3*dt_full:8.2f} ms')
+print(f'lateral_coriolis              : {1e3*dt_simple:8.2f} ms, max rel err {err:.2e}')
+print()
@@ -1,17 +1,100 @@
+import functools
 import numpy as np
-import scipy as sp
-import quaternionic as qn
 from . import waveform
+from . import rotation
+from . import profiling
+from .results import ForceResult
+
+# Standard gravity (m/s**2), scipy.constants.g, defined here so that scipy
+# isn't imported just for this constant.
+GRAVITY = 9.80665
+
+# Parameters on which the cached kinematic quantities depend
+TIME_KEYS = ('frequency', 'num_cycle', 'num_pt')
+ANGLE_KEYS = TIME_KEYS + ('waveform', 'amplitude', 'shift', 'cutoff_freq', 
+        'filter_method', 'kinematics', 'measured')
+AXIS_KEYS = ANGLE_KEYS + ('rotation', 'dtype')
+TILT_KEYS = ('tilt_angle', 'rotation', 'dtype')
+POS_KEYS = AXIS_KEYS + ('tilt_angle', 'length', 'separation')
+
+
+def cached(*keys):
+    """
+    Decorator for creating a memoized Halteres property. The value is computed
+    once and reused until one of the parameters in keys changes, either by
+    assignment to Halteres.param or by modification of the param dict in
+    place. Array parameters are compared by value. Cached arrays are made
+    read-only as they are shared between callers. Computations of the value
+    are profiled as the stage 'Halteres.<name>', see profiling.
+
+    Parameters:
+    keys : str
+        names of the parameters the property depends on 
+
+    """
+    def decorator(func):
+        name = func.__name__
+        @functools.wraps(func)
+        def wrapper(self):
+            key = tuple(param_key(self.param.get(k)) for k in keys)
+            try:
+                cache_key, value = self._cache[name]
+                if cache_key == key:
+                    return value
+            except KeyError:
+                pass
+            prof = profiling._active
+            if prof is None:
+                value = func(self)
+            else:
+                value = profiling.call(prof, f'Halteres.{name}', func, self)
+            for item in value if isinstance(value, tuple) else (value,):
+                if isinstance(item, np.ndarray):
+                    item.flags.writeable = False
+            self._cache[name] = (key, value)
+            return value
+        return property(wrapper)
+    return decorator
+
+
+def param_key(value):
+    """ 
+    Key for comparing a parameter value with its cached value. Arrays, e.g.
+    the parameters of the individuals of a Population, are keyed by a copy
+    of their contents, so in place modifications are detected.
+    """
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, value.tobytes())
+    return value
+
 
 class Halteres:
 
+    # Whether the force inputs are always batches of cases, see Population
+    batch_only = False
+
     def __init__(self,param):
         self.param = param
+        self._cache = {}
 
-    @property
+    def clear_cache(self):
+        """ Removes all memoized kinematic quantities """
+        self._cache.clear()
+
+    @cached(*TIME_KEYS)
     def t(self):
-        period = 1.0/self.param['frequency']
-        t = np.linspace(0, period*self.param['num_cycle'], self.param['num_pt']) 
+        return self.time_slice(0, self.param['num_pt'])
+
+    def time_slice(self, start, stop):
+        """ 
+        Sample times for the sample indices start to stop. These are the 
+        corresponding elements of t, computed as np.linspace does.
+        """
+        num_pt = self.param['num_pt']
+        end_time = 1.0/self.param['frequency']*self.param['num_cycle']
+        t = np.arange(start, stop)*(end_time/(num_pt - 1))
+        if stop == num_pt and stop > start:
+            t[-1] = end_time
         return t
 
     @property
@@ -20,15 +103,103 @@ class Halteres:
         return dt
 
     @property
-    def angle(self):
-        amplitude = self.param['amplitude']
-        frequency = self.param['frequency']
-        period = 1.0/frequency
+    def shift(self):
         try:
             shift = self.param['shift']
         except KeyError:
             #shift = 0.25
             shift = 0.0
+        return shift
+
+    @property
+    def kinematics_mode(self):
+        """ 
+        Method used to compute the haltere velocities and accelerations: 
+        'gradient' (default) for numerical differentiation of the sampled 
+        positions, or 'analytic' for closed form derivatives of the waveform
+        propagated through the flap and tilt rotations. The default is
+        'analytic' for the 'measured' waveform.
+        """
+        try:
+            mode = self.param['kinematics']
+        except KeyError:
+            mode = 'analytic' if self.param.get('waveform') == 'measured' else 'gradient'
+        if mode not in ('gradient', 'analytic'):
+            raise ValueError(f'unknown kinematics, {mode}')
+        return mode
+
+    @property
+    def rotation_method(self):
+        """ 
+        Backend used for the flap and tilt rotations: 'matrix' (default) for
+        closed form rotations or 'quaternion' for quaternionic arrays.
+        """
+        try:
+            method = self.param['rotation']
+        except KeyError:
+            method = 'matrix'
+        return method
+
+    @property
+    def filter_method(self):
+        """ 
+        Method used to filter the filtered triangle waveform: 'filtfilt' 
+        (default) or 'periodic', see waveform.filtered_triangle. 
+        """
+        try:
+            method = self.param['filter_method']
+        except KeyError:
+            method = 'filtfilt'
+        return method
+
+    @property
+    def dtype(self):
+        """
+        Floating point type of the haltere kinematics and forces, np.float64 
+        (default) or e.g. np.float32 to halve the memory and bandwidth of 
+        large batches and sweeps. 
+
+        The times, haltere angles and their derivatives are always double
+        precision, as is the numerical differentiation of the positions for
+        the 'gradient' kinematics, so that reduced precision doesn't degrade
+        the phase of long simulations or amplify rounding errors. Only the 
+        stored vectors and the force arithmetic use dtype. With np.float32
+        the force components and their projections agree with double 
+        precision to ~5e-7 of their largest values, except for projections 
+        which nearly cancel, e.g. the lateral total force, which is small
+        compared with the primary force, agrees to ~1e-4. See 
+        examples/benchmark_dtype.py for the accuracy, time and memory.
+        """
+        dtype = np.dtype(self.param.get('dtype', np.float64))
+        if not np.issubdtype(dtype, np.floating):
+            raise ValueError(f'dtype must be a floating point type, {dtype}')
+        return dtype
+
+    @property
+    def measured(self):
+        """
+        The measured waveform, param['measured'], of the 'measured' waveform
+        option, a measured.MeasuredWaveform of a single trial. Its times are
+        those of the time base t.
+        """
+        try:
+            measured = self.param['measured']
+        except KeyError:
+            raise ValueError("the 'measured' waveform requires param['measured']") from None
+        if measured.batch:
+            raise ValueError('measured waveform must be a single trial, e.g. measured[i]')
+        return measured
+
+    @cached(*ANGLE_KEYS)
+    def angle(self):
+        if self.kinematics_mode == 'analytic':
+            return self.analytic_angle[0]
+        if self.param['waveform'] == 'measured':
+            return self.measured(self.t)[0]
+        amplitude = self.param['amplitude']
+        frequency = self.param['frequency']
+        period = 1.0/frequency
+        shift = self.shift
 
         match self.param['waveform']:
             case 'triangle':
@@ -44,84 +215,320 @@ class Halteres:
                         period=period,
                         shift=shift, 
                         cutoff_frequency=cutoff_freq,
+                        method=self.filter_method,
                         )
             case _:
                 raise ValueError(f'unknown waveform, {self.param["waveform"]}')
         return angles
 
-    @property
+    @cached(*ANGLE_KEYS)
+    def angle_period(self):
+        """ 
+        One period of the filtered triangle waveform for the 'periodic' filter
+        method, see waveform.filtered_triangle_period. 
+        """
+        num_pt = waveform.samples_per_period(
+                self.param['num_pt'], 
+                self.param['num_cycle'],
+                )
+        angles = waveform.filtered_triangle_period(
+                num_pt,
+                amplitude=self.param['amplitude'], 
+                period=1.0/self.param['frequency'],
+                shift=self.shift, 
+                cutoff_frequency=self.param['cutoff_freq'],
+                )
+        return angles
+
+    @cached(*ANGLE_KEYS)
+    def dangle(self):
+        if self.kinematics_mode == 'analytic':
+            return self.analytic_angle[1]
+        return np.gradient(self.angle)/self.dt
+
+    @cached(*ANGLE_KEYS)
+    def ddangle(self):
+        if self.kinematics_mode == 'analytic':
+            return self.analytic_angle[2]
+        return np.gradient(self.dangle)/self.dt
+
+    @cached(*ANGLE_KEYS)
+    def analytic_angle(self):
+        """ 
+        Haltere angle and its first and second time derivatives computed in
+        closed form from the waveform. For the filtered triangle this is the
+        continuous time limit of the filtered waveform, see
+        waveform.filtered_triangle_analytic, and for the measured waveform
+        the derivatives of the fitted spline, see measured.MeasuredWaveform.
+        """
+        return self.analytic_angle_at(self.t)
+
+    def analytic_angle_at(self, t):
+        """ Closed form haltere angle and derivatives at the times t """
+        if self.param['waveform'] == 'measured':
+            return self.measured(t)
+        amplitude = self.param['amplitude']
+        period = 1.0/self.param['frequency']
+        shift = self.shift
+
+        match self.param['waveform']:
+            case 'triangle':
+                angles = waveform.triangle(t, amplitude, period, shift=shift) 
+                dangles, ddangles = waveform.triangle_derivatives(
+                        t, amplitude, period, shift=shift
+                        ) 
+            case 'filtered_triangle':
+                angles, dangles, ddangles = waveform.filtered_triangle_analytic(
+                        t, 
+                        amplitude=amplitude, 
+                        period=period, 
+                        shift=shift, 
+                        cutoff_frequency=self.param['cutoff_freq'],
+                        )
+            case _:
+                raise ValueError(f'unknown waveform, {self.param["waveform"]}')
+        return angles, dangles, ddangles
+
+    @cached(*AXIS_KEYS)
     def axis_left(self):
-        num_pt = self.param['num_pt']
-        axis = np.array([-1.0, 0.0, 0.0])
-        rot_axis_angle = np.zeros((num_pt, 3))
-        rot_axis_angle[:,1] = self.angle
-        qrot_flap = qn.array.from_axis_angle(rot_axis_angle)
-        axis = qrot_flap.rotate(axis)
-        return axis
+        return self.stalk_axis(self.angle, 'left')
 
-    @property
+    @cached(*AXIS_KEYS)
     def axis_right(self):
-        num_pt = self.param['num_pt']
-        axis = np.array([ 1.0, 0.0, 0.0])
-        rot_axis_angle = np.zeros((num_pt, 3))
-        rot_axis_angle[:,1] = -self.angle
-        qrot_flap = qn.array.from_axis_angle(rot_axis_angle)
-        axis = qrot_flap.rotate(axis)
-        return axis
+        return self.stalk_axis(self.angle, 'right')
 
-    @property
-    def lat_proj_axis_left(self): 
-        tilt_angle = self.param['tilt_angle']
-        axis = np.array([0.0, 1.0, 0.0])
-        qrot_tilt = qn.array.from_axis_angle([0.0, 0.0, tilt_angle])
-        axis = qrot_tilt.rotate(axis)
+    @cached(*AXIS_KEYS)
+    def daxis_left(self):
+        return self.stalk_axis_vel(self.axis_left, self.dangle, 'left')
+
+    @cached(*AXIS_KEYS)
+    def daxis_right(self):
+        return self.stalk_axis_vel(self.axis_right, self.dangle, 'right')
+
+    @cached(*AXIS_KEYS)
+    def ddaxis_left(self):
+        return self.stalk_axis_acc(self.axis_left, self.dangle, self.ddangle, 'left')
+
+    @cached(*AXIS_KEYS)
+    def ddaxis_right(self):
+        return self.stalk_axis_acc(self.axis_right, self.dangle, self.ddangle, 'right')
+
+    @cached(*TILT_KEYS)
+    def lat_proj_axis_left(self):
+        axis = np.array([0.0, 1.0, 0.0], dtype=self.dtype)
+        axis = self.tilt(axis, 'left')
         return axis
         
-    @property 
-    def lat_proj_axis_right(self): 
-        tilt_angle = self.param['tilt_angle']
-        axis = np.array([0.0, 1.0, 0.0])
-        qrot_tilt = qn.array.from_axis_angle([0.0, 0.0, -tilt_angle])
-        axis = qrot_tilt.rotate(axis)
+    @cached(*TILT_KEYS)
+    def lat_proj_axis_right(self):
+        axis = np.array([0.0, 1.0, 0.0], dtype=self.dtype)
+        axis = self.tilt(axis, 'right')
         return axis
 
-    @property 
+    @cached(*POS_KEYS)
     def pos_left(self):
-        length = self.param['length']
-        separation = self.param['separation']
-        tilt_angle = self.param['tilt_angle']
-        pos = self.axis_left*length
-        qrot_tilt = qn.array.from_axis_angle([0.0, 0.0, tilt_angle])
-        pos = qrot_tilt.rotate(pos)
-        pos -= np.array([0.5*separation, 0.0, 0.0])
-        return pos
+        return self.stalk_pos(self.axis_left, 'left')
 
-    @property
+    @cached(*POS_KEYS)
     def pos_right(self):
-        length = self.param['length']
-        separation = self.param['separation']
-        tilt_angle = self.param['tilt_angle']
-        pos = self.axis_right*length
-        qrot_tilt = qn.array.from_axis_angle([0.0, 0.0, -tilt_angle])
-        pos = qrot_tilt.rotate(pos)
-        pos += np.array([0.5*separation, 0.0, 0.0])
-        return pos
+        return self.stalk_pos(self.axis_right, 'right')
 
-    @property 
+    @cached(*POS_KEYS)
     def vel_left(self):
-        return np.gradient(self.pos_left, axis=0)/self.dt
+        if self.kinematics_mode == 'analytic':
+            return self.stalk_vector(self.daxis_left, 'left')
+        if self.dtype != np.float64:
+            return self.gradient_kinematics_left[0]
+        return np.gradient(self.pos_left, axis=-2)/self.dt
 
-    @property
+    @cached(*POS_KEYS)
     def vel_right(self):
-        return np.gradient(self.pos_right, axis=0)/self.dt
+        if self.kinematics_mode == 'analytic':
+            return self.stalk_vector(self.daxis_right, 'right')
+        if self.dtype != np.float64:
+            return self.gradient_kinematics_right[0]
+        return np.gradient(self.pos_right, axis=-2)/self.dt
 
-    @property
+    @cached(*POS_KEYS)
     def acc_left(self):
-        return np.gradient(self.vel_left, axis=0)/self.dt
+        if self.kinematics_mode == 'analytic':
+            return self.stalk_vector(self.ddaxis_left, 'left')
+        if self.dtype != np.float64:
+            return self.gradient_kinematics_left[1]
+        return np.gradient(self.vel_left, axis=-2)/self.dt
 
-    @property
+    @cached(*POS_KEYS)
     def acc_right(self):
-        return np.gradient(self.vel_right, axis=0)/self.dt
+        if self.kinematics_mode == 'analytic':
+            return self.stalk_vector(self.ddaxis_right, 'right')
+        if self.dtype != np.float64:
+            return self.gradient_kinematics_right[1]
+        return np.gradient(self.vel_right, axis=-2)/self.dt
+
+    @cached(*POS_KEYS)
+    def gradient_kinematics_left(self):
+        return self.gradient_kinematics(self.angle, 'left')
+
+    @cached(*POS_KEYS)
+    def gradient_kinematics_right(self):
+        return self.gradient_kinematics(self.angle, 'right')
+
+    def stalk_axis(self, angle, side, dtype=None):
+        """ 
+        Haltere stalk axis vectors, before tilting, for haltere angles. The
+        vectors are of type dtype, by default Halteres.dtype. 
+        """
+        dtype = self.dtype if dtype is None else dtype
+        method = self.rotation_method
+        match side:
+            case 'left':
+                axis = rotation.flap_rotate([-1.0, 0.0, 0.0], angle, method, dtype)
+            case 'right':
+                axis = rotation.flap_rotate([ 1.0, 0.0, 0.0], -angle, method, dtype)
+            case _:
+                raise ValueError(f'unknown side, {side}')
+        return axis
+
+    def stalk_axis_vel(self, axis, dangle, side):
+        """ Time derivative of the stalk axis vectors """
+        flap_axis = np.array([0.0, 1.0, 0.0], dtype=axis.dtype)
+        dangle = dangle.astype(axis.dtype, copy=False)
+        daxis = np.cross(flap_axis, axis)*dangle[:,np.newaxis]
+        if side == 'right':
+            daxis = -daxis
+        return daxis
+
+    def stalk_axis_acc(self, axis, dangle, ddangle, side):
+        """ Second time derivative of the stalk axis vectors """
+        flap_axis = np.array([0.0, 1.0, 0.0], dtype=axis.dtype)
+        dangle = dangle.astype(axis.dtype, copy=False)
+        ddangle = ddangle.astype(axis.dtype, copy=False)
+        ddaxis = -axis*dangle[:,np.newaxis]**2
+        if side == 'left':
+            ddaxis += np.cross(flap_axis, axis)*ddangle[:,np.newaxis]
+        else:
+            ddaxis -= np.cross(flap_axis, axis)*ddangle[:,np.newaxis]
+        return ddaxis
+
+    def stalk_vector(self, v, side):
+        """ 
+        Tilted vectors along the haltere stalk for stalk axis vectors, or
+        their time derivatives, v, i.e. the positions relative to the base
+        of the haltere and their derivatives.
+        """
+        return self.tilt(v*self.param['length'], side)
+
+    def stalk_pos(self, axis, side):
+        """ Haltere positions for stalk axis vectors """
+        separation = self.param['separation']
+        pos = self.stalk_vector(axis, side)
+        offset = np.array([0.5*separation, 0.0, 0.0], dtype=pos.dtype)
+        if side == 'left':
+            pos -= offset
+        else:
+            pos += offset
+        return pos
+
+    def gradient_kinematics(self, angle, side):
+        """
+        Haltere velocities and accelerations for haltere angles by central
+        differences of the positions. These are computed in double precision
+        and converted to Halteres.dtype, as differences of reduced precision
+        positions would amplify their rounding errors.
+        """
+        pos = self.stalk_pos(self.stalk_axis(angle, side, np.float64), side)
+        vel = np.gradient(pos, axis=-2)/self.dt
+        acc = np.gradient(vel, axis=-2)/self.dt
+        return vel.astype(self.dtype, copy=False), acc.astype(self.dtype, copy=False)
+
+    def tilt(self, v, side):
+        """ Rotates vectors, v, by the left or right haltere tilt angle """
+        match side:
+            case 'left':
+                tilt_angle = self.param['tilt_angle']
+            case 'right':
+                tilt_angle = -self.param['tilt_angle']
+            case _:
+                raise ValueError(f'unknown side, {side}')
+        return rotation.tilt_rotate(v, tilt_angle, self.rotation_method)
+
+    def angle_slice(self, start, stop):
+        """ 
+        Haltere angles for the sample indices start to stop. Waveforms which
+        can be evaluated pointwise are computed for these samples only. The
+        filtered triangle is indexed from a single period for the 'periodic'
+        filter method and otherwise sliced from the (cached) full trace. 
+        """
+        if self.kinematics_mode == 'analytic':
+            return self.analytic_angle_at(self.time_slice(start, stop))[0]
+        match self.param['waveform']:
+            case 'triangle':
+                amplitude = self.param['amplitude']
+                period = 1.0/self.param['frequency']
+                t = self.time_slice(start, stop)
+                angles = waveform.triangle(t, amplitude, period, shift=self.shift)
+            case 'measured':
+                angles = self.measured(self.time_slice(start, stop))[0]
+            case 'filtered_triangle' if self.filter_method == 'periodic':
+                angle_period = self.angle_period
+                angles = angle_period[np.arange(start, stop) % len(angle_period)]
+            case _:
+                angles = self.angle[start:stop]
+        return angles
+
+    @profiling.stage('Halteres.kinematics_slice')
+    def kinematics_slice(self, start, stop):
+        """
+        Haltere kinematics, as for kinematics plus the stalk axis, for the
+        sample indices start to stop. The values are identical to the
+        corresponding elements of the full kinematics arrays. 
+        """
+        if self.kinematics_mode == 'analytic':
+            return self.kinematics_at(self.time_slice(start, stop))
+        # Pad by two samples either side so that the central differences 
+        # (applied twice) match those of the full arrays
+        lo = max(start - 2, 0)
+        hi = min(stop + 2, self.param['num_pt'])
+        angle = self.angle_slice(lo, hi)
+        index = slice(start - lo, stop - lo)
+        kinematics = {}
+        for side in ('left', 'right'):
+            axis = self.stalk_axis(angle, side)
+            pos = self.stalk_pos(axis, side)
+            if self.dtype != np.float64:
+                vel, acc = self.gradient_kinematics(angle, side)
+            else:
+                vel = np.gradient(pos, axis=-2)/self.dt
+                acc = np.gradient(vel, axis=-2)/self.dt
+            kinematics[side] = {
+                    'pos'  : pos[...,index,:],
+                    'vel'  : vel[...,index,:],
+                    'acc'  : acc[...,index,:],
+                    'axis' : axis[index],
+                    }
+        return kinematics
+
+    @profiling.stage('Halteres.kinematics_at')
+    def kinematics_at(self, t):
+        """
+        Haltere kinematics, as for kinematics_slice, at arbitrary times t,
+        e.g. the frame times of an experiment. The velocities and 
+        accelerations are computed in closed form, as for the 'analytic'
+        kinematics, whatever the kinematics mode.
+        """
+        angle, dangle, ddangle = self.analytic_angle_at(np.asarray(t, dtype=np.float64))
+        kinematics = {}
+        for side in ('left', 'right'):
+            axis = self.stalk_axis(angle, side)
+            daxis = self.stalk_axis_vel(axis, dangle, side)
+            ddaxis = self.stalk_axis_acc(axis, dangle, ddangle, side)
+            kinematics[side] = {
+                    'pos'  : self.stalk_pos(axis, side),
+                    'vel'  : self.stalk_vector(daxis, side),
+                    'acc'  : self.stalk_vector(ddaxis, side),
+                    'axis' : axis,
+                    }
+        return kinematics
 
     @property
     def kinematics_left(self):
@@ -149,7 +556,9 @@ class Halteres:
                 }
         return kinematics
 
-    def force_left(self, omega, domega=None, lin_acc=None):
+    def force_left(self, omega, domega=None, lin_acc=None, batch=False, 
+            components=None, projections=None, vectors=True, out=None):
+        batch = batch or self.batch_only
         force = calc_haltere_force(
                 self.param['mass'], 
                 self.pos_left, 
@@ -159,11 +568,19 @@ class Halteres:
                 self.lat_proj_axis_left, 
                 omega, 
                 domega,
-                lin_acc
+                lin_acc,
+                batch=batch,
+                components=components,
+                projections=projections,
+                vectors=vectors,
+                out=out,
+                dtype=self.dtype,
                 )
         return force
 
-    def force_right(self, omega, domega=None, lin_acc=None):
+    def force_right(self, omega, domega=None, lin_acc=None, batch=False, 
+            components=None, projections=None, vectors=True, out=None):
+        batch = batch or self.batch_only
         force = calc_haltere_force(
                 self.param['mass'], 
                 self.pos_right, 
@@ -173,110 +590,650 @@ class Halteres:
                 self.lat_proj_axis_right, 
                 omega, 
                 domega,
-                lin_acc
+                lin_acc,
+                batch=batch,
+                components=components,
+                projections=projections,
+                vectors=vectors,
+                out=out,
+                dtype=self.dtype,
                 )
         return force
 
-    def force(self, omega, domega=None, lin_acc=None):
-        force = {
-                'left'  : self.force_left(omega, domega, lin_acc), 
-                'right' : self.force_right(omega, domega, lin_acc), 
+    def force(self, omega, domega=None, lin_acc=None, batch=False, 
+            components=None, projections=None, vectors=True, out=None):
+        """
+        Computes the forces on the left and right halteres, see 
+        calc_haltere_force. 
+
+        The forces are returned as a ForceResult, backed by one array of
+        force vectors and one of projections, which is indexed as the nested
+        dicts of calc_haltere_force, e.g. force['left']['lateral']['coriolis'].
+        Constant components are stored rather than broadcast. The result 
+        may be written into an existing ForceResult, out, e.g. a view of part
+        of a larger result, see ForceResult.view. Otherwise output buffers, 
+        out, are given per side, e.g. {'left': {'lateral': {'coriolis': buf}},
+        'right': ...}, and the forces are returned as dicts.
+        """
+        batch = batch or self.batch_only
+        options = {
+                'batch'       : batch,
+                'components'  : components, 
+                'projections' : projections, 
+                'vectors'     : vectors, 
                 }
+        if out is not None and not isinstance(out, ForceResult):
+            force = {
+                    'left'  : self.force_left(omega, domega, lin_acc, 
+                        out=out.get('left'), **options), 
+                    'right' : self.force_right(omega, domega, lin_acc, 
+                        out=out.get('right'), **options), 
+                    }
+            return force
+        if out is None:
+            out = self.empty_result(self.param['num_pt'], omega, domega, lin_acc, **options)
+        self.force_left(omega, domega, lin_acc, out=out.buffers('left'), **options)
+        self.force_right(omega, domega, lin_acc, out=out.buffers('right'), **options)
+        return out
+
+    def empty_result(self, n, omega, domega=None, lin_acc=None, batch=False, 
+            components=None, projections=None, vectors=True):
+        """ Allocates the ForceResult of n samples for the inputs and options """
+        batch = batch or self.batch_only
+        components = FORCE_COMPONENTS if components is None else tuple(components)
+        projections = FORCE_PROJECTIONS if projections is None else tuple(projections)
+        shape = (n, 3)
+        if batch:
+            inputs = (np.asarray(a) for a in (omega, domega, lin_acc) if a is not None)
+            shape = (batch_size(*inputs),) + shape
+        return ForceResult.empty(shape, ('left', 'right'), components, projections, 
+                vectors, self.dtype)
+
+    @cached(*POS_KEYS, 'mass')
+    def response_basis(self):
+        """
+        Response basis of the projected haltere forces, for each side and
+        projection an (N,17) array whose columns are the fields multiplying 
+        the response features, see calc_response_basis. 
+        """
+        kinematics = {
+                'left'  : (self.pos_left, self.vel_left, self.acc_left, 
+                    self.axis_left, self.lat_proj_axis_left),
+                'right' : (self.pos_right, self.vel_right, self.acc_right, 
+                    self.axis_right, self.lat_proj_axis_right),
+                }
+        basis = {}
+        for side, (pos, vel, acc, axis, lat_axis) in kinematics.items():
+            basis[side] = {
+                    'radial'  : calc_response_basis(self.param['mass'], pos, vel, acc, axis),
+                    'lateral' : calc_response_basis(self.param['mass'], pos, vel, acc, lat_axis),
+                    }
+            # The cached arrays are nested so aren't made read-only by cached
+            for array in basis[side].values():
+                array.flags.writeable = False
+        return basis
+
+    def response_force(self, omega, domega=None, lin_acc=None, batch=False, 
+            components=None, projections=None):
+        """
+        Computes the projected forces on the left and right halteres from the
+        precomputed response basis. Each projection is the product of the 
+        basis and the response features of omega, domega and lin_acc, a 
+        matrix product for a batch of constant rotations. The returned 
+        dictionary has the layout of force with vectors=False, i.e.
+        force[side][projection][component], with (N,) or, if batch is True,
+        (M,N) arrays.
+        """
+        batch = batch or self.batch_only
+        components = FORCE_COMPONENTS if components is None else tuple(components)
+        projections = FORCE_PROJECTIONS if projections is None else tuple(projections)
+        features = response_features(omega, domega, lin_acc, batch, self.dtype)
+        force = {}
+        for side, side_basis in self.response_basis.items():
+            force[side] = {}
+            for proj_name in projections:
+                basis = side_basis[proj_name]
+                force[side][proj_name] = {
+                        k: apply_response(basis, features, RESPONSE_COLUMNS[k], batch)
+                        for k in components
+                        }
+        return force
+
+    def kernel_force(self, omega, domega=None, lin_acc=None, lateral_only=False):
+        """
+        Computes the forces on the left and right halteres with the generated
+        closed form kernels from the haltere angle and its derivatives, see 
+        kernels.calc_kernel_force. Best used with the 'analytic' kinematics.
+        """
+        from . import kernels
+        force = {}
+        for side in ('left', 'right'):
+            force[side] = kernels.calc_kernel_force(
+                    side,
+                    self.param['mass'],
+                    self.param['length'],
+                    self.param['separation'],
+                    self.param['tilt_angle'],
+                    self.angle,
+                    self.dangle,
+                    self.ddangle,
+                    omega,
+                    domega,
+                    lin_acc,
+                    lateral_only=lateral_only,
+                    dtype=self.dtype,
+                    )
+        return force
+
+    def iter_force(self, omega, domega=None, lin_acc=None, chunk_size=100_000, 
+            batch=False, components=None, projections=None, vectors=True):
+        """
+        Computes the forces on the left and right halteres in chunks of at
+        most chunk_size samples, yielding (t, force) for each chunk where t
+        are the chunk's sample times and force is as returned by force. 
+
+        Only the chunk's kinematics are held in memory so long simulations
+        can be run with bounded memory. Time-varying omega, domega and 
+        lin_acc, (N,3) arrays or (M,N,3) in batch mode, are sliced to match 
+        each chunk. The concatenated chunks are identical to the result of 
+        force, except in batch mode where they agree to within rounding. A 
+        final chunk of a single sample is merged into the preceding chunk as
+        a (1,3) input would be treated as constant. 
+        """
+        batch = batch or self.batch_only
+        num_pt = self.param['num_pt']
+        options = {
+                'batch'       : batch,
+                'components'  : components, 
+                'projections' : projections, 
+                'vectors'     : vectors, 
+                }
+        for start, stop in self.chunks(chunk_size):
+            inputs = [slice_samples(a, start, stop, num_pt, batch) 
+                    for a in (omega, domega, lin_acc)]
+            force = self.force_slice(start, stop, *inputs, **options)
+            yield self.time_slice(start, stop), force
+
+    def chunks(self, chunk_size):
+        """ 
+        Yields the (start, stop) sample indices of chunks of at most 
+        chunk_size samples, see iter_force. 
+        """
+        if chunk_size < 2:
+            raise ValueError('chunk_size must be >= 2')
+        num_pt = self.param['num_pt']
+        for start in range(0, num_pt, chunk_size):
+            stop = min(start + chunk_size, num_pt)
+            if stop == num_pt - 1:
+                stop = num_pt
+            elif start == num_pt - 1 and start > 0:
+                break
+            yield start, stop
+
+    def force_slice(self, start, stop, omega, domega=None, lin_acc=None, 
+            batch=False, components=None, projections=None, vectors=True):
+        """
+        Computes the forces on the left and right halteres for the sample 
+        indices start to stop, returned as a ForceResult. Time-varying omega,
+        domega and lin_acc must already be given for these samples only. 
+        """
+        kinematics = self.kinematics_slice(start, stop)
+        return self.kinematics_force(kinematics, stop - start, omega, domega, lin_acc,
+                batch, components, projections, vectors)
+
+    def force_at(self, t, omega, domega=None, lin_acc=None, batch=False, 
+            components=None, projections=None, vectors=True):
+        """
+        Computes the forces on the left and right halteres at arbitrary times
+        t, e.g. the frame times of an experiment, returned as a ForceResult.
+        The kinematics are computed in closed form at these times, see 
+        kinematics_at, so the times needn't be samples of t or uniformly 
+        spaced. Time-varying omega, domega and lin_acc must be given at 
+        these times.
+        """
+        t = np.atleast_1d(np.asarray(t, dtype=np.float64))
+        return self.kinematics_force(self.kinematics_at(t), len(t), omega, domega,
+                lin_acc, batch, components, projections, vectors)
+
+    def kinematics_force(self, kinematics, n, omega, domega=None, lin_acc=None, 
+            batch=False, components=None, projections=None, vectors=True):
+        """
+        Computes the forces on the left and right halteres for the kinematics
+        of n samples, see kinematics_slice, returned as a ForceResult.
+        """
+        batch = batch or self.batch_only
+        force = self.empty_result(n, omega, domega, lin_acc, batch=batch,
+                components=components, projections=projections, vectors=vectors)
+        lat_axis = {
+                'left'  : self.lat_proj_axis_left, 
+                'right' : self.lat_proj_axis_right,
+                }
+        for side, k in kinematics.items():
+            calc_haltere_force(
+                    self.param['mass'], 
+                    k['pos'], 
+                    k['vel'], 
+                    k['acc'], 
+                    k['axis'], 
+                    lat_axis[side], 
+                    omega,
+                    domega,
+                    lin_acc,
+                    batch=batch,
+                    components=components,
+                    projections=projections,
+                    vectors=vectors,
+                    out=force.buffers(side),
+                    dtype=self.dtype,
+                    )
         return force
 
     
 # -----------------------------------------------------------------------------
 
+FORCE_COMPONENTS = ('total', 'gravity', 'primary', 'linear_acc', 'angular_acc', 
+        'centrifugal', 'coriolis')
+
+FORCE_PROJECTIONS = ('radial', 'lateral')
+
+# Columns of the response basis and features for each force component, see
+# calc_response_basis
+RESPONSE_COLUMNS = {
+        'total'       : slice(0, 17),
+        'gravity'     : slice(0, 1),
+        'primary'     : slice(1, 2),
+        'linear_acc'  : slice(2, 5),
+        'angular_acc' : slice(5, 8),
+        'coriolis'    : slice(8, 11),
+        'centrifugal' : slice(11, 17),
+        }
+
+
+@profiling.stage('calc_haltere_force')
 def calc_haltere_force(m, h_pos, h_vel, h_acc, h_axis, h_lat_axis, omega, 
-        domega=None, lin_acc=None):
+        domega=None, lin_acc=None, batch=False, components=None, 
+        projections=None, vectors=True, out=None, dtype=None):
     """
     Computes the forces on a haltere given the mass, the position, velocity
     and acceleration vectors of the haltere, the angular velocity and angular
     acceleration of the body and the body linear acceleration.
 
+    Constant inputs are broadcast rather than copied and terms which are zero,
+    e.g. when domega or lin_acc aren't given, are not computed. Force
+    components which are constant or zero are returned as read-only broadcast
+    views unless an output buffer is given for them. 
+
     Parameters:
     m : float
-        the mass of the haltere
+        the mass of the haltere, or in batch mode a (M,) array of the mass
+        of each case
     h_pos : array_like
-        shape (N,3) array of haltere position vectors
+        shape (N,3) array of haltere position vectors, or in batch mode 
+        (M,N,3) for kinematics which differ between cases, e.g. those of a
+        Population
     h_vel : array_like
-        shape (N,3) array of haltere velocity vectors
+        shape (N,3) or (M,N,3) array of haltere velocity vectors
     h_acc : array_like
-        shape (N,3) array of haltere acceleration vectors
+        shape (N,3) or (M,N,3) array of haltere acceleration vectors
     h_axis : array_like
-        haltere stalk axis (3,1) array
+        haltere stalk axis (3,), (1,3) or (N,3) array, or (M,N,3) for the 
+        kinematics of each case
     h_lat_axis : array_like
-        haltere lateral force projection axis (3,) array
+        haltere lateral force projection axis (3,) array, or (M,3) for the
+        kinematics of each case
     omega : array_like
         shape (3,), (1,3) or (N,3)  array of body angular velocities
     domega : array_like
         shape (3,), (1,3) or (N,3) array of body angular accelerations 
     lin_acc: array_like
         shape (3,), (1,3) or (N,3) array of body linear accelerations
+    batch : bool
+        if True omega, domega and lin_acc are stacks of M cases with shape
+        (M,3) or (M,N,3), or (3,) for a value shared by all cases, and the 
+        returned force arrays have shape (M,N,3) (default=False).
+    components : sequence of str
+        names of the force components to compute, see FORCE_COMPONENTS
+        (default=None, all components).
+    projections : sequence of str
+        names of the projections of the force components to compute, see 
+        FORCE_PROJECTIONS (default=None, all projections).
+    vectors : bool
+        whether or not to return the force component vectors (default=True).
+        Projections of components onto the lateral axis are computed without
+        forming the vectors where possible.
+    out : dict
+        optional output buffers with the same layout as the returned dict,
+        e.g. {'lateral': {'coriolis': buf}}. Results for which a buffer is 
+        given are written into it. Buffers may be given for any subset of
+        the results.
+    dtype : data-type
+        the floating point type in which the forces are computed, by default
+        that of h_pos. Inputs of other types are converted. 
 
     Returns:
     force : dict
-        dictionary of (N,3) force arrays
+        dictionary of (N,3) force arrays, or (M,N,3) if batch is True, and
+        dictionaries of their (N,) or (M,N) projections
         force = {
-            'gravity'  : gravitational force, 
-            'primary'  : force due to haltere acceleration,
-            'lin_acc'  : force due to fly's linear acceleration,
-            'ang_acc'  : force due to fly's angular acceleration,
-            'centrif'  : centrifugal force on haltere,
-            'coriolis  : coriolis forces on haltere,
+            'total'       : total force on haltere, 
+            'gravity'     : gravitational force, 
+            'primary'     : force due to haltere acceleration,
+            'linear_acc'  : force due to fly's linear acceleration,
+            'angular_acc' : force due to fly's angular acceleration,
+            'centrifugal' : centrifugal force on haltere,
+            'coriolis'    : coriolis forces on haltere,
+            'radial'      : {projections onto the stalk axis}, 
+            'lateral'     : {projections onto the lateral axis},
         }
 
     """
-    # Gravitational acceleration vector
-    g = np.array([0.0, 0.0, -sp.constants.g])
+    # Convert the inputs to the floating point type of the computation
+    dtype = h_pos.dtype if dtype is None else np.dtype(dtype)
+    h_pos, h_vel, h_acc, h_axis, h_lat_axis = (np.asarray(a, dtype=dtype) 
+            for a in (h_pos, h_vel, h_acc, h_axis, h_lat_axis))
+    omega, domega, lin_acc = (None if a is None else np.asarray(a, dtype=dtype) 
+            for a in (omega, domega, lin_acc))
+    if np.ndim(m) > 0:
+        if not batch:
+            raise ValueError('an array of masses requires batch mode')
+        m = np.asarray(m, dtype=dtype)
 
-    # Get array size and check shapes of h_pos, h_vel and h_acc
-    n = h_pos.shape[0]
-    check_shape(h_pos, (n, 3))
-    check_shape(h_vel, (n, 3))
-    check_shape(h_acc, (n, 3))
-
-    # If domega or lin_acc aren't given assume they are zeros
-    if domega is None: 
-        domega = np.zeros_like(omega) 
-    if lin_acc is None: 
-        lin_acc = np.zeros_like(omega)
-
-    # Reshape omega, domega, and lin_acc to (n,3) in necessary
-    _g = reshape_to_nx3(n, g)
-    _omega = reshape_to_nx3(n, omega) 
-    _domega = reshape_to_nx3(n, domega)
-    _lin_acc = reshape_to_nx3(n, lin_acc)
-    _h_axis = reshape_to_nx3(n, h_axis)
-    _h_lat_axis = reshape_to_nx3(n, h_lat_axis)
+    # Get array size and check shapes of h_pos, h_vel and h_acc, which may
+    # be given for each case in batch mode
+    per_case = batch and h_pos.ndim == 3
+    n = h_pos.shape[-2] if per_case else h_pos.shape[0]
+    kinematics_shape = h_pos.shape if per_case else (n, 3)
+    check_shape(h_pos, kinematics_shape)
+    check_shape(h_vel, kinematics_shape)
+    check_shape(h_acc, kinematics_shape)
+
+    # Check the requested components and projections
+    components = FORCE_COMPONENTS if components is None else tuple(components)
+    projections = FORCE_PROJECTIONS if projections is None else tuple(projections)
+    for k in components:
+        if k not in FORCE_COMPONENTS:
+            raise ValueError(f'unknown force component, {k}')
+    for k in projections:
+        if k not in FORCE_PROJECTIONS:
+            raise ValueError(f'unknown force projection, {k}')
+    out = {} if out is None else out
+
+    # Views of the inputs reshaped to (n,3) or (k,n,3), constant inputs are
+    # broadcast rather than copied.
+    if batch:
+        inputs = [a for a in (omega, domega, lin_acc) if a is not None]
+        if per_case:
+            inputs.append(h_pos)
+        if np.ndim(m) > 0:
+            inputs.append(m[:,np.newaxis])
+        k = batch_size(*inputs)
+        shape = (k, n, 3)
+        reshape = functools.partial(reshape_to_mxnx3, k, n)
+    else:
+        shape = (n, 3)
+        reshape = functools.partial(reshape_to_nx3, n)
+
+    # Unit vectors of the projection axes, normalized once for all components
+    if is_constant(h_axis):
+        h_axis = h_axis.reshape(3)
+    if is_constant(h_lat_axis):
+        h_lat_axis = h_lat_axis.reshape(3)
+    elif per_case and h_lat_axis.ndim == 2:
+        h_lat_axis = h_lat_axis[:,np.newaxis,:]
+    axis = {'radial': h_axis, 'lateral': h_lat_axis}
+    axis_unit = {k: unit_vector(axis[k]) for k in projections}
+
+    # Terms for the force components, the total requires all of them
+    if 'total' in components:
+        names = FORCE_COMPONENTS[1:]
+    else:
+        names = components
+    terms = force_terms(m, h_pos, h_vel, h_acc, omega, domega, lin_acc, 
+            names, reshape, batch)
+    zero = np.zeros((), dtype=dtype)
 
     ## Compute the forces
-    f_gravity  =  m*_g
-    f_primary  = -m*h_acc 
-    f_lin_acc  = -m*lin_acc
-    f_ang_acc  = -m*np.cross(_domega, h_pos)
-    f_centrif  = -m*np.cross(_omega, np.cross(_omega, h_pos))
-    f_coriolis = -2.0*m*np.cross(_omega, h_vel)
-    f_total = f_gravity + f_primary + f_lin_acc + f_ang_acc + f_centrif + f_coriolis 
-
-    force = {
-            'total'       : f_total,
-            'gravity'     : f_gravity,  
-            'primary'     : f_primary, 
-            'linear_acc'  : f_lin_acc, 
-            'angular_acc' : f_ang_acc, 
-            'centrifugal' : f_centrif, 
-            'coriolis'    : f_coriolis, 
-            }
-    force_comp_names = list(force.keys())
-    force['radial']  = {}
-    force['lateral'] = {}
-    for k in force_comp_names:
-        force['radial'][k]  = project(force[k], _h_axis)
-        force['lateral'][k] = project(force[k], _h_lat_axis)
+    force = {}
+    if vectors:
+        for k in names:
+            force[k] = term_vector(terms[k], shape, out.get(k), zero)
+        if 'total' in components:
+            f_total = out.get('total')
+            if f_total is None:
+                f_total = np.zeros(shape, dtype=dtype)
+            else:
+                f_total[...] = 0.0
+            for k in names:
+                if terms[k][0] != 'zero':
+                    f_total += force[k]
+            force['total'] = f_total
+
+    # Project onto the haltere axes, the projections of the total force are
+    # sums of the projections of its components if it hasn't been computed.
+    for proj_name in projections:
+        force[proj_name] = {}
+        proj_out = out.get(proj_name, {})
+        unit = axis_unit[proj_name]
+        for k in components:
+            kind = terms[k][0] if k in terms else None
+            if k in force and kind not in ('zero', 'const'):
+                proj = project_unit(force[k], unit, out=proj_out.get(k))
+            elif k == 'total':
+                proj = proj_out.get(k)
+                if proj is None:
+                    proj = np.zeros(shape[:-1], dtype=dtype)
+                else:
+                    proj[...] = 0.0
+                for kk in names:
+                    if terms[kk][0] != 'zero':
+                        proj += term_projection(terms[kk], unit, shape, zero=zero)
+            else:
+                proj = term_projection(terms[k], unit, shape, out=proj_out.get(k), zero=zero)
+            force[proj_name][k] = proj
+
+    # Remove the component vectors only computed for the total
+    for k in names:
+        if k not in components:
+            force.pop(k, None)
     return force
 
 
+@profiling.stage('force_terms')
+def force_terms(m, h_pos, h_vel, h_acc, omega, domega, lin_acc, names, 
+        reshape, batch=False):
+    """
+    Returns descriptions of the terms used to compute the force components.
+    Each term is a tuple whose first item gives its kind:
+
+    ('zero',)              : the component is zero
+    ('const', c)           : the component is constant c, (3,) or (k,1,3)
+    ('linear', src, mat)   : the component is src @ mat.T, mat is a scalar,
+                             (3,3) or (k,3,3) matrix
+    ('array', f)           : the component is the array f
+
+    Deferring evaluation of the terms allows their projections to be 
+    computed without forming the (n,3) force vectors. 
+
+    Parameters
+    m : float or array_like
+        the mass of the haltere, or (k,) masses of the cases of a batch
+    h_pos, h_vel, h_acc : array_like
+        shape (n,3) or (k,n,3) arrays of haltere position, velocity and 
+        acceleration 
+    omega, domega, lin_acc : array_like
+        body angular velocity, angular acceleration and linear acceleration
+    names : sequence of str
+        names of the force components 
+    reshape : callable
+        reshapes inputs to (n,3) or (k,n,3) views
+    batch : bool
+        whether or not the inputs are batch inputs
+
+    Returns
+    terms : dict
+        dictionary of terms for each force component in names
+    
+    """
+    g = np.array([0.0, 0.0, -GRAVITY], dtype=h_pos.dtype)
+    if batch:
+        as_const = lambda a: a.reshape(-1, 1, 3) if a.ndim > 1 else a
+    else:
+        as_const = lambda a: a.reshape(3)
+    if np.ndim(m) == 0:
+        m_vec = m_mat = m
+    else:
+        # Masses of the cases broadcast against (k,3) vectors, and against
+        # (k,3,3) matrices or (k,n,3) arrays
+        m_vec = m[:,np.newaxis]
+        m_mat = m[:,np.newaxis,np.newaxis]
+    terms = {}
+    for k in names:
+        match k:
+            case 'gravity':
+                term = ('const', as_const(m_vec*g))
+            case 'primary':
+                if np.ndim(m) == 0:
+                    term = ('linear', h_acc, -m)
+                else:
+                    term = ('array', -m_mat*h_acc)
+            case 'linear_acc':
+                if lin_acc is None or not np.any(lin_acc):
+                    term = ('zero',)
+                elif is_constant(lin_acc, batch):
+                    term = ('const', as_const(-m_vec*lin_acc))
+                else:
+                    term = ('array', -m_mat*reshape(lin_acc))
+            case 'angular_acc':
+                if domega is None or not np.any(domega):
+                    term = ('zero',)
+                elif is_constant(domega, batch):
+                    term = ('linear', h_pos, -m_mat*cross_matrix(domega))
+                else:
+                    term = ('array', -m_mat*np.cross(reshape(domega), h_pos))
+            case 'centrifugal':
+                if not np.any(omega):
+                    term = ('zero',)
+                elif is_constant(omega, batch):
+                    omega_mat = cross_matrix(omega)
+                    term = ('linear', h_pos, -m_mat*omega_mat @ omega_mat)
+                else:
+                    _omega = reshape(omega)
+                    term = ('array', -m_mat*np.cross(_omega, np.cross(_omega, h_pos)))
+            case 'coriolis':
+                if not np.any(omega):
+                    term = ('zero',)
+                elif is_constant(omega, batch):
+                    term = ('linear', h_vel, -2.0*m_mat*cross_matrix(omega))
+                else:
+                    term = ('array', -2.0*m_mat*np.cross(reshape(omega), h_vel))
+        terms[k] = term
+    return terms
+
+
+@profiling.stage('term_vector')
+def term_vector(term, shape, out=None, zero=0.0):
+    """
+    Evaluates a force term, see force_terms, as an array of force vectors.
+
+    Parameters
+    term : tuple
+        the force term
+    shape : tuple
+        the shape, (n,3) or (k,n,3), of the force array
+    out : array_like
+        optional output buffer
+    zero : array_like
+        the zero, of the floating point type of the force, broadcast for 
+        zero terms
+
+    Returns
+    f : array_like
+        the force array, a read-only view for zero and constant terms unless
+        out is given
+    """
+    match term:
+        case ('zero',):
+            if out is None:
+                return np.broadcast_to(zero, shape)
+            out[...] = 0.0
+            return out
+        case ('const', c):
+            if out is None:
+                return np.broadcast_to(c, shape)
+            np.copyto(out, np.broadcast_to(c, shape))
+            return out
+        case ('linear', src, mat):
+            if np.ndim(mat) == 0:
+                f = np.multiply(src, mat, out=out)
+            elif out is not None and src.shape != shape and mat.ndim == 2:
+                np.copyto(out, apply_matrix(src, mat))
+                f = out
+            else:
+                f = apply_matrix(src, mat, out=out)
+            return expand(f, shape)
+        case ('array', f):
+            if out is None:
+                return f
+            np.copyto(out, f)
+            return out
+
+
+@profiling.stage('term_projection')
+def term_projection(term, unit, shape, out=None, zero=0.0):
+    """
+    Evaluates the projection of a force term, see force_terms, onto an axis. 
+    Linear terms are projected onto constant axes without forming the force
+    vectors. 
+
+    Parameters
+    term : tuple
+        the force term
+    unit : array_like
+        (3,) or (n,3) array of unit vectors of the projection axis, or
+        (k,1,3) for constant axes of each case of a batch
+    shape : tuple
+        the shape, (n,3) or (k,n,3), of the force array
+    out : array_like
+        optional output buffer
+    zero : array_like
+        the zero broadcast for zero terms, see term_vector
+
+    Returns
+    p : array_like
+        the (n,) or (k,n) projection, a read-only view for zero and constant
+        projections unless out is given
+    """
+    match term:
+        case ('zero',):
+            p = np.broadcast_to(zero, shape[:-1])
+        case ('const', c):
+            p = np.broadcast_to(project_unit(c, unit), shape[:-1])
+        case ('linear', src, mat) if unit.ndim == 1 or unit.shape[-2:] == (1, 3):
+            if unit.ndim == 1:
+                w = mat*unit if np.ndim(mat) == 0 else transpose(mat) @ unit
+            elif np.ndim(mat) == 0:
+                w = mat*unit[:,0]
+            else:
+                # Constant axes of each case of a batch, (k,1,3)
+                w = np.einsum('...ji,...j->...i', mat, unit[:,0])
+            if w.ndim == 2:
+                p_out = None if out is None else out[..., np.newaxis]
+                p = np.matmul(src, w[..., np.newaxis], out=p_out)[..., 0]
+            elif src.ndim == 3:
+                p = np.einsum('...j,j->...', src, w, out=out)
+            elif out is not None and out.ndim == 1:
+                p = np.einsum('ij,j->i', src, w, out=out)
+            else:
+                p = np.einsum('ij,j->i', src, w)
+            p = expand(p, shape[:-1])
+        case _:
+            p = project_unit(term_vector(term, shape, zero=zero), unit, out=out)
+    if out is not None and p is not out:
+        np.copyto(out, p)
+        p = out
+    return p
+
+
 def check_shape(a, shape):
     """
     Check to see if the shape of array is equal to shape. Raises
@@ -289,13 +1246,32 @@ def check_shape(a, shape):
 
     """
     if a.shape != shape:
-        raise ValueError(f'shape of array must be ({n},{m})')
+        raise ValueError(f'shape of array must be {shape}')
+
+
+def is_constant(a, batch=False):
+    """
+    Returns True if the input array is a single (3,) or (1,3) vector, or a
+    stack of (m,3) vectors in batch mode, i.e. if it is constant in time. 
+
+    Parameters
+    a : array_like
+        the input array 
+    batch : bool
+        whether or not the input is a stack of batch inputs
+
+    Returns
+    value : bool
+        True if the input is constant in time
+
+    """
+    return a.ndim == 1 or (a.ndim == 2 and (batch or a.shape[0] == 1))
 
 
 def reshape_to_nx3(n, a):
     """
     Reshapes input array to shape (n,3) array. If input is (3,) or (1,3)
-    the array is repeated n times. 
+    the array is broadcast to (n,3) as a read-only view without copying. 
 
     Parameters 
     n : int
@@ -305,14 +1281,12 @@ def reshape_to_nx3(n, a):
 
     Returns:
     _a : array_like
-        the array a reshaped to be (n
+        the array a reshaped to be (n,3)
 
     """
     match a.shape:
-        case (3,):
-            _a = np.repeat(a[np.newaxis, ...], n, axis=0)
-        case (1,3): 
-            _a = np.repeat(a, n, axis=0) 
+        case (3,) | (1,3):
+            _a = np.broadcast_to(a, (n, 3))
         case (k,3) if k==n: 
             _a = a
         case _:
@@ -320,6 +1294,293 @@ def reshape_to_nx3(n, a):
     return _a
 
 
+def reshape_to_mxnx3(m, n, a):
+    """
+    Reshapes input array to shape (m,n,3) array. If input is (3,) the array 
+    is repeated m*n times, if it is (m,3) each row is repeated n times and 
+    if it is (1,n,3) the array is repeated m times.
+
+    Parameters 
+    m : int
+        number of cases in the batch 
+    n : int
+        number of rows in each case 
+    a : array like
+        the input array must be (3,), (m,3), (1,n,3) or (m,n,3)
+
+    Returns:
+    _a : array_like
+        the array a reshaped to be (m,n,3)
+
+    """
+    match a.shape:
+        case (3,):
+            _a = np.broadcast_to(a, (m, n, 3))
+        case (k,3) if k==m:
+            _a = np.broadcast_to(a[:, np.newaxis, :], (m, n, 3))
+        case (1,k,3) if k==n:
+            _a = np.broadcast_to(a, (m, n, 3))
+        case (j,k,3) if j==m and k==n:
+            _a = a
+        case _:
+            raise ValueError('array, a, must be (3,), (m,3), (1,n,3) or (m,n,3)')
+    return _a
+
+
+def slice_samples(a, start, stop, num_pt, batch=False):
+    """ 
+    Slices the samples start to stop from a time-varying (N,3) array, or
+    (M,N,3) array in batch mode. Constant inputs are returned unchanged. 
+    """
+    if a is None:
+        return a
+    a = np.asarray(a)
+    if batch and a.ndim == 3 and a.shape[1] == num_pt:
+        return a[:,start:stop]
+    if not batch and a.ndim == 2 and a.shape[0] == num_pt and num_pt > 1:
+        return a[start:stop]
+    return a
+
+
+def batch_size(*arrays):
+    """
+    Returns the number of cases in a batch of input arrays, i.e. the length
+    of the leading axis of those arrays which have one. Raises ValueError if
+    the arrays disagree. 
+
+    Parameters
+    arrays : array_like
+        the batch input arrays each (3,), (m,3) or (m,n,3)
+
+    Returns
+    m : int
+        the number of cases in the batch
+
+    """
+    sizes = {a.shape[0] for a in arrays if a.ndim > 1 and a.shape[0] > 1}
+    if len(sizes) > 1:
+        raise ValueError(f'batch arrays have inconsistent sizes, {sizes}')
+    return sizes.pop() if sizes else 1
+
+
+
+def cross_matrix(a):
+    """
+    Returns the skew-symmetric cross product matrix, A, of the vector a such 
+    that A @ b == np.cross(a, b). Used to compute cross products with vectors
+    which are constant in time as a single matrix product.
+
+    Parameters
+    a : array_like
+        (3,), (1,3) or (m,3) array of vectors
+
+    Returns
+    a_mat : array_like
+        (3,3) or (m,3,3) array of cross product matrices
+
+    """
+    a = a.reshape(-1, 3) if a.ndim > 1 and a.shape[0] > 1 else a.reshape(3)
+    a_mat = np.zeros(a.shape + (3,), dtype=a.dtype)
+    a_mat[..., 0, 1] = -a[..., 2]
+    a_mat[..., 0, 2] =  a[..., 1]
+    a_mat[..., 1, 0] =  a[..., 2]
+    a_mat[..., 1, 2] = -a[..., 0]
+    a_mat[..., 2, 0] = -a[..., 1]
+    a_mat[..., 2, 1] =  a[..., 0]
+    return a_mat
+
+
+def expand(a, shape):
+    """
+    Broadcasts the array a to the given shape as a read-only view. Arrays 
+    which already have the given shape are returned unchanged.
+    """
+    return a if a.shape == shape else np.broadcast_to(a, shape)
+
+
+def apply_matrix(src, mat, out=None):
+    """
+    Computes src @ mat.T for an (n,3) or (k,n,3) array of vectors, src, and
+    a (3,3) or (k,3,3) array of matrices, mat. A single matrix is applied 
+    with einsum which, unlike the BLAS backed matmul, gives results for each
+    row that don't depend on n, so that chunked and single-shot evaluations
+    agree exactly. 
+
+    Parameters
+    src : array_like
+        (n,3) or (k,n,3) array of vectors
+    mat : array_like
+        (3,3) or (k,3,3) array of matrices
+    out : array_like
+        optional output buffer
+
+    Returns
+    f : array_like
+        (n,3) or (k,n,3) array of transformed vectors
+    """
+    if mat.ndim == 2 and src.ndim == 2:
+        f = np.einsum('ij,kj->ik', src, mat, out=out)
+    elif mat.ndim == 2:
+        f = np.einsum('...ij,kj->...ik', src, mat, out=out)
+    else:
+        f = np.matmul(src, transpose(mat), out=out)
+    return f
+
+
+def transpose(a):
+    """ Transposes the last two axes of an array of matrices """
+    return np.swapaxes(a, -1, -2)
+
+
+def calc_response_basis(m, h_pos, h_vel, h_acc, h_axis):
+    """
+    Computes the response basis of the forces on a haltere projected onto an
+    axis. For fixed haltere kinematics the force projections are linear in 
+    the body linear acceleration, a, angular acceleration, domega, and 
+    angular velocity, omega, except for the centrifugal force which is 
+    quadratic in omega. The projections are therefore the product of the 
+    (N,17) basis and the 17 response features, see response_features,
+
+    column   feature                                   component
+    0        1                                         gravity
+    1        1                                         primary
+    2-4      a_x, a_y, a_z                             linear_acc
+    5-7      domega_x, domega_y, domega_z              angular_acc
+    8-10     omega_x, omega_y, omega_z                 coriolis
+    11-16    omega_x**2, omega_y**2, omega_z**2,       centrifugal
+             omega_x*omega_y, omega_x*omega_z, 
+             omega_y*omega_z
+
+    Parameters:
+    m : float
+        the mass of the haltere
+    h_pos, h_vel, h_acc : array_like
+        shape (N,3) arrays of haltere position, velocity and acceleration 
+    h_axis : array_like
+        the projection axis (3,) or (N,3) array
+
+    Returns:
+    basis : array_like
+        (N,17) array of response fields
+
+    """
+    n = h_pos.shape[0]
+    u = np.broadcast_to(unit_vector(h_axis), (n, 3))
+    pos_u = np.einsum('ij,ij->i', h_pos, u)
+    basis = np.empty((n, 17), dtype=h_pos.dtype)
+    basis[:,0] = -m*GRAVITY*u[:,2]
+    basis[:,1] = -m*np.einsum('ij,ij->i', h_acc, u)
+    basis[:,2:5] = -m*u
+    basis[:,5:8] = -m*np.cross(h_pos, u)
+    basis[:,8:11] = -2.0*m*np.cross(h_vel, u)
+    basis[:,11:14] = -m*(u*h_pos - pos_u[:,np.newaxis])
+    basis[:,14] = -m*(u[:,0]*h_pos[:,1] + u[:,1]*h_pos[:,0])
+    basis[:,15] = -m*(u[:,0]*h_pos[:,2] + u[:,2]*h_pos[:,0])
+    basis[:,16] = -m*(u[:,1]*h_pos[:,2] + u[:,2]*h_pos[:,1])
+    return basis
+
+
+def response_features(omega, domega=None, lin_acc=None, batch=False, dtype=np.float64):
+    """
+    Computes the response features, see calc_response_basis, of the body 
+    angular velocity, angular acceleration and linear acceleration.
+
+    Parameters:
+    omega, domega, lin_acc : array_like
+        (3,) or (N,3) arrays, or (M,3) or (M,N,3) if batch is True. domega 
+        and lin_acc are zero if not given.
+    dtype : data-type
+        the floating point type of the features (default=np.float64)
+
+    Returns:
+    features : array_like
+        (17,) array of features, or (N,17), (M,17) or (M,N,17) 
+
+    """
+    inputs = [None if a is None else np.asarray(a) for a in (omega, domega, lin_acc)]
+    if batch and any(a is not None and a.ndim == 3 for a in inputs):
+        # constant (M,3) inputs are broadcast along the samples
+        inputs = [a[:,np.newaxis,:] if a is not None and a.ndim == 2 else a for a in inputs]
+    omega, domega, lin_acc = inputs
+    shape = np.broadcast_shapes(*(a.shape for a in inputs if a is not None))
+    features = np.zeros(shape[:-1] + (17,), dtype=dtype)
+    features[...,0:2] = 1.0
+    if lin_acc is not None:
+        features[...,2:5] = lin_acc
+    if domega is not None:
+        features[...,5:8] = domega
+    features[...,8:11] = omega
+    features[...,11:14] = omega**2
+    features[...,14] = omega[...,0]*omega[...,1]
+    features[...,15] = omega[...,0]*omega[...,2]
+    features[...,16] = omega[...,1]*omega[...,2]
+    return features
+
+
+def apply_response(basis, features, columns=slice(None), batch=False):
+    """
+    Evaluates force projections from the (N,17) response basis and features 
+    for the given columns. Constant features, (17,) or (M,17) if batch is 
+    True, are applied by matrix product and time-varying features, (N,17) 
+    or (M,N,17), sample by sample. A (B,N,17) basis of a batch of
+    individuals, see Population, is applied to batch features of the
+    individuals, (B,17) or (B,N,17), or shared by them.
+    """
+    basis = basis[...,columns]
+    features = features[...,columns]
+    if basis.ndim == 3:
+        if features.ndim < 3:
+            features = features[...,np.newaxis,:]
+        return np.einsum('...ij,...ij->...i', basis, features)
+    if features.ndim == 1:
+        return basis @ features
+    if features.ndim == 2 and batch:
+        return features @ basis.T
+    if features.ndim == 2:
+        return np.einsum('ij,ij->i', basis, features)
+    return np.einsum('ij,kij->ki', basis, features)
+
+
+def unit_vector(b):
+    """
+    Normalizes vectors to unit length
+
+    Parameters
+    b : array_like
+        (k,) or (n,k) array of vectors
+
+    Returns
+    b_unit : array_like
+        array of unit vectors with the same shape as b
+    """
+    b_norm = np.linalg.norm(b, axis=-1)
+    b_unit = b/b_norm[..., np.newaxis]
+    return b_unit
+
+
+@profiling.stage('project_unit')
+def project_unit(a, b_unit, out=None):
+    """
+    Get projection of vector array a onto an array of unit vectors b_unit
+
+    Parameters
+    a : array_like
+        (k,), (n,k) or (m,n,k) array of vectors 
+    b_unit : array_like
+        (k,) unit vector or (n,k) array of unit vectors
+    out : array_like
+        optional output buffer
+
+    Returns
+    p : array_like
+        array of projections of a vectors onto b_unit vectors
+    """
+    if b_unit.ndim == 1:
+        p = np.einsum('...i,i->...', a, b_unit, out=out)
+    else:
+        p = np.einsum('...i,...i->...', a, b_unit, out=out)
+    return p
+
 
 def project(a,b):
     """
@@ -327,17 +1588,16 @@ def project(a,b):
 
     Parameters
     a : array_like
-        (n,k) array of vectors where each a[i,:] is length k vector
+        (n,k) or (m,n,k) array of vectors where each a[...,i,:] is length k 
+        vector
     b : array_like
         (n,k) array of vectory where each b[i,:] is length k vector
 
     Returns
     p : array_like
-        (n,) array of projections of a vectors onto b vectors
+        (n,) or (m,n) array of projections of a vectors onto b vectors
     """
-    b_norm = np.linalg.norm(b,axis=1)
-    b_unit = b/b_norm[:, np.newaxis]
-    p = np.sum(a*b_unit, axis=1)
+    p = project_unit(a, unit_vector(b))
     return p
 
    
@@ -0,0 +1,222 @@
+import numpy as np
+from .halteres import slice_samples
+
+
+def harmonics(x, num_cycle, num_harmonic=3):
+    """
+    Computes the Fourier coefficients of each stroke cycle of traces sampled
+    on the Halteres time base, i.e. num_pt samples spanning num_cycle cycles
+    with the last sample at the end of the final cycle.
+
+    The coefficients c_k of a cycle are those of the approximation
+    x(t) ~ Re(sum_k c_k*exp(i*k*phi(t))), with phi = 2*pi*frequency*t, so
+    c_0 is the mean and, for k >= 1, |c_k| and np.angle(c_k) are the
+    amplitude and phase of the k-th harmonic of the stroke frequency. They
+    are computed by demodulating the samples of each cycle, which is exact
+    (the DFT of the cycle) when (num_pt - 1) is a multiple of num_cycle. The
+    final sample, which starts a new cycle, isn't used.
+
+    Parameters
+    ----------
+    x : array_like
+        (..., N) array of traces, e.g. lateral force projections
+    num_cycle : int
+        the number of stroke cycles spanned by the traces
+    num_harmonic : int
+        the number of harmonics, k = 1 to num_harmonic
+
+    Returns
+    -------
+    coef : array_like
+        complex (..., num_cycle, num_harmonic + 1) array of the coefficients
+        c_0 to c_num_harmonic of each cycle
+
+    """
+    x = np.asarray(x)
+    num_pt = x.shape[-1]
+    starts = cycle_starts(num_pt, num_cycle)
+    return demodulate(x, 0, starts, num_pt, num_cycle, num_harmonic)
+
+
+def iter_harmonics(hsim, omega, domega=None, lin_acc=None, num_harmonic=3,
+        components=('coriolis',), projections=('lateral',), batch=False,
+        chunk_size=100_000):
+    """
+    Computes the per cycle Fourier coefficients, see harmonics, of force
+    projections on the left and right halteres in chunks of whole cycles of
+    at most chunk_size samples (or one cycle), yielding (cycles, coef) for
+    each chunk where cycles is the range of cycle indices of the chunk.
+
+    Only the chunk's kinematics and force projections are held in memory.
+    Time-varying omega, domega and lin_acc are sliced to match each chunk,
+    as for Halteres.iter_force.
+
+    Parameters
+    ----------
+    hsim : Halteres
+        the haltere simulation
+    omega, domega, lin_acc : array_like
+        body angular velocity, angular acceleration and linear acceleration,
+        see Halteres.force
+    num_harmonic : int
+        the number of harmonics
+    components, projections : tuple
+        the force components and projections to demodulate
+    batch : bool
+        whether or not the inputs are batches of M cases
+    chunk_size : int
+        the maximum number of samples per chunk
+
+    Yields
+    ------
+    cycles : range
+        the indices of the chunk's cycles
+    coef : dict
+        dictionary coef[side][projection][component] of complex
+        (cycles, num_harmonic + 1) arrays, or (M, cycles, num_harmonic + 1)
+        if batch is True
+
+    """
+    for cycles, coef, force in iter_coef_arrays(hsim, omega, domega, lin_acc, 
+            num_harmonic, components, projections, batch, chunk_size):
+        yield cycles, coef_dict(coef, force.projection_names, force.components)
+
+
+def force_harmonics(hsim, omega, domega=None, lin_acc=None, num_harmonic=3,
+        components=('coriolis',), projections=('lateral',), batch=False,
+        chunk_size=100_000):
+    """
+    Computes the per cycle Fourier coefficients, see harmonics, of force
+    projections on the left and right halteres by streaming evaluation, see
+    iter_harmonics, so that the full force traces are never held in memory.
+
+    Returns
+    -------
+    coef : dict
+        dictionary coef[side][projection][component] of complex (num_cycle,
+        num_harmonic + 1) arrays, or (M, num_cycle, num_harmonic + 1) if
+        batch is True. These are views of a single contiguous array.
+
+    """
+    num_cycle = hsim.param['num_cycle']
+    coef = None
+    for cycles, chunk_coef, force in iter_coef_arrays(hsim, omega, domega, lin_acc,
+            num_harmonic, components, projections, batch, chunk_size):
+        if coef is None:
+            shape = chunk_coef.shape[:-2] + (num_cycle, num_harmonic + 1)
+            coef = np.empty(shape, dtype=chunk_coef.dtype)
+        coef[...,cycles.start:cycles.stop,:] = chunk_coef
+    return coef_dict(coef, force.projection_names, force.components)
+
+
+def iter_coef_arrays(hsim, omega, domega, lin_acc, num_harmonic, components, 
+        projections, batch, chunk_size):
+    """
+    Yields (cycles, coef, force) for each chunk of iter_harmonics, where coef
+    is the (side, projection, component, ..., cycles, harmonic) array of
+    coefficients of the projections of the ForceResult force.
+    """
+    num_pt = hsim.param['num_pt']
+    num_cycle = hsim.param['num_cycle']
+    starts = cycle_starts(num_pt, num_cycle)
+    options = {
+            'batch'       : batch,
+            'components'  : components,
+            'projections' : projections,
+            'vectors'     : False,
+            }
+    for c0, c1 in cycle_chunks(starts, chunk_size):
+        start, stop = starts[c0], starts[c1]
+        inputs = [slice_samples(a, start, stop, num_pt, batch)
+                for a in (omega, domega, lin_acc)]
+        force = hsim.force_slice(start, stop, *inputs, **options)
+        coef = demodulate(force.projections, start, starts[c0:c1 + 1], num_pt,
+                num_cycle, num_harmonic)
+        yield range(c0, c1), coef, force
+
+
+def cycle_starts(num_pt, num_cycle):
+    """
+    Index of the first sample of each cycle, followed by the index of the
+    final sample, for the Halteres time base. Sample n is in cycle
+    floor(n*num_cycle/(num_pt - 1)), computed exactly in integer arithmetic.
+    """
+    if num_pt - 1 < 2*num_cycle:
+        raise ValueError('there must be at least two samples per cycle')
+    c = np.arange(num_cycle + 1)
+    return -(-c*(num_pt - 1)//num_cycle)
+
+
+def cycle_chunks(starts, chunk_size):
+    """
+    Yields (c0, c1) ranges of whole cycles spanning at most chunk_size
+    samples, or a single cycle if it is longer.
+    """
+    num_cycle = len(starts) - 1
+    c0 = 0
+    while c0 < num_cycle:
+        c1 = int(np.searchsorted(starts, starts[c0] + chunk_size, side='right')) - 1
+        c1 = min(max(c1, c0 + 1), num_cycle)
+        yield c0, c1
+        c0 = c1
+
+
+def demodulate(x, offset, starts, num_pt, num_cycle, num_harmonic):
+    """
+    Fourier coefficients of the cycles with the given starts, see
+    cycle_starts, of the (..., n) array x of samples offset to offset + n.
+    """
+    lengths = np.diff(starts)
+    if (num_pt - 1) % num_cycle == 0:
+        # The cycles have the same number of samples and phases, so the
+        # samples are viewed as (..., cycles, samples) and demodulated by
+        # one matrix product
+        num_sample = lengths[0]
+        samples = x[...,starts[0] - offset:starts[-1] - offset]
+        samples = samples.reshape(samples.shape[:-1] + (len(lengths), num_sample))
+        index = np.arange(num_sample)
+        y = samples @ demodulation_basis(index, num_sample, num_pt, num_cycle, 
+                num_harmonic, x.dtype)
+    else:
+        # Cycles with fewer samples are padded, with zero weights
+        num_sample = lengths.max()
+        index = starts[:-1,np.newaxis] + np.arange(num_sample)
+        mask = np.arange(num_sample) < lengths[:,np.newaxis]
+        index = np.where(mask, index, starts[:-1,np.newaxis])
+        basis = demodulation_basis(index, lengths[:,np.newaxis], num_pt, num_cycle, 
+                num_harmonic, x.dtype)
+        basis *= mask[...,np.newaxis]
+        y = np.einsum('...cp,cpk->...ck', x[...,index - offset], basis)
+    coef = y[...,:num_harmonic + 1].astype(np.result_type(y, 1j))
+    coef[...,1:] -= 1j*y[...,num_harmonic + 1:]
+    return coef
+
+
+def demodulation_basis(index, length, num_pt, num_cycle, num_harmonic, dtype):
+    """
+    The (..., 2*num_harmonic + 1) weighted cos and sin basis, for the sample
+    indices index of cycles of the given lengths, whose products with the 
+    samples are the real and imaginary parts of the coefficients.
+    """
+    k = np.arange(num_harmonic + 1)
+    phase = 2.0*np.pi*((index*num_cycle) % (num_pt - 1))/(num_pt - 1)
+    kphase = k*phase[...,np.newaxis]
+    weight = np.full(2*num_harmonic + 1, 2.0)
+    weight[0] = 1.0
+    basis = np.concatenate([np.cos(kphase), np.sin(kphase[...,1:])], axis=-1)
+    basis *= weight/np.asarray(length)[...,np.newaxis]
+    return basis.astype(np.result_type(dtype, 1.0), copy=False)
+
+
+def coef_dict(coef, projections, components):
+    """
+    Nested dict views, coef[side][projection][component], of the (side,
+    projection, component, ...) array of coefficients.
+    """
+    coef_views = {}
+    for i, side in enumerate(('left', 'right')):
+        coef_views[side] = {
+                proj_name: {k: coef[i,j,l] for l, k in enumerate(components)}
+                for j, proj_name in enumerate(projections)
+                }
+    return coef_views
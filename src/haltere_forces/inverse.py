@@ -0,0 +1,197 @@
+import numpy as np
+from .halteres import RESPONSE_COLUMNS
+
+# Order of the haltere sides in the rows of the windowed regressions
+SIDES = ('left', 'right')
+
+
+class Decoder:
+    """
+    Estimates the body angular velocity, and optionally angular acceleration,
+    from the total lateral forces on the left and right halteres by windowed
+    least squares regression.
+
+    The lateral forces are linear in omega and domega apart from the small
+    centrifugal term, see Halteres.response_basis. Within each window omega
+    is modelled as omega_0 + domega*(t - t_c), with t_c the window center
+    time, or as constant if domega isn't estimated. As the haltere kinematics
+    are fixed the pseudo-inverse of each window's regression is computed once
+    and a batch of M force traces is decoded by a single product. The
+    centrifugal term is then removed, using the current estimate, and the
+    regression repeated num_iter times.
+
+    The decoder uses the kinematics of hsim at the time it is created and
+    must be recreated if its parameters change.
+
+    Parameters
+    ----------
+    hsim : Halteres
+        the haltere simulation which produced, or models, the forces
+    window : int, optional
+        number of samples per window, by default the samples per stroke cycle
+    step : int, optional
+        number of samples between the starts of windows, by default window
+    domega : bool
+        whether or not to estimate the angular acceleration (default=False),
+        otherwise it is assumed to be zero.
+    lin_acc : array_like, optional
+        known (3,) or (N,3) body linear acceleration, zero if not given
+    num_iter : int
+        number of centrifugal corrections (default=2), 0 ignores the
+        centrifugal force.
+    rcond : float, optional
+        cutoff for small singular values, see numpy.linalg.pinv
+
+    """
+
+    def __init__(self, hsim, window=None, step=None, domega=False, lin_acc=None,
+            num_iter=2, rcond=None):
+        num_pt = hsim.param['num_pt']
+        if window is None:
+            window = int(round((num_pt - 1)/hsim.param['num_cycle']))
+        if step is None:
+            step = window
+        if not 2 <= window <= num_pt:
+            raise ValueError(f'window must be between 2 and num_pt, {window}')
+        if step < 1:
+            raise ValueError(f'step must be positive, {step}')
+        self.num_pt = num_pt
+        self.window = window
+        self.step = step
+        self.estimate_domega = domega
+        self.num_iter = num_iter
+
+        # (K,W) sample indices of the windows and times relative to their centers
+        starts = np.arange(0, num_pt - window + 1, step)
+        self.index = starts[:,np.newaxis] + np.arange(window)
+        t = hsim.t[self.index]
+        self.t = t.mean(axis=1)
+        self.tau = t - self.t[:,np.newaxis]
+
+        # Known forces, the gravity, primary and linear acceleration terms
+        offset = []
+        basis = []
+        for side in SIDES:
+            b = hsim.response_basis[side]['lateral']
+            f = b[:,RESPONSE_COLUMNS['gravity']].sum(axis=1)
+            f += b[:,RESPONSE_COLUMNS['primary']].sum(axis=1)
+            if lin_acc is not None:
+                a = np.broadcast_to(lin_acc, (num_pt, 3))
+                f += np.einsum('ij,ij->i', b[:,RESPONSE_COLUMNS['linear_acc']], a)
+            offset.append(f)
+            basis.append(b[self.index])
+        self.offset = np.concatenate([f[self.index] for f in offset], axis=1)
+
+        # (K,2W,17) basis of the windows, left side rows first
+        basis = np.concatenate(basis, axis=1)
+        tau = np.concatenate([self.tau, self.tau], axis=1)[...,np.newaxis]
+        coriolis = basis[...,RESPONSE_COLUMNS['coriolis']]
+        if domega:
+            angular_acc = basis[...,RESPONSE_COLUMNS['angular_acc']]
+            design = np.concatenate([coriolis, coriolis*tau + angular_acc], axis=2)
+        else:
+            design = coriolis
+        if rcond is None:
+            self.pinv = np.linalg.pinv(design)
+        else:
+            self.pinv = np.linalg.pinv(design, rcond=rcond)
+
+        # The centrifugal force in a window is quadratic in tau, C*(q_0 +
+        # tau*q_1 + tau**2*q_2), see centrifugal_features. Its contribution
+        # to the estimates is the (K,P,6) products of the pseudo-inverse and
+        # tau**n*C, so the corrections don't depend on the window length.
+        centrifugal = basis[...,RESPONSE_COLUMNS['centrifugal']]
+        powers = (0, 1, 2) if domega else (0,)
+        self.centrifugal_pinv = np.stack([
+            np.einsum('kpw,kwj->kpj', self.pinv, tau**n*centrifugal) for n in powers
+            ])
+
+    @property
+    def num_window(self):
+        return len(self.index)
+
+    def decode(self, force_left, force_right):
+        """
+        Estimates the body rotation from lateral haltere forces.
+
+        Parameters
+        ----------
+        force_left, force_right : array_like
+            (N,) or (M,N) arrays of total lateral forces on the left and
+            right halteres, e.g. force['left']['lateral']['total']
+
+        Returns
+        -------
+        estimate : dict
+            {'t': (K,) window center times, 'omega': (K,3) or (M,K,3) body
+            angular velocity estimates} and 'domega', as for omega, if the
+            angular acceleration is estimated.
+
+        """
+        force_left = np.asarray(force_left)
+        force_right = np.asarray(force_right)
+        if force_left.shape != force_right.shape:
+            raise ValueError('left and right forces must have the same shape')
+        if force_left.ndim not in (1, 2) or force_left.shape[-1] != self.num_pt:
+            raise ValueError(f'shape of forces must be (N,) or (M,N), N={self.num_pt}')
+        single = force_left.ndim == 1
+        force_left = np.atleast_2d(force_left)
+        force_right = np.atleast_2d(force_right)
+
+        # (K,M,2W) windowed forces less the known terms
+        y = np.concatenate([force_left[:,self.index], force_right[:,self.index]], axis=2)
+        y -= self.offset
+        y = y.transpose(1, 0, 2)
+        x_linear = np.matmul(y, self.pinv.transpose(0, 2, 1))
+        x = x_linear
+        for i in range(self.num_iter):
+            features = centrifugal_features(x, self.estimate_domega)
+            x = x_linear - np.einsum('nkpj,nkmj->kmp', self.centrifugal_pinv, features)
+        x = x.transpose(1, 0, 2)
+
+        if single:
+            x = x[0]
+        estimate = {'t': self.t, 'omega': x[...,0:3]}
+        if self.estimate_domega:
+            estimate['domega'] = x[...,3:6]
+        return estimate
+
+
+def decode(hsim, force_left, force_right, **options):
+    """
+    Estimates the body rotation from the lateral forces on the left and
+    right halteres, see Decoder. When decoding repeatedly with the same
+    kinematics create a Decoder once and reuse it.
+    """
+    return Decoder(hsim, **options).decode(force_left, force_right)
+
+
+def centrifugal_features(x, domega=False):
+    """
+    The centrifugal features, see halteres.calc_response_basis, of the
+    (...,3) omega estimates x, or if domega is True of omega_0 + domega*tau
+    for the (...,6) estimates of omega_0 and domega. Returns the (1,...,6)
+    features, or the (3,...,6) coefficients of 1, tau and tau**2.
+    """
+    omega = x[...,0:3]
+    if not domega:
+        return quadratic_features(omega, omega)[np.newaxis]
+    domega = x[...,3:6]
+    return np.stack([
+        quadratic_features(omega, omega),
+        quadratic_features(omega, domega) + quadratic_features(domega, omega),
+        quadratic_features(domega, domega),
+        ])
+
+
+def quadratic_features(a, b):
+    """
+    The products a_x*b_x, a_y*b_y, a_z*b_z, a_x*b_y, a_x*b_z and a_y*b_z of
+    the (...,3) arrays a and b.
+    """
+    features = np.empty(np.broadcast_shapes(a.shape, b.shape)[:-1] + (6,))
+    features[...,0:3] = a*b
+    features[...,3] = a[...,0]*b[...,1]
+    features[...,4] = a[...,0]*b[...,2]
+    features[...,5] = a[...,1]*b[...,2]
+    return features
@@ -0,0 +1,140 @@
+import os
+import hashlib
+import importlib.util
+import numpy as np
+from .halteres import GRAVITY
+from .halteres import FORCE_COMPONENTS
+from .halteres import FORCE_PROJECTIONS
+
+# Generated kernel module, loaded once per process
+_module = None
+
+
+def cache_dir():
+    """
+    Directory holding the generated kernel modules, $HALTERE_FORCES_CACHE if
+    set and otherwise ~/.cache/haltere_forces.
+    """
+    try:
+        path = os.environ['HALTERE_FORCES_CACHE']
+    except KeyError:
+        path = os.path.join(os.path.expanduser('~'), '.cache', 'haltere_forces')
+    return path
+
+
+def kernel_path():
+    """
+    Path of the generated kernel module. The name includes a hash of the
+    symbolic derivation so that the kernels are regenerated when it changes.
+    """
+    source = os.path.join(os.path.dirname(__file__), 'symbolic_calcs.py')
+    with open(source, 'rb') as f:
+        digest = hashlib.sha256(f.read())
+    digest.update(repr((FORCE_COMPONENTS, FORCE_PROJECTIONS)).encode())
+    return os.path.join(cache_dir(), f'kernels_{digest.hexdigest()[:16]}.py')
+
+
+def load_kernels(regenerate=False):
+    """
+    Returns the generated kernel module, see symbolic_calcs.generate_kernels.
+    The module is generated, which requires sympy, only if it isn't already
+    in the cache directory or if regenerate is True.
+    """
+    global _module
+    if _module is not None and not regenerate:
+        return _module
+    path = kernel_path()
+    if regenerate or not os.path.exists(path):
+        from . import symbolic_calcs
+        source = symbolic_calcs.generate_kernels()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written to a temporary file and renamed so that concurrent processes
+        # never import a partially written module
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(source)
+        os.replace(tmp_path, path)
+    spec = importlib.util.spec_from_file_location('haltere_forces_kernels', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _module = module
+    return module
+
+
+def calc_kernel_force(side, m, length, separation, tilt_angle, angle, dangle,
+        ddangle, omega, domega=None, lin_acc=None, lateral_only=False, dtype=None):
+    """
+    Computes the forces on a haltere with the generated closed form kernels,
+    given the haltere angle and its time derivatives. The model is that of
+    halteres.calc_haltere_force, for the haltere kinematics of the Halteres
+    class, evaluated in a single fused pass.
+
+    Parameters
+    ----------
+    side : str
+        the haltere, 'left' or 'right'
+    m : float
+        the mass of the haltere
+    length : float
+        the length of the haltere
+    separation : float
+        the separation between the haltere bases
+    tilt_angle : float
+        the haltere tilt angle (rad)
+    angle, dangle, ddangle : array_like
+        (N,) arrays of haltere angles and their first and second derivatives
+    omega : array_like
+        (3,) or (N,3) array of body angular velocities
+    domega : array_like
+        (3,) or (N,3) array of body angular accelerations
+    lin_acc : array_like
+        (3,) or (N,3) array of body linear accelerations
+    lateral_only : bool
+        if True only the lateral projections are computed (default=False).
+    dtype : data-type
+        the floating point type in which the forces are computed, by default
+        that of angle.
+
+    Returns
+    -------
+    force : dict
+        dictionary of force components as returned by calc_haltere_force, or
+        {'lateral': {...}} if lateral_only is True. Constant projections are
+        read-only broadcast views.
+
+    """
+    if side not in ('left', 'right'):
+        raise ValueError(f'unknown side, {side}')
+    module = load_kernels()
+    dtype = np.asarray(angle).dtype if dtype is None else np.dtype(dtype)
+    angle, dangle, ddangle = (np.asarray(a, dtype=dtype) for a in (angle, dangle, ddangle))
+    n = len(angle)
+    inputs = []
+    for a in (omega, domega, lin_acc):
+        a = np.zeros(3, dtype=dtype) if a is None else np.asarray(a, dtype=dtype)
+        inputs.extend(a[...,i] for i in range(3))
+    param = (m, length, separation, tilt_angle, GRAVITY)
+
+    if lateral_only:
+        kernel = getattr(module, f'lateral_{side}')
+        values = kernel(angle, dangle, ddangle, *inputs, *param)
+        lateral = {
+                k: np.broadcast_to(np.asarray(v, dtype=dtype), (n,)) 
+                for k, v in zip(FORCE_COMPONENTS, values)
+                }
+        return {'lateral': lateral}
+
+    kernel = getattr(module, f'force_{side}')
+    values = iter(kernel(angle, dangle, ddangle, *inputs, *param))
+    force = {}
+    for k in FORCE_COMPONENTS:
+        f = np.empty((n, 3), dtype=dtype)
+        for i in range(3):
+            f[:,i] = next(values)
+        force[k] = f
+    for proj_name in FORCE_PROJECTIONS:
+        force[proj_name] = {
+                k: np.broadcast_to(np.asarray(next(values), dtype=dtype), (n,)) 
+                for k in FORCE_COMPONENTS
+                }
+    return force
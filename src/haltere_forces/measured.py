@@ -0,0 +1,282 @@
+import numpy as np
+
+
+class MeasuredWaveform:
+    """
+    Haltere angles measured in one or more trials, e.g. tracked from high
+    speed video, fitted by cubic smoothing splines so that the angle and its
+    first and second time derivatives are evaluated in closed form, rather
+    than by numerical differentiation, at any time within the recording. Use
+    as the 'measured' waveform of Halteres, param['measured'].
+
+    The sample times need not be uniform and frames may be missing. The
+    splines are penalized B-splines (P-splines) with uniformly spaced knots
+    shared by all trials: the coefficients minimize the sum of squared
+    residuals plus a penalty on their second differences. A batch of trials
+    is fitted together, by assembling the banded normal equations of all
+    trials at once and factoring them with a banded Cholesky decomposition
+    vectorized over the trials, so thousands of trials cost little more than
+    a few. Trials which share the sample times and have no missing frames
+    share a single factorization.
+
+    The smoothing is set by cutoff_freq, the frequency at which the gain of
+    the smoother, for uniform samples, is approximately 1/2. Frequencies well
+    below it are passed and those above it are attenuated as 1/f**4.
+
+    Parameters
+    ----------
+    t : array_like
+        (N,) array of sample times (s) shared by the trials, or (B,N) array of
+        the sample times of each trial. Trials with fewer samples are padded,
+        and missing frames marked, with NaN.
+    angle : array_like
+        (N,) array of the angles (rad) of a single trial or (B,N) array of
+        the angles of B trials. NaN marks missing frames.
+    cutoff_freq : float
+        cutoff frequency (Hz) of the smoothing
+    num_segment : int, optional
+        number of polynomial pieces of the splines, by default one per median
+        sample interval
+
+    """
+
+    def __init__(self, t, angle, cutoff_freq, num_segment=None):
+        t = np.asarray(t, dtype=np.float64)
+        angle = np.asarray(angle, dtype=np.float64)
+        if angle.ndim not in (1, 2):
+            raise ValueError('shape of measured angles must be (N,) or (B,N)')
+        if t.ndim not in (1, 2) or t.shape[-1] != angle.shape[-1]:
+            raise ValueError('shape of sample times must be (N,) or (B,N)')
+        if t.ndim == 2 and t.shape != angle.shape:
+            raise ValueError('sample times and angles must have the same shape')
+        if cutoff_freq <= 0:
+            raise ValueError(f'cutoff_freq must be positive, {cutoff_freq}')
+        valid = np.isfinite(t) & np.isfinite(angle)
+        if np.any(valid.sum(axis=-1) < 2):
+            raise ValueError('each trial must contain at least 2 samples')
+        t_valid = np.where(valid, t, np.nan)
+        t_start = np.nanmin(t_valid)
+        t_end = np.nanmax(t_valid)
+        if not t_end > t_start:
+            raise ValueError('sample times must span a non-zero interval')
+
+        # Median sample interval, of the trials as recorded
+        sample_interval = np.nanmedian(np.diff(np.sort(t_valid, axis=-1), axis=-1))
+        if num_segment is None:
+            num_segment = max(int(np.ceil((t_end - t_start)/sample_interval)), 1)
+        knot_spacing = (t_end - t_start)/num_segment
+
+        # Penalty weight for which the gain is 1/2 at the cutoff frequency,
+        # given sample_interval/knot_spacing samples per knot
+        penalty = knot_spacing/sample_interval*(2.0*np.pi*cutoff_freq*knot_spacing)**-4
+
+        self.coef = fit_pspline(t, angle, valid, t_start, knot_spacing,
+                num_segment, penalty)
+        self.coef.flags.writeable = False
+        self.t_start = t_start
+        self.knot_spacing = knot_spacing
+        self.cutoff_freq = cutoff_freq
+
+    @classmethod
+    def from_coef(cls, coef, t_start, knot_spacing, cutoff_freq=None):
+        """
+        Creates a waveform from the (K,) or (B,K) B-spline coefficients of
+        uniformly spaced knots starting at t_start, e.g. trials of a fit.
+        """
+        waveform = cls.__new__(cls)
+        waveform.coef = coef
+        waveform.t_start = t_start
+        waveform.knot_spacing = knot_spacing
+        waveform.cutoff_freq = cutoff_freq
+        return waveform
+
+    @property
+    def batch(self):
+        """ Whether or not the waveform is a batch of trials """
+        return self.coef.ndim == 2
+
+    @property
+    def num_segment(self):
+        return self.coef.shape[-1] - 3
+
+    @property
+    def t_end(self):
+        return self.t_start + self.num_segment*self.knot_spacing
+
+    def __len__(self):
+        if not self.batch:
+            raise TypeError('measured waveform of a single trial has no len()')
+        return len(self.coef)
+
+    def __getitem__(self, index):
+        """ The trials selected by index, an int for a single trial """
+        if not self.batch:
+            raise TypeError('measured waveform of a single trial is not indexable')
+        return self.from_coef(self.coef[index], self.t_start, self.knot_spacing,
+                self.cutoff_freq)
+
+    def __call__(self, t, dtype=np.float64):
+        """
+        Evaluates the fitted angles and their first and second time
+        derivatives at the specified times.
+
+        Parameters
+        ----------
+        t : array_like
+            (M,) array of times (s) within t_start to t_end
+        dtype : data-type
+            The floating point type of the returned values (default=
+            np.float64). Values are computed in double precision.
+
+        Returns
+        -------
+        x, dx, ddx : array_like
+            (M,) arrays of the angles and their derivatives, or (B,M) for a
+            batch of trials
+
+        """
+        t = np.asarray(t, dtype=np.float64)
+        if t.size and (t.min() < self.t_start or t.max() > self.t_end):
+            raise ValueError(
+                    f'times {t.min()} to {t.max()} extend beyond the measured '
+                    f'waveform, {self.t_start} to {self.t_end}'
+                    )
+        index, u = segment_position(t, self.t_start, self.knot_spacing, self.num_segment)
+        h = self.knot_spacing
+        c = [self.coef[...,index + p] for p in range(4)]
+        values = []
+        for nu, scale in ((0, 1.0), (1, 1.0/h), (2, 1.0/h**2)):
+            b = bspline_basis(u, nu)
+            x = scale*(c[0]*b[0] + c[1]*b[1] + c[2]*b[2] + c[3]*b[3])
+            values.append(x.astype(dtype, copy=False))
+        return tuple(values)
+
+
+def segment_position(t, t_start, knot_spacing, num_segment):
+    """
+    Index of the spline segment containing each time and the position, u in
+    0 to 1, within it. The final knot belongs to the last segment.
+    """
+    s = (t - t_start)/knot_spacing
+    index = np.clip(np.floor(s).astype(np.intp), 0, num_segment - 1)
+    return index, s - index
+
+
+def bspline_basis(u, nu=0):
+    """
+    The nu-th derivatives, with respect to u, of the four uniform cubic
+    B-splines which are non-zero on a segment, at positions u within it.
+    """
+    v = 1.0 - u
+    match nu:
+        case 0:
+            u2 = u*u
+            u3 = u2*u
+            return (v*v*v/6.0, (3.0*u3 - 6.0*u2 + 4.0)/6.0,
+                    (-3.0*u3 + 3.0*u2 + 3.0*u + 1.0)/6.0, u3/6.0)
+        case 1:
+            return (-0.5*v*v, (1.5*u - 2.0)*u, (-1.5*u + 1.0)*u + 0.5, 0.5*u*u)
+        case 2:
+            return (v, 3.0*u - 2.0, 1.0 - 3.0*u, u)
+        case _:
+            raise ValueError(f'unsupported derivative order, {nu}')
+
+
+def fit_pspline(t, y, valid, t_start, knot_spacing, num_segment, penalty):
+    """
+    Coefficients of the penalized cubic B-splines, with uniformly spaced
+    knots, fitted to the valid samples y at times t. Returns (K,) or (B,K)
+    coefficients, K = num_segment + 3, for (N,) or (B,N) samples.
+    """
+    num_coef = num_segment + 3
+    single = y.ndim == 1
+    y = np.atleast_2d(y)
+    num_trial = len(y)
+    valid = np.broadcast_to(valid, y.shape)
+    shared = t.ndim == 1 and bool(np.all(valid))
+    t = np.broadcast_to(t, y.shape)
+
+    # The samples of the normal equations, only those of the first trial if
+    # they are shared
+    t = np.where(valid, t, t_start)
+    y = np.where(valid, y, 0.0)
+    weight = valid.astype(np.float64)
+    index, u = segment_position(t, t_start, knot_spacing, num_segment)
+    basis = [b*weight for b in bspline_basis(u, 0)]
+    num_system = 1 if shared else num_trial
+    row = np.arange(num_trial)[:,np.newaxis]*num_coef + index
+
+    # Lower band of the normal matrix, band[d,j] = A[j+d,j], assembled as
+    # (4,num_system,K) and stored as (4,K,num_system) so that the rows
+    # accessed by the factorization are contiguous
+    band = np.zeros((4, num_system*num_coef))
+    for p in range(4):
+        for q in range(p, 4):
+            w = basis[p][:num_system]*basis[q][:num_system]
+            band[q - p] += np.bincount(row[:num_system].ravel() + p, w.ravel(),
+                    minlength=num_system*num_coef)
+    band = band.reshape(4, num_system, num_coef).transpose(0, 2, 1).copy()
+    band[:3] += penalty*difference_penalty(num_coef)[...,np.newaxis]
+
+    # (K,B) right hand sides
+    rhs = np.zeros(num_trial*num_coef)
+    for p in range(4):
+        rhs += np.bincount(row.ravel() + p, (basis[p]*y).ravel(), minlength=len(rhs))
+    rhs = rhs.reshape(num_trial, num_coef).T.copy()
+
+    coef = solve_banded_cholesky(cholesky_banded(band), rhs).T
+    return coef[0] if single else np.ascontiguousarray(coef)
+
+
+def difference_penalty(n):
+    """ (3,n) lower band of D.T @ D for the (n-2,n) second difference matrix D """
+    band = np.zeros((3, n))
+    c = (1.0, -2.0, 1.0)
+    for a in range(3):
+        for b in range(a, 3):
+            band[b - a, a:n - 2 + a] += c[a]*c[b]
+    return band
+
+
+def cholesky_banded(band):
+    """
+    Cholesky factors of symmetric positive definite banded matrices given as
+    the (p+1,n,...) lower bands, band[d,j] = A[j+d,j], vectorized over the
+    trailing axes. Returns the lower bands of the factors L, A = L @ L.T.
+    """
+    num_band, n = band.shape[:2]
+    factor = np.zeros_like(band)
+    for j in range(n):
+        s = band[0,j].copy()
+        for d in range(1, min(num_band, j + 1)):
+            s -= factor[d,j - d]**2
+        factor[0,j] = np.sqrt(s)
+        for d in range(1, min(num_band, n - j)):
+            i = j + d
+            v = band[d,j].copy()
+            for k in range(max(i - num_band + 1, 0), j):
+                v -= factor[i - k,k]*factor[j - k,k]
+            factor[d,j] = v/factor[0,j]
+    return factor
+
+
+def solve_banded_cholesky(factor, rhs):
+    """
+    Solves L @ L.T @ x = rhs for the banded Cholesky factors, see
+    cholesky_banded, and the (n,...) right hand sides, broadcasting the
+    trailing axes.
+    """
+    num_band, n = factor.shape[:2]
+    y = np.empty(np.broadcast_shapes(factor.shape[1:], rhs.shape))
+    for j in range(n):
+        v = rhs[j].copy()
+        for d in range(1, min(num_band, j + 1)):
+            v -= factor[d,j - d]*y[j - d]
+        y[j] = v/factor[0,j]
+    x = y
+    for j in range(n - 1, -1, -1):
+        v = y[j].copy()
+        for d in range(1, min(num_band, n - j)):
+            v -= factor[d,j]*x[j + d]
+        x[j] = v/factor[0,j]
+    return x
@@ -0,0 +1,190 @@
+import numpy as np
+from . import rotation
+from .halteres import Halteres
+from .halteres import FORCE_COMPONENTS
+from .halteres import FORCE_PROJECTIONS
+from .halteres import POS_KEYS
+from .halteres import batch_size
+from .halteres import cached
+from .halteres import calc_response_basis
+from .results import ForceResult
+
+# Parameters which may differ between the individuals of a Population
+INDIVIDUAL_KEYS = ('mass', 'length', 'separation', 'tilt_angle')
+
+
+class Population(Halteres):
+    """
+    The halteres of a population of B individuals which share the time base
+    and the haltere waveform but differ in their morphology. The parameters
+    'mass', 'length', 'separation' and 'tilt_angle' may be (B,) arrays, e.g.
+    drawn from morphometric distributions, or scalars shared by all
+    individuals. The other parameters are as for Halteres.
+
+    The haltere angles and the untilted stalk axes are computed once for the
+    population. The positions, velocities and accelerations are (B,N,3)
+    arrays and the forces are computed for all individuals by a single
+    batch mode calc_haltere_force, with the individuals as the cases of the
+    batch. The force inputs are therefore always batch inputs: omega, domega
+    and lin_acc may be (3,) vectors shared by the population, (B,3) arrays of
+    constant values for each individual, (1,N,3) time-varying values shared
+    by the population or (B,N,3) arrays. The forces are (B,N,3) arrays, and
+    their projections (B,N).
+
+    The individuals agree with Halteres of their own parameters, see
+    individual_param, to within rounding. The response basis and the kernel
+    forces are computed one individual at a time, as (B,N,17) bases and
+    (B,N,3) forces.
+
+    Parameters
+    ----------
+    param : dict
+        the parameters, see Halteres, with arrays for the parameters in
+        INDIVIDUAL_KEYS which differ between individuals
+
+    """
+
+    batch_only = True
+
+    @property
+    def num_individual(self):
+        """ The number of individuals, B """
+        shapes = [np.shape(self.param[k]) for k in INDIVIDUAL_KEYS]
+        shape = np.broadcast_shapes(*shapes)
+        if len(shape) > 1:
+            raise ValueError('individual parameters must be scalars or (B,) arrays')
+        return shape[0] if shape else 1
+
+    def individual(self, key):
+        """ (B,) array of the values of an individual parameter """
+        value = np.asarray(self.param[key], dtype=np.float64)
+        return np.broadcast_to(value, (self.num_individual,))
+
+    def individual_param(self, index):
+        """ The parameters of the individual index, e.g. for Halteres """
+        param = dict(self.param)
+        for key in INDIVIDUAL_KEYS:
+            param[key] = float(self.individual(key)[index])
+        return param
+
+    def tilt(self, v, side):
+        """
+        Rotates vectors, v, by the left or right haltere tilt angles of the
+        individuals, returning (B,3) or (B,N,3) arrays
+        """
+        match side:
+            case 'left':
+                tilt_angle = self.individual('tilt_angle')
+            case 'right':
+                tilt_angle = -self.individual('tilt_angle')
+            case _:
+                raise ValueError(f'unknown side, {side}')
+        return rotation.tilt_rotate(v, tilt_angle, self.rotation_method)
+
+    def stalk_vector(self, v, side):
+        """ (B,N,3) tilted stalk vectors of the individuals, see Halteres """
+        length = self.individual('length').astype(v.dtype)
+        return self.tilt(v*length.reshape((-1,) + (1,)*v.ndim), side)
+
+    def stalk_pos(self, axis, side):
+        """ (B,N,3) haltere positions of the individuals for stalk axis vectors """
+        pos = self.stalk_vector(axis, side)
+        offset = np.zeros((self.num_individual, 1, 3), dtype=pos.dtype)
+        offset[:,0,0] = 0.5*self.individual('separation')
+        if side == 'left':
+            pos -= offset
+        else:
+            pos += offset
+        return pos
+
+    def empty_result(self, n, omega, domega=None, lin_acc=None, batch=True,
+            components=None, projections=None, vectors=True):
+        """ Allocates the ForceResult of n samples of each individual """
+        components = FORCE_COMPONENTS if components is None else tuple(components)
+        projections = FORCE_PROJECTIONS if projections is None else tuple(projections)
+        num_individual = self.num_individual
+        inputs = [np.asarray(a) for a in (omega, domega, lin_acc) if a is not None]
+        if batch_size(*inputs) not in (1, num_individual):
+            raise ValueError(f'batch inputs must be given for {num_individual} individuals')
+        shape = (num_individual, n, 3)
+        return ForceResult.empty(shape, ('left', 'right'), components, projections,
+                vectors, self.dtype)
+
+    @cached(*POS_KEYS, 'mass')
+    def response_basis(self):
+        """
+        Response basis of the projected haltere forces, for each side and
+        projection a (B,N,17) array of the bases of the individuals, see
+        Halteres.response_basis.
+        """
+        mass = self.individual('mass')
+        kinematics = {
+                'left'  : (self.pos_left, self.vel_left, self.acc_left,
+                    self.axis_left, self.lat_proj_axis_left),
+                'right' : (self.pos_right, self.vel_right, self.acc_right,
+                    self.axis_right, self.lat_proj_axis_right),
+                }
+        basis = {}
+        for side, (pos, vel, acc, axis, lat_axis) in kinematics.items():
+            basis[side] = {
+                    'radial'  : np.stack([
+                        calc_response_basis(mass[i], pos[i], vel[i], acc[i], axis)
+                        for i in range(self.num_individual)
+                        ]),
+                    'lateral' : np.stack([
+                        calc_response_basis(mass[i], pos[i], vel[i], acc[i], lat_axis[i])
+                        for i in range(self.num_individual)
+                        ]),
+                    }
+            for array in basis[side].values():
+                array.flags.writeable = False
+        return basis
+
+    def kernel_force(self, omega, domega=None, lin_acc=None, lateral_only=False):
+        """
+        Computes the forces on the left and right halteres of the individuals
+        with the generated closed form kernels, see Halteres.kernel_force,
+        one individual at a time. The inputs are as for force and the forces
+        are (B,N,3) arrays, and their projections (B,N).
+        """
+        from . import kernels
+        inputs = [None if a is None else np.asarray(a) for a in (omega, domega, lin_acc)]
+        num_individual = self.num_individual
+        if batch_size(*(a for a in inputs if a is not None)) not in (1, num_individual):
+            raise ValueError(f'batch inputs must be given for {num_individual} individuals')
+        param = {k: self.individual(k) for k in INDIVIDUAL_KEYS}
+        force = {}
+        for side in ('left', 'right'):
+            individual_force = []
+            for i in range(num_individual):
+                individual_inputs = [individual_input(a, i) for a in inputs]
+                individual_force.append(kernels.calc_kernel_force(
+                        side,
+                        param['mass'][i],
+                        param['length'][i],
+                        param['separation'][i],
+                        param['tilt_angle'][i],
+                        self.angle,
+                        self.dangle,
+                        self.ddangle,
+                        *individual_inputs,
+                        lateral_only=lateral_only,
+                        dtype=self.dtype,
+                        ))
+            force[side] = stack_force(individual_force)
+        return force
+
+
+def individual_input(a, index):
+    """ The input, see Population.force, of the individual index """
+    if a is None or a.ndim == 1:
+        return a
+    return a[index] if len(a) > 1 else a[0]
+
+
+def stack_force(forces):
+    """ Stacks the nested force dicts of the individuals """
+    first = forces[0]
+    if isinstance(first, dict):
+        return {k: stack_force([f[k] for f in forces]) for k in first}
+    return np.stack(forces)
@@ -0,0 +1,133 @@
+import time
+import functools
+import contextlib
+import tracemalloc
+
+# The active Profile, None when profiling is disabled
+_active = None
+
+
+class Profile:
+    """
+    Accumulates per stage call counts, wall times and bytes allocated. Times
+    are inclusive of nested stages, self times exclude them. The bytes
+    allocated by a call are the peak memory traced by tracemalloc during the
+    call above that at its start, so memory allocated and freed within the
+    call is counted once, at its peak, and memory written to existing
+    buffers not at all. Like the times, the bytes include nested stages.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self._stack = []
+
+    def start(self, name):
+        # The peak so far belongs to the enclosing call, the peak is then
+        # reset so that it measures this call
+        memory, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            self._stack[-1][4] = max(self._stack[-1][4], peak)
+        tracemalloc.reset_peak()
+        self._stack.append([name, time.perf_counter(), 0.0, memory, memory])
+
+    def stop(self):
+        name, t0, child_time, memory, peak = self._stack.pop()
+        dt = time.perf_counter() - t0
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if self._stack:
+            self._stack[-1][2] += dt
+            self._stack[-1][4] = max(self._stack[-1][4], peak)
+        tracemalloc.reset_peak()
+        try:
+            stats = self.stats[name]
+        except KeyError:
+            stats = self.stats[name] = {'count': 0, 'time': 0.0, 'self_time': 0.0, 'bytes': 0}
+        stats['count'] += 1
+        stats['time'] += dt
+        stats['self_time'] += dt - child_time
+        stats['bytes'] += peak - memory
+
+    def totals(self):
+        """ Total calls and self time, i.e. the profiled time, of all stages """
+        totals = {
+                'count'     : sum(s['count'] for s in self.stats.values()),
+                'self_time' : sum(s['self_time'] for s in self.stats.values()),
+                }
+        return totals
+
+    def report(self, sort='self_time'):
+        """
+        Returns a table of the per stage statistics sorted, in descending
+        order, by 'count', 'time', 'self_time' (default) or 'bytes'.
+        """
+        lines = [
+                f'{"stage":<32} {"calls":>8} {"time (ms)":>11} '
+                f'{"self (ms)":>11} {"alloc (MB)":>11}'
+                ]
+        stats = sorted(self.stats.items(), key=lambda item: -item[1][sort])
+        for name, s in stats:
+            lines.append(
+                    f'{name:<32} {s["count"]:>8} {1e3*s["time"]:>11.3f} '
+                    f'{1e3*s["self_time"]:>11.3f} {s["bytes"]/1e6:>11.3f}'
+                    )
+        totals = self.totals()
+        lines.append(
+                f'{"total":<32} {totals["count"]:>8} {"":>11} '
+                f'{1e3*totals["self_time"]:>11.3f}'
+                )
+        return '\n'.join(lines)
+
+
+@contextlib.contextmanager
+def profile():
+    """
+    Context manager which enables profiling of the instrumented stages of
+    Halteres and calc_haltere_force, e.g.
+
+        with profiling.profile() as prof:
+            hsim.force(omega)
+        print(prof.report())
+
+    Memory allocations are traced, by tracemalloc, while profiling, which
+    slows allocations and so adds to the times of stages which allocate many
+    small objects. If tracemalloc is already tracing, its peak is reset by
+    each stage.
+    """
+    global _active
+    previous = _active
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    _active = Profile()
+    try:
+        yield _active
+    finally:
+        _active = previous
+        if started:
+            tracemalloc.stop()
+
+
+def stage(name):
+    """
+    Decorator recording calls of a function as the named stage while
+    profiling is enabled. When disabled the only cost is a global lookup.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            prof = _active
+            if prof is None:
+                return func(*args, **kwargs)
+            return call(prof, name, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def call(prof, name, func, *args, **kwargs):
+    """ Calls func recording the call as the named stage of prof """
+    prof.start(name)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        prof.stop()
+
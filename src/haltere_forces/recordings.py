@@ -0,0 +1,291 @@
+import numpy as np
+
+
+class Recording:
+    """
+    A recorded (N,3) time series, e.g. the body angular velocity measured in
+    free flight, which is resampled onto the haltere time base on demand.
+
+    The data may be a memory-mapped array (see load_recording) in which case
+    only the samples spanning the requested times are read.
+
+    Parameters
+    ----------
+    data : array_like
+        (N,3) array of recorded samples
+    sample_rate : float, optional
+        sample rate (Hz) of uniformly sampled data
+    t : array_like, optional
+        (N,) array of strictly increasing sample times (s), for non-uniformly
+        sampled data. Exactly one of sample_rate and t must be given.
+    start_time : float
+        time (s) of the first sample for uniformly sampled data
+    scale : float
+        factor applied to the resampled values, e.g. np.pi/180 for data
+        recorded in deg/s
+
+    """
+
+    def __init__(self, data, sample_rate=None, t=None, start_time=0.0, scale=1.0):
+        if (sample_rate is None) == (t is None):
+            raise ValueError('exactly one of sample_rate and t must be given')
+        if np.ndim(data) != 2 or np.shape(data)[1] != 3:
+            raise ValueError('shape of recording data must be (N,3)')
+        if len(data) < 2:
+            raise ValueError('recording must contain at least 2 samples')
+        if t is not None and np.shape(t) != (len(data),):
+            raise ValueError('shape of recording times must be (N,)')
+        self.data = data
+        self.sample_rate = sample_rate
+        self._t = t
+        self.start_time = start_time
+        self.scale = scale
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def end_time(self):
+        return self.sample_times(len(self) - 1, len(self))[0]
+
+    def sample_times(self, start, stop):
+        """ Times (s) of the recorded samples start to stop """
+        if self._t is None:
+            return self.start_time + np.arange(start, stop)/self.sample_rate
+        return np.asarray(self._t[start:stop], dtype=np.float64)
+
+    def sample_range(self, t):
+        """
+        Returns the (start, stop) indices of the recorded samples spanning
+        the (sorted) times t.
+        """
+        t_first, t_last = t[0], t[-1]
+        if t_first < self.sample_times(0, 1)[0] or t_last > self.end_time:
+            raise ValueError(
+                    f'times {t_first} to {t_last} extend beyond the recording'
+                    )
+        if self._t is None:
+            start = int(np.floor((t_first - self.start_time)*self.sample_rate))
+            stop = int(np.ceil((t_last - self.start_time)*self.sample_rate)) + 1
+            start = max(start - 1, 0)
+            stop = min(stop + 1, len(self))
+        else:
+            start = max(int(np.searchsorted(self._t, t_first, side='right')) - 1, 0)
+            stop = min(int(np.searchsorted(self._t, t_last, side='left')) + 1, len(self))
+        return start, stop
+
+    def resample(self, t):
+        """
+        Linearly interpolates the recording at the (sorted) times t.
+
+        Parameters
+        ----------
+        t : array_like
+            (M,) array of times (s)
+
+        Returns
+        -------
+        values : array_like
+            (M,3) array of resampled values
+
+        """
+        t = np.asarray(t)
+        start, stop = self.sample_range(t)
+        return interp(t, self.sample_times(start, stop), self.data[start:stop], self.scale)
+
+    def resample_derivative(self, t):
+        """
+        Time derivative of the recording at the (sorted) times t. Central
+        differences of the recorded samples are linearly interpolated. The
+        values don't depend on how the times are split into chunks.
+
+        Parameters
+        ----------
+        t : array_like
+            (M,) array of times (s)
+
+        Returns
+        -------
+        values : array_like
+            (M,3) array of resampled time derivatives
+
+        """
+        t = np.asarray(t)
+        start, stop = self.sample_range(t)
+        # One extra sample either side so that the differences at the ends of
+        # the range are central differences, as for the full recording.
+        lo = max(start - 1, 0)
+        hi = min(stop + 1, len(self))
+        t_rec = self.sample_times(lo, hi)
+        data = np.asarray(self.data[lo:hi], dtype=np.float64)
+        if self._t is None:
+            deriv = np.gradient(data, 1.0/self.sample_rate, axis=0)
+        else:
+            deriv = gradient(data, t_rec)
+        index = slice(start - lo, stop - lo)
+        return interp(t, t_rec[index], deriv[index], self.scale)
+
+
+def load_recording(filename, sample_rate=None, time_column=None, columns=(0,1,2),
+        start_time=0.0, scale=1.0, dtype=np.float64, num_col=None, offset=0):
+    """
+    Memory-maps a recording stored as a .npy file or as raw binary samples.
+    Nothing is read until the recording is resampled.
+
+    Parameters
+    ----------
+    filename : str
+        the .npy or raw binary file. Raw files hold row-major (N,num_col)
+        samples of type dtype.
+    sample_rate : float, optional
+        sample rate (Hz) of uniformly sampled recordings
+    time_column : int, optional
+        column holding the sample times (s) of non-uniformly sampled
+        recordings, used when sample_rate isn't given.
+    columns : tuple
+        the three columns holding the recorded x, y, z values
+    start_time : float
+        time (s) of the first sample for uniformly sampled recordings
+    scale : float
+        factor applied to the resampled values, see Recording
+    dtype : data-type
+        sample type of raw binary files
+    num_col : int, optional
+        number of columns of raw binary files, by default 3, or 4 when
+        time_column is given.
+    offset : int
+        byte offset of the first sample in raw binary files
+
+    Returns
+    -------
+    recording : Recording
+
+    """
+    if str(filename).endswith('.npy'):
+        array = np.load(filename, mmap_mode='r')
+    else:
+        if num_col is None:
+            num_col = 3 if time_column is None else 4
+        array = np.memmap(filename, dtype=dtype, mode='r', offset=offset)
+        array = array.reshape(-1, num_col)
+    columns = list(columns)
+    if columns == list(range(columns[0], columns[0] + 3)):
+        # contiguous columns are sliced to keep the memory map
+        data = array[:,columns[0]:columns[0] + 3]
+    else:
+        data = RecordingColumns(array, columns)
+    t = None if time_column is None else array[:,time_column]
+    return Recording(data, sample_rate=sample_rate, t=t, start_time=start_time, scale=scale)
+
+
+class RecordingColumns:
+    """
+    A lazily indexed selection of non-contiguous columns of a memory-mapped
+    array. Rows are only read when sliced.
+    """
+
+    def __init__(self, array, columns):
+        self.array = array
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.array)
+
+    @property
+    def shape(self):
+        return (len(self.array), len(self.columns))
+
+    @property
+    def ndim(self):
+        return 2
+
+    def __getitem__(self, index):
+        return self.array[index][...,self.columns]
+
+
+def interp(t, t_rec, values, scale=1.0):
+    """ Linearly interpolates each column of the (M,3) values at the times t """
+    out = np.empty((len(t), 3))
+    for i in range(3):
+        out[:,i] = np.interp(t, t_rec, values[:,i])
+    if scale != 1.0:
+        out *= scale
+    return out
+
+
+def gradient(values, t):
+    """
+    Second order central differences of the (N,3) values sampled at the
+    times t, with first order differences at the ends. Unlike np.gradient
+    the non-uniform formula is always used, so the values don't depend on
+    whether the spacing of a window of samples happens to be uniform.
+    """
+    dt = np.diff(t)[:,np.newaxis]
+    dt1 = dt[:-1]
+    dt2 = dt[1:]
+    deriv = np.empty(values.shape)
+    deriv[1:-1] = (
+            - dt2/(dt1*(dt1 + dt2))*values[:-2] 
+            + (dt2 - dt1)/(dt1*dt2)*values[1:-1] 
+            + dt1/(dt2*(dt1 + dt2))*values[2:]
+            )
+    deriv[0] = (values[1] - values[0])/dt[0]
+    deriv[-1] = (values[-1] - values[-2])/dt[-1]
+    return deriv
+
+
+def iter_force(hsim, omega, domega=None, lin_acc=None, chunk_size=100_000,
+        time_offset=0.0, components=None, projections=None, vectors=True):
+    """
+    Computes the forces on the left and right halteres of hsim in chunks for
+    recorded body rotations, yielding (t, force) for each chunk as for
+    Halteres.iter_force. Only the samples of the recordings which span each
+    chunk are read.
+
+    Parameters
+    ----------
+    hsim : Halteres
+        the haltere simulation which sets the time base
+    omega : Recording or array_like
+        recorded body angular velocity (rad/s) or a constant (3,) array
+    domega : Recording or array_like, optional
+        body angular acceleration (rad/s**2). When not given and omega is a
+        Recording it is derived from the recorded angular velocity.
+    lin_acc : Recording or array_like, optional
+        body linear acceleration (m/s**2)
+    chunk_size : int
+        the maximum number of samples per chunk
+    time_offset : float
+        recording time (s) corresponding to time zero of the simulation
+    components, projections, vectors :
+        the requested outputs, see calc_haltere_force
+
+    """
+    if domega is None and isinstance(omega, Recording):
+        domega = Derivative(omega)
+    options = {
+            'components'  : components,
+            'projections' : projections,
+            'vectors'     : vectors,
+            }
+    for start, stop in hsim.chunks(chunk_size):
+        t = hsim.time_slice(start, stop)
+        inputs = [resample(a, t + time_offset) for a in (omega, domega, lin_acc)]
+        yield t, hsim.force_slice(start, stop, *inputs, **options)
+
+
+class Derivative:
+    """ The time derivative of a Recording, see Recording.resample_derivative """
+
+    def __init__(self, recording):
+        self.recording = recording
+
+    def resample(self, t):
+        return self.recording.resample_derivative(t)
+
+
+def resample(a, t):
+    """ Resamples recordings at the times t, other inputs are returned as is """
+    if isinstance(a, (Recording, Derivative)):
+        return a.resample(t)
+    return a
@@ -0,0 +1,185 @@
+import collections.abc
+import numpy as np
+
+
+class ForceResult(collections.abc.Mapping):
+    """
+    The forces on the left and right halteres stored in two contiguous
+    arrays, the force component vectors and their projections. Indexing
+    gives dict-like views of the arrays with the layout of the dicts
+    returned by calc_haltere_force, e.g. force['left']['lateral']['coriolis']
+    or force['right']['total'], so that results can be used in place of the
+    nested dicts.
+
+    Attributes
+    ----------
+    vectors : array_like
+        (side, component, N, 3) array of force vectors, or (side, component,
+        M, N, 3) for a batch of M cases, None if the vectors weren't computed
+    projections : array_like
+        (side, projection, component, N) array of force projections, or
+        (side, projection, component, M, N), None if no projections were
+        computed
+    sides : tuple
+        the names of the sides, 'left' and 'right'
+    components : tuple
+        the names of the force components, see FORCE_COMPONENTS
+    projection_names : tuple
+        the names of the projections, see FORCE_PROJECTIONS
+
+    """
+
+    def __init__(self, vectors, projections, sides, components, projection_names):
+        self.vectors = vectors
+        self.projections = projections
+        self.sides = tuple(sides)
+        self.components = tuple(components)
+        self.projection_names = tuple(projection_names)
+
+    @classmethod
+    def empty(cls, shape, sides, components, projection_names, vectors=True,
+            dtype=np.float64):
+        """
+        Allocates a result for forces of the given shape, (N,3) or (M,N,3),
+        with the vectors only if vectors is True.
+        """
+        num_side = len(sides)
+        num_component = len(components)
+        vector_array = None
+        if vectors:
+            vector_array = np.empty((num_side, num_component) + shape, dtype=dtype)
+        projection_array = None
+        if projection_names:
+            projection_shape = (num_side, len(projection_names), num_component) + shape[:-1]
+            projection_array = np.empty(projection_shape, dtype=dtype)
+        return cls(vector_array, projection_array, sides, components, projection_names)
+
+    @property
+    def shape(self):
+        """ The shape, (N,3) or (M,N,3), of each force component """
+        if self.vectors is not None:
+            return self.vectors.shape[2:]
+        return self.projections.shape[3:] + (3,)
+
+    @property
+    def dtype(self):
+        array = self.vectors if self.vectors is not None else self.projections
+        return array.dtype
+
+    def __getitem__(self, side):
+        try:
+            index = self.sides.index(side)
+        except ValueError:
+            raise KeyError(side) from None
+        return SideView(self, index)
+
+    def __iter__(self):
+        return iter(self.sides)
+
+    def __len__(self):
+        return len(self.sides)
+
+    def __repr__(self):
+        return (f'ForceResult(shape={self.shape}, components={self.components}, '
+                f'projections={self.projection_names}, vectors={self.vectors is not None})')
+
+    def buffers(self, side):
+        """
+        Views of the arrays for a side as a dict of output buffers, see the
+        out argument of calc_haltere_force.
+        """
+        return to_dict(self[side])
+
+    def view(self, index):
+        """
+        Returns a ForceResult viewing the cases, or the samples if there is
+        no batch axis, selected by index, e.g. a slice. No data is copied so
+        a large preallocated result can be filled in parts, see Halteres.force.
+        """
+        vectors = None if self.vectors is None else self.vectors[:,:,index]
+        projections = None if self.projections is None else self.projections[:,:,:,index]
+        return ForceResult(vectors, projections, self.sides, self.components,
+                self.projection_names)
+
+    def to_dict(self):
+        """ The result as nested dicts of array views """
+        return {side: to_dict(self[side]) for side in self.sides}
+
+    def save(self, file):
+        """ Saves the result to an uncompressed .npz file, see load """
+        arrays = {
+                'sides'       : np.array(self.sides),
+                'components'  : np.array(self.components),
+                'projections' : np.array(self.projection_names),
+                }
+        if self.vectors is not None:
+            arrays['vector_array'] = self.vectors
+        if self.projections is not None:
+            arrays['projection_array'] = self.projections
+        np.savez(file, **arrays)
+
+    @classmethod
+    def load(cls, file):
+        """ Loads a result saved by save """
+        with np.load(file) as data:
+            vectors = data['vector_array'] if 'vector_array' in data else None
+            projections = data['projection_array'] if 'projection_array' in data else None
+            return cls(vectors, projections, data['sides'].tolist(),
+                    data['components'].tolist(), data['projections'].tolist())
+
+
+class SideView(collections.abc.Mapping):
+    """
+    The forces on one haltere of a ForceResult, the component vectors and
+    the projections keyed by name, as returned by calc_haltere_force.
+    """
+
+    def __init__(self, result, index):
+        self.result = result
+        self.index = index
+
+    def __getitem__(self, key):
+        result = self.result
+        if key in result.projection_names:
+            return ProjectionView(result, self.index, result.projection_names.index(key))
+        if result.vectors is not None and key in result.components:
+            return result.vectors[self.index, result.components.index(key)]
+        raise KeyError(key)
+
+    def __iter__(self):
+        if self.result.vectors is not None:
+            yield from self.result.components
+        yield from self.result.projection_names
+
+    def __len__(self):
+        num_vector = 0 if self.result.vectors is None else len(self.result.components)
+        return num_vector + len(self.result.projection_names)
+
+
+class ProjectionView(collections.abc.Mapping):
+    """ The projections of the force components of a ForceResult onto an axis """
+
+    def __init__(self, result, side_index, index):
+        self.result = result
+        self.side_index = side_index
+        self.index = index
+
+    def __getitem__(self, key):
+        try:
+            component = self.result.components.index(key)
+        except ValueError:
+            raise KeyError(key) from None
+        return self.result.projections[self.side_index, self.index, component]
+
+    def __iter__(self):
+        return iter(self.result.components)
+
+    def __len__(self):
+        return len(self.result.components)
+
+
+def to_dict(view):
+    """ Converts nested views to nested dicts of the viewed arrays """
+    if isinstance(view, collections.abc.Mapping):
+        return {k: to_dict(v) for k, v in view.items()}
+    return view
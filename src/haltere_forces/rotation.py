@@ -0,0 +1,128 @@
+import numpy as np
+from . import profiling
+
+
+def tilt_matrix(angle):
+    """
+    Returns the rotation matrix for a rotation about the z-axis.
+
+    Parameters
+    ----------
+    angle : float
+        the rotation angle (rad)
+
+    Returns
+    -------
+    rot : array_like
+        (3,3) rotation matrix
+
+    """
+    c = np.cos(angle)
+    s = np.sin(angle)
+    rot = np.array([
+        [  c,  -s, 0.0],
+        [  s,   c, 0.0],
+        [0.0, 0.0, 1.0],
+        ])
+    return rot
+
+
+@profiling.stage('rotation.flap')
+def flap_rotate(v, angle, method='matrix', dtype=None):
+    """
+    Rotates the vector v about the y-axis by each of the given angles.
+
+    Parameters
+    ----------
+    v : array_like
+        (3,) vector to rotate
+    angle : array_like
+        (N,) array of rotation angles (rad)
+    method : str
+        the rotation backend, 'matrix' (default) for closed form rotations
+        using the sine and cosine of the angles or 'quaternion' for rotations
+        using quaternionic arrays.
+    dtype : data-type, optional
+        the floating point type of the rotated vectors, by default that of 
+        the angles. The rotations are computed in double precision.
+
+    Returns
+    -------
+    w : array_like
+        (N,3) array of rotated vectors
+
+    """
+    v = np.asarray(v, dtype=np.float64)
+    angle = np.asarray(angle)
+    if dtype is None:
+        dtype = np.result_type(angle, 1.0)
+    angle = angle.astype(np.float64, copy=False)
+    match method:
+        case 'matrix':
+            c = np.cos(angle)
+            s = np.sin(angle)
+            w = np.empty(np.shape(angle) + (3,), dtype=dtype)
+            w[...,0] =  c*v[0] + s*v[2]
+            w[...,1] =  v[1]
+            w[...,2] = -s*v[0] + c*v[2]
+        case 'quaternion':
+            import quaternionic as qn
+            rot_axis_angle = np.zeros(np.shape(angle) + (3,))
+            rot_axis_angle[...,1] = angle
+            qrot_flap = qn.array.from_axis_angle(rot_axis_angle)
+            w = qrot_flap.rotate(v).astype(dtype, copy=False)
+        case _:
+            raise ValueError(f'unknown rotation method, {method}')
+    return w
+
+
+@profiling.stage('rotation.tilt')
+def tilt_rotate(v, angle, method='matrix'):
+    """
+    Rotates the vectors v about the z-axis by a fixed tilt angle, or by each
+    of a batch of tilt angles.
+
+    Parameters
+    ----------
+    v : array_like
+        (3,) or (N,3) array of vectors to rotate, or for a batch of angles
+        (B,N,3) array of the vectors rotated by each angle
+    angle : float or array_like
+        the tilt angle (rad), or (B,) array of the tilt angles of a batch
+        by which (3,) or (N,3) vectors are each rotated
+    method : str
+        the rotation backend, 'matrix' (default) for multiplication by a
+        precomputed rotation matrix or 'quaternion' for rotation using
+        quaternionic arrays. Batches of angles require 'matrix'.
+
+    Returns
+    -------
+    w : array_like
+        array of rotated vectors with the same shape and floating point type
+        as v, or (B,3) or (B,N,3) for a batch of angles
+
+    """
+    match method:
+        case 'matrix':
+            # Applied elementwise rather than by matmul so that results don't
+            # depend on how the vectors are split into chunks. Batches of
+            # angles are broadcast against the vectors' leading axis.
+            v = np.asarray(v)
+            angle = np.asarray(angle)
+            c = np.cos(angle).reshape(angle.shape + (1,)*min(v.ndim - 1, 1))
+            s = np.sin(angle).reshape(c.shape)
+            shape = np.broadcast_shapes(c.shape, v.shape[:-1]) + (3,)
+            w = np.empty(shape, dtype=np.result_type(v, 1.0))
+            w[...,0] = c*v[...,0] - s*v[...,1]
+            w[...,1] = s*v[...,0] + c*v[...,1]
+            w[...,2] = v[...,2]
+        case 'quaternion':
+            import quaternionic as qn
+            if np.ndim(angle) > 0:
+                raise ValueError("batches of tilt angles require the 'matrix' rotation")
+            qrot_tilt = qn.array.from_axis_angle([0.0, 0.0, angle])
+            dtype = np.result_type(np.asarray(v), 1.0)
+            w = qrot_tilt.rotate(v).astype(dtype, copy=False)
+        case _:
+            raise ValueError(f'unknown rotation method, {method}')
+    return w
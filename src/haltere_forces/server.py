@@ -0,0 +1,558 @@
+import os
+import sys
+import stat
+import time
+import queue
+import pickle
+import argparse
+import tempfile
+import threading
+import collections
+from multiprocessing import connection
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+import numpy as np
+from .halteres import Halteres
+from .halteres import batch_size
+from .results import ForceResult
+
+# Environment variable holding the authentication key of the server
+AUTHKEY_ENV = 'HALTERE_FORCES_AUTHKEY'
+
+# Alignment (bytes) of the arrays in the shared memory segments
+ALIGNMENT = 64
+
+
+def default_address():
+    """
+    The default address of the server, a Unix socket in $XDG_RUNTIME_DIR or
+    else in a directory of the user in the temporary directory
+    """
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        directory = os.path.join(tempfile.gettempdir(), f'haltere-forces-{os.getuid()}')
+    return os.path.join(directory, 'haltere-forces.sock')
+
+
+def is_unix_address(address):
+    """ Whether an address is the path of a Unix socket """
+    return isinstance(address, str) and not address.startswith('\0')
+
+
+def private_directory(path):
+    """
+    Creates, if required, the directory of a Unix socket, with mode 0700,
+    and checks that it is a directory which only the user can access.
+    Raises PermissionError otherwise.
+    """
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f'socket directory is not a directory, {path}')
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(
+                f'socket directory must be owned by the user with mode 0700, {path}')
+
+
+def check_socket(path):
+    """
+    Checks that a Unix socket is owned by the user before connecting to it,
+    as the replies of its server are unpickled. Raises PermissionError
+    otherwise.
+    """
+    info = os.stat(path)
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f'not a socket owned by the user, {path}')
+
+
+def remove_stale_socket(path):
+    """ Removes a socket of the user left by a server which has exited """
+    if not os.path.exists(path):
+        return
+    check_socket(path)
+    try:
+        connection.Client(path).close()
+    except ConnectionRefusedError:
+        os.unlink(path)
+    except (OSError, EOFError, connection.AuthenticationError):
+        pass
+
+
+class ForceServer:
+    """
+    A long-lived local server which computes haltere forces for client
+    processes, see ForceClient, so that the kinematics and waveforms of the
+    parameter sets in use stay cached between scripts and notebooks.
+
+    The server keeps a Halteres instance, and so its memoized kinematics, for
+    each of the most recently used parameter sets, and the results of the
+    most recent requests. Requests which arrive within coalesce_time of each
+    other and share the parameters, options and input layout are stacked
+    into a single batch mode evaluation, see Halteres.force, whose cases are
+    then split between the requests. The forces therefore agree with those
+    of Halteres to within rounding. A request which fails is reported to its
+    client only, the others of its batch are evaluated separately.
+
+    Each connection is served by a thread. The forces are written to a
+    shared memory segment owned by the connection and only their layout is
+    sent over the socket, so the results aren't pickled. The segment is
+    reused, and grown when required, by the following requests of the
+    connection.
+
+    Requests are pickled, so the server must only be reachable by trusted
+    clients. A Unix socket must be in a directory which only the user can
+    access, which is created if required, e.g. that of default_address, and
+    the socket itself is made accessible only to the user, mode 0600. Other
+    sockets, e.g. a localhost TCP port, require an authentication key.
+
+    Parameters
+    ----------
+    address : str or tuple, optional
+        path of a Unix socket, or (host, port) of a TCP socket, by default
+        default_address()
+    authkey : bytes, optional
+        authentication key of the clients, required for TCP sockets
+    max_instances : int
+        number of parameter sets whose Halteres are kept (default=16)
+    max_result_bytes : int
+        total bytes of the request results which are kept (default=2**28)
+    coalesce_time : float
+        time (s) to wait for further requests to evaluate together
+        (default=1e-3)
+
+    """
+
+    def __init__(self, address=None, authkey=None, max_instances=16,
+            max_result_bytes=2**28, coalesce_time=1e-3):
+        address = default_address() if address is None else address
+        if is_unix_address(address):
+            private_directory(os.path.dirname(os.path.abspath(address)))
+            remove_stale_socket(address)
+        elif authkey is None:
+            raise ValueError('an authkey is required for sockets other than Unix sockets')
+        self.listener = connection.Listener(address, authkey=authkey)
+        if is_unix_address(address):
+            os.chmod(address, 0o600)
+        self.authkey = authkey
+        self.max_instances = max_instances
+        self.max_result_bytes = max_result_bytes
+        self.result_bytes = 0
+        self.coalesce_time = coalesce_time
+        self.instances = collections.OrderedDict()
+        self.results = collections.OrderedDict()
+        self.requests = queue.Queue()
+        self.stats = collections.Counter()
+        self.stats_lock = threading.Lock()
+        self.closed = threading.Event()
+        self.serving = False
+
+    @property
+    def address(self):
+        return self.listener.address
+
+    def serve_forever(self):
+        """ Accepts and serves connections until the server is closed """
+        evaluator = threading.Thread(target=self.evaluate_requests, daemon=True)
+        evaluator.start()
+        self.serving = True
+        try:
+            while not self.closed.is_set():
+                try:
+                    conn = self.listener.accept()
+                except (OSError, EOFError, connection.AuthenticationError):
+                    continue
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            self.serving = False
+            self.listener.close()
+            self.requests.put(None)
+            evaluator.join()
+
+    def close(self):
+        """ Stops accepting connections and removes the socket """
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        if not self.serving:
+            self.listener.close()
+            return
+        # Wakes serve_forever, blocked accepting a connection
+        try:
+            connection.Client(self.address, authkey=self.authkey).close()
+        except OSError:
+            pass
+
+    def handle(self, conn):
+        """ Serves the requests of a connection until it is closed """
+        segment = None
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    break
+                match message.get('op'):
+                    case 'force':
+                        request = Request(message)
+                        self.requests.put(request)
+                        request.done.wait()
+                        if request.error is not None:
+                            conn.send({'error': request.error})
+                            continue
+                        segment, reply = write_result(segment, request.result)
+                        conn.send(reply)
+                    case 'stats':
+                        with self.stats_lock:
+                            stats = dict(self.stats)
+                        conn.send(stats)
+                    case op:
+                        conn.send({'error': ValueError(f'unknown operation, {op}')})
+        finally:
+            conn.close()
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+
+    def count(self, name, n):
+        """ Adds n to a statistic, see ForceClient.stats """
+        with self.stats_lock:
+            self.stats[name] += n
+
+    def evaluate_requests(self):
+        """
+        Takes the queued requests, waiting coalesce_time after the first of
+        each batch for more, and evaluates them until a None is queued.
+        """
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            pending = [request]
+            deadline = time.monotonic() + self.coalesce_time
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    request = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)
+                    break
+                pending.append(request)
+            self.evaluate(pending)
+
+    def evaluate(self, pending):
+        """ Computes the results of a list of requests, by group """
+        groups = {}
+        for request in pending:
+            self.count('requests', 1)
+            try:
+                request.prepare()
+            except Exception as error:
+                request.finish(error=error)
+                continue
+            cached = self.results.get(request.result_key)
+            if cached is not None:
+                result, _ = cached
+                self.results.move_to_end(request.result_key)
+                self.count('result_hits', 1)
+                request.finish(result=result)
+                continue
+            groups.setdefault(request.group_key, []).append(request)
+        for group in groups.values():
+            try:
+                self.evaluate_group(group)
+            except Exception as error:
+                if len(group) == 1:
+                    group[0].finish(error=error)
+                    continue
+                for request in group:
+                    try:
+                        self.evaluate_group([request])
+                    except Exception as error:
+                        request.finish(error=error)
+
+    def evaluate_group(self, group):
+        """
+        Evaluates requests of the same group as a single batch, stacking
+        their cases, and finishes them with views of their cases.
+        """
+        hsim = self.halteres(group[0])
+        sizes = [r.num_case for r in group]
+        inputs = []
+        for i, a in enumerate(group[0].inputs):
+            if a is None:
+                inputs.append(None)
+                continue
+            cases = [np.broadcast_to(r.inputs[i], (n,) + a.shape[1:]) for r, n in zip(group, sizes)]
+            inputs.append(np.concatenate(cases) if len(cases) > 1 else cases[0])
+        force = hsim.force(*inputs, batch=True, **group[0].options)
+        self.count('evaluations', 1)
+        self.count('coalesced', len(group) - 1)
+        start = 0
+        for request, n in zip(group, sizes):
+            result = force.view(slice(start, start + n))
+            start += n
+            self.cache_result(request.result_key, result)
+            request.finish(result=result)
+
+    def cache_result(self, key, result):
+        """
+        Keeps a copy of a request's result, so that the batch it views isn't
+        kept, removing the least recently used results to keep their total
+        bytes within max_result_bytes
+        """
+        arrays = [a for a in (result.vectors, result.projections) if a is not None]
+        nbytes = sum(a.nbytes for a in arrays)
+        if key in self.results:
+            self.result_bytes -= self.results.pop(key)[1]
+        if nbytes > self.max_result_bytes:
+            return
+        while self.results and self.result_bytes + nbytes > self.max_result_bytes:
+            _, (_, removed) = self.results.popitem(last=False)
+            self.result_bytes -= removed
+        copy = ForceResult(
+                None if result.vectors is None else result.vectors.copy(),
+                None if result.projections is None else result.projections.copy(),
+                result.sides,
+                result.components,
+                result.projection_names,
+                )
+        self.results[key] = (copy, nbytes)
+        self.result_bytes += nbytes
+
+    def halteres(self, request):
+        """ The cached Halteres of the parameters of a request """
+        hsim = self.instances.get(request.param_key)
+        if hsim is None:
+            hsim = Halteres(param=dict(request.param))
+            self.instances[request.param_key] = hsim
+            while len(self.instances) > self.max_instances:
+                self.instances.popitem(last=False)
+            self.count('instances', 1)
+        else:
+            self.instances.move_to_end(request.param_key)
+        return hsim
+
+
+class Request:
+    """ A force request of a client, finished by the evaluator thread """
+
+    def __init__(self, message):
+        self.message = message
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def prepare(self):
+        """
+        Converts the inputs to batch form and computes the keys of the
+        request, those of the parameters, of the group of requests which may
+        be evaluated together and of the result.
+        """
+        message = self.message
+        self.param = message['param']
+        inputs = [None if a is None else np.asarray(a, dtype=np.float64)
+                for a in message['inputs']]
+        inputs = [a[np.newaxis] if a is not None and a.ndim == 1 else a for a in inputs]
+        if inputs[0] is None:
+            raise ValueError('omega must be given')
+        self.inputs = inputs
+        self.num_case = batch_size(*(a for a in inputs if a is not None))
+        self.options = {
+                'components'  : message.get('components'),
+                'projections' : message.get('projections'),
+                'vectors'     : message.get('vectors', True),
+                }
+        self.param_key = pickle.dumps(sorted(self.param.items()))
+        layout = tuple(None if a is None else a.shape[1:] for a in inputs)
+        options = pickle.dumps(sorted(self.options.items()))
+        self.group_key = (self.param_key, options, layout)
+        data = tuple(None if a is None else (a.shape, a.tobytes()) for a in inputs)
+        self.result_key = (self.group_key, data)
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+
+def write_result(segment, result):
+    """
+    Writes the arrays of a ForceResult to a shared memory segment, replacing
+    it by a larger one if required. Returns the segment and the reply, the
+    layout of the arrays in the segment.
+    """
+    arrays = {'vectors': result.vectors, 'projections': result.projections}
+    layout = {}
+    size = 0
+    for name, array in arrays.items():
+        if array is None:
+            layout[name] = None
+            continue
+        layout[name] = (size, array.shape, array.dtype.str)
+        size += -(-array.nbytes//ALIGNMENT)*ALIGNMENT
+    if segment is None or segment.size < size:
+        if segment is not None:
+            segment.close()
+            segment.unlink()
+        segment = shared_memory.SharedMemory(create=True, size=max(size, ALIGNMENT))
+    for name, array in arrays.items():
+        if array is not None:
+            offset, shape, dtype = layout[name]
+            np.ndarray(shape, dtype, buffer=segment.buf, offset=offset)[...] = array
+    reply = {
+            'name'             : segment.name,
+            'layout'           : layout,
+            'sides'            : result.sides,
+            'components'       : result.components,
+            'projection_names' : result.projection_names,
+            }
+    return segment, reply
+
+
+class ForceClient:
+    """
+    A connection to a ForceServer, computing forces as Halteres.force does
+    for the parameters given with each request.
+
+    Parameters
+    ----------
+    address : str or tuple, optional
+        address of the server, by default default_address()
+    authkey : bytes, optional
+        authentication key of the server, by default the environment
+        variable HALTERE_FORCES_AUTHKEY if set
+
+    A Unix socket must be owned by the user, as the replies of the server
+    are unpickled.
+
+    """
+
+    def __init__(self, address=None, authkey=None):
+        address = default_address() if address is None else address
+        if authkey is None and AUTHKEY_ENV in os.environ:
+            authkey = os.environ[AUTHKEY_ENV].encode()
+        if is_unix_address(address):
+            check_socket(address)
+        self.conn = connection.Client(address, authkey=authkey)
+        self.segment = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+        self.detach()
+
+    def force(self, param, omega, domega=None, lin_acc=None, batch=False,
+            components=None, projections=None, vectors=True, copy=True):
+        """
+        Computes the forces on the left and right halteres of the parameters
+        param, see Halteres.force, returned as a ForceResult. If copy is
+        False the result views the shared memory of the connection, and is
+        only valid until the next request.
+        """
+        inputs = [None if a is None else np.asarray(a, dtype=np.float64)
+                for a in (omega, domega, lin_acc)]
+        if not batch:
+            inputs = [None if a is None else a[np.newaxis] for a in inputs]
+        self.conn.send({
+            'op'          : 'force',
+            'param'       : dict(param),
+            'inputs'      : inputs,
+            'components'  : None if components is None else tuple(components),
+            'projections' : None if projections is None else tuple(projections),
+            'vectors'     : vectors,
+            })
+        reply = self.conn.recv()
+        if 'error' in reply:
+            raise reply['error']
+        if self.segment is None or self.segment.name != reply['name']:
+            self.detach()
+            self.segment = attach(reply['name'])
+        arrays = {}
+        for name, layout in reply['layout'].items():
+            if layout is None:
+                arrays[name] = None
+                continue
+            offset, shape, dtype = layout
+            array = np.ndarray(shape, dtype, buffer=self.segment.buf, offset=offset)
+            if not batch:
+                case_axis = 2 if name == 'vectors' else 3
+                array = array[(slice(None),)*case_axis + (0,)]
+            arrays[name] = array.copy() if copy else array
+        return ForceResult(arrays['vectors'], arrays['projections'], reply['sides'],
+                reply['components'], reply['projection_names'])
+
+    def stats(self):
+        """
+        Counts of the server's requests, evaluations, requests coalesced
+        into the evaluations of others, result cache hits and Halteres
+        instances created
+        """
+        self.conn.send({'op': 'stats'})
+        return self.conn.recv()
+
+    def detach(self):
+        if self.segment is not None:
+            try:
+                self.segment.close()
+            except BufferError:
+                # Results viewing the segment keep it mapped
+                pass
+            self.segment = None
+
+
+def attach(name):
+    """
+    Attaches to a shared memory segment of the server without registering it
+    with the resource tracker of the client, as the server removes it.
+    """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        segment = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            prog='python -m haltere_forces.server',
+            description='Serves haltere forces to local ForceClients',
+            )
+    parser.add_argument('--socket',
+            help='path of the Unix socket, in a directory private to the user')
+    parser.add_argument('--port', type=int, help='localhost TCP port, instead of a Unix socket')
+    parser.add_argument('--coalesce-ms', type=float, default=1.0,
+            help='time to wait for requests to evaluate together (ms)')
+    parser.add_argument('--max-instances', type=int, default=16)
+    parser.add_argument('--max-result-mb', type=float, default=256.0,
+            help='total size of the cached results (MB)')
+    args = parser.parse_args(argv)
+    address = ('localhost', args.port) if args.port is not None else args.socket
+    authkey = os.environ.get(AUTHKEY_ENV)
+    server = ForceServer(
+            address,
+            authkey=None if authkey is None else authkey.encode(),
+            max_instances=args.max_instances,
+            max_result_bytes=int(2**20*args.max_result_mb),
+            coalesce_time=1e-3*args.coalesce_ms,
+            )
+    print(f'serving haltere forces on {server.address}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -64,3 +64,251 @@ def lateral_coriolis_from_pitch(mass, length, beta, omega_x, theta, dtheta_dt):
 
 
 
+
+
+def coriolis_from_roll(mass, length, beta, omega_y, theta, dtheta_dt, side='right'):
+    """
+    Calculates the coriolis force due to a constant roll rotation (rotation
+    about the y-axis).
+
+    Parameters
+    ----------
+    mass : float
+        the mass of the haltere end knob 
+    length : float
+        the length of the haltere, from point of rotation to center of end knob.
+    beta : float
+        haltere tilt angle
+    omega_y : float
+        roll rate about the y-axis 
+    theta : array_like
+        haltere position angles (rad). 
+    dtheta_dt : array_like
+        haltere angular velocities (rad/sec)
+    side : str
+        the haltere, 'right' (default) or 'left'
+
+    Returns
+    -------
+    f : array_like
+        coriolis forces 
+        
+    """
+    sgn = side_sign(side)
+    num_pts = len(theta)
+    f = np.zeros((num_pts, 3))
+    f[:,0] = -2.0*length*mass*omega_y*dtheta_dt*np.cos(theta)
+    f[:,2] = -sgn*2.0*length*mass*omega_y*dtheta_dt*np.sin(theta)*np.cos(beta)
+    return f
+
+
+def lateral_coriolis_from_roll(mass, length, beta, omega_y, theta, dtheta_dt, side='right'):
+    """
+    Calculates the lateral component of the coriolis force due to a constant
+    roll rotation (rotation about the y-axis). 
+
+    Parameters
+    ----------
+    mass : float
+        the mass of the haltere end knob 
+    length : float
+        the length of the haltere, from point of rotation to center of end knob.
+    beta : float
+        haltere tilt angle
+    omega_y : float
+        roll rate about the y-axis 
+    theta : array_like
+        haltere position angles (rad). 
+    dtheta_dt : array_like
+        haltere angular velocities (rad/sec)
+    side : str
+        the haltere, 'right' (default) or 'left'
+
+    Returns
+    -------
+    f : array_like
+        lateral component of coriolis forces   
+        
+    """
+    sgn = side_sign(side)
+    return -sgn*2.0*length*mass*omega_y*dtheta_dt*np.cos(theta)*np.sin(beta)
+
+
+def coriolis_from_yaw(mass, length, beta, omega_z, theta, dtheta_dt, side='right'):
+    """
+    Calculates the coriolis force due to a constant yaw rotation (rotation
+    about the z-axis).
+
+    Parameters
+    ----------
+    mass : float
+        the mass of the haltere end knob 
+    length : float
+        the length of the haltere, from point of rotation to center of end knob.
+    beta : float
+        haltere tilt angle
+    omega_z : float
+        yaw rate about the z-axis 
+    theta : array_like
+        haltere position angles (rad). 
+    dtheta_dt : array_like
+        haltere angular velocities (rad/sec)
+    side : str
+        the haltere, 'right' (default) or 'left'
+
+    Returns
+    -------
+    f : array_like
+        coriolis forces 
+        
+    """
+    sgn = side_sign(side)
+    num_pts = len(theta)
+    f = np.zeros((num_pts, 3))
+    f[:,0] = 2.0*length*mass*omega_z*dtheta_dt*np.sin(theta)*np.sin(beta)
+    f[:,1] = sgn*2.0*length*mass*omega_z*dtheta_dt*np.sin(theta)*np.cos(beta)
+    return f
+
+
+def lateral_coriolis_from_yaw(mass, length, beta, omega_z, theta, dtheta_dt, side='right'):
+    """
+    Calculates the lateral component of the coriolis force due to a constant
+    yaw rotation (rotation about the z-axis). 
+
+    Parameters
+    ----------
+    mass : float
+        the mass of the haltere end knob 
+    length : float
+        the length of the haltere, from point of rotation to center of end knob.
+    beta : float
+        haltere tilt angle
+    omega_z : float
+        yaw rate about the z-axis 
+    theta : array_like
+        haltere position angles (rad). 
+    dtheta_dt : array_like
+        haltere angular velocities (rad/sec)
+    side : str
+        the haltere, 'right' (default) or 'left'
+
+    Returns
+    -------
+    f : array_like
+        lateral component of coriolis forces   
+        
+    """
+    sgn = side_sign(side)
+    return sgn*2.0*length*mass*omega_z*dtheta_dt*np.sin(theta)
+
+
+def coriolis(mass, length, beta, omega, theta, dtheta_dt, side='right', batch=False):
+    """
+    Calculates the coriolis force for an arbitrary, possibly time-varying,
+    body angular velocity. 
+
+    Parameters
+    ----------
+    mass : float
+        the mass of the haltere end knob 
+    length : float
+        the length of the haltere, from point of rotation to center of end knob.
+    beta : float
+        haltere tilt angle
+    omega : array_like
+        (3,) or (N,3) array of body angular velocities, or (M,3) or (M,N,3)
+        if batch is True. 
+    theta : array_like
+        (N,) array of haltere position angles (rad). 
+    dtheta_dt : array_like
+        (N,) array of haltere angular velocities (rad/sec)
+    side : str
+        the haltere, 'right' (default) or 'left'
+    batch : bool
+        whether or not omega is a stack of M cases (default=False)
+
+    Returns
+    -------
+    f : array_like
+        (N,3) array of coriolis forces, or (M,N,3) if batch is True
+        
+    """
+    sgn = side_sign(side)
+    omega = np.asarray(omega)
+    omega_x, omega_y, omega_z = omega[...,0], omega[...,1], omega[...,2]
+    sin_beta = np.sin(beta)
+    cos_beta = np.cos(beta)
+    coef_cos = (-omega_y, omega_x, np.zeros_like(omega_x))
+    coef_sin = (
+            omega_z*sin_beta, 
+            sgn*omega_z*cos_beta, 
+            -(omega_x*sin_beta + sgn*omega_y*cos_beta),
+            )
+    k = 2.0*length*mass*np.asarray(dtheta_dt)
+    k_cos = k*np.cos(theta)
+    k_sin = k*np.sin(theta)
+    if batch and omega.ndim == 2:
+        coef = np.stack((np.stack(coef_cos, axis=-1), np.stack(coef_sin, axis=-1)), axis=-1)
+        f = np.moveaxis(coef @ np.stack((k_cos, k_sin)), 1, 2)
+    else:
+        shape = np.broadcast_shapes(omega_x.shape, np.shape(theta))
+        f = np.empty(shape + (3,))
+        for i in range(3):
+            f[...,i] = coef_cos[i]*k_cos + coef_sin[i]*k_sin
+    return f
+
+
+def lateral_coriolis(mass, length, beta, omega, theta, dtheta_dt, side='right', batch=False):
+    """
+    Calculates the lateral component of the coriolis force for an arbitrary,
+    possibly time-varying, body angular velocity. 
+
+    Parameters
+    ----------
+    mass : float
+        the mass of the haltere end knob 
+    length : float
+        the length of the haltere, from point of rotation to center of end knob.
+    beta : float
+        haltere tilt angle
+    omega : array_like
+        (3,) or (N,3) array of body angular velocities, or (M,3) or (M,N,3)
+        if batch is True. 
+    theta : array_like
+        (N,) array of haltere position angles (rad). 
+    dtheta_dt : array_like
+        (N,) array of haltere angular velocities (rad/sec)
+    side : str
+        the haltere, 'right' (default) or 'left'
+    batch : bool
+        whether or not omega is a stack of M cases (default=False)
+
+    Returns
+    -------
+    f : array_like
+        (N,) array of lateral components of the coriolis forces, or (M,N) if
+        batch is True
+        
+    """
+    sgn = side_sign(side)
+    omega = np.asarray(omega)
+    coef_cos = omega[...,0]*np.cos(beta) - sgn*np.sin(beta)*omega[...,1]
+    coef_sin = sgn*omega[...,2]
+    k = 2.0*length*mass*np.asarray(dtheta_dt)
+    k_cos = k*np.cos(theta)
+    k_sin = k*np.sin(theta)
+    if batch and omega.ndim == 2:
+        # constant rotations, (M,2) @ (2,N)
+        return np.stack((coef_cos, coef_sin), axis=-1) @ np.stack((k_cos, k_sin))
+    return coef_cos*k_cos + coef_sin*k_sin
+
+
+def side_sign(side):
+    """ Sign of the side dependent terms, 1 for the right haltere, -1 for the left """
+    match side:
+        case 'right':
+            return 1.0
+        case 'left':
+            return -1.0
+        case _:
+            raise ValueError(f'unknown side, {side}')
@@ -0,0 +1,192 @@
+import os
+import itertools
+import concurrent.futures
+import numpy as np
+from .halteres import Halteres
+from .halteres import AXIS_KEYS
+
+
+class SweepResult:
+    """
+    The forces computed by sweep, a labelled array.
+
+    Attributes
+    ----------
+    values : array_like
+        array of forces, one axis per dimension in dims
+    dims : tuple
+        the dimension names, the swept parameters followed by 'omega',
+        'side', 'component' and 'sample'
+    coords : dict
+        the coordinate values of each dimension
+
+    """
+
+    def __init__(self, values, dims, coords):
+        self.values = values
+        self.dims = dims
+        self.coords = coords
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def sel(self, **labels):
+        """
+        Selects values by coordinate, e.g. sel(length=3.4e-4, side='left'),
+        by index for the 'omega' and 'sample' dimensions.
+        """
+        index = [slice(None)]*len(self.dims)
+        for name, label in labels.items():
+            try:
+                axis = self.dims.index(name)
+            except ValueError:
+                raise ValueError(f'unknown dimension, {name}') from None
+            if name in ('omega', 'sample'):
+                index[axis] = label
+            else:
+                index[axis] = list(self.coords[name]).index(label)
+        return self.values[tuple(index)]
+
+
+def sweep(param, grid, omega, domega=None, components=('coriolis',),
+        projection='lateral', num_workers=None):
+    """
+    Computes the projected haltere forces for every combination of the
+    parameter values in grid and for each of a set of body angular
+    velocities, distributing the work across a process pool.
+
+    Cases which differ only in mass, length, separation or tilt_angle share
+    the same waveform and stalk axis kinematics. These are grouped into the
+    same task so that one Halteres instance (and its cache) serves them all.
+    Large groups are split so that there are enough tasks for the workers.
+
+    Parameters
+    ----------
+    param : dict
+        the base Halteres parameters
+    grid : dict
+        maps parameter names to sequences of values to sweep, e.g.
+        {'tilt_angle': np.deg2rad([20, 30, 40]), 'mass': [1e-9, 2e-9]}. The
+        number of points, num_pt, can't be swept.
+    omega : array_like
+        (M,3) constant or (M,N,3) time-varying body angular velocities
+    domega : array_like, optional
+        body angular accelerations, as for omega
+    components : tuple
+        the force components to compute, see calc_haltere_force
+    projection : str
+        the force projection, 'lateral' or 'radial'
+    num_workers : int, optional
+        number of worker processes, by default os.cpu_count(). If 1 the
+        sweep is run in the calling process.
+
+    Returns
+    -------
+    result : SweepResult
+        labelled array of shape (*grid shape, M, 2, len(components), N), of
+        the floating point type param['dtype'] if given, see Halteres.dtype
+
+    """
+    names = tuple(grid)
+    if 'num_pt' in names:
+        raise ValueError('num_pt can not be swept')
+    coords = {name: np.asarray(grid[name]) for name in names}
+    grid_shape = tuple(len(coords[name]) for name in names)
+    omega = np.asarray(omega)
+    if omega.ndim not in (2, 3):
+        raise ValueError('omega must be (M,3) or (M,N,3)')
+    components = tuple(components)
+
+    # Group cases by the parameters which determine the waveform
+    groups = {}
+    for index in itertools.product(*(range(n) for n in grid_shape)):
+        key = tuple(i for name, i in zip(names, index) if name in AXIS_KEYS)
+        groups.setdefault(key, []).append(index)
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    num_case = int(np.prod(grid_shape))
+    max_task_size = max(1, -(-num_case//(4*num_workers)))
+    tasks = []
+    for indices in groups.values():
+        for start in range(0, len(indices), max_task_size):
+            cases = [
+                    (index, {n: coords[n][i].item() for n, i in zip(names, index)})
+                    for index in indices[start:start + max_task_size]
+                    ]
+            tasks.append(cases)
+
+    num_pt = param['num_pt']
+    dtype = param.get('dtype', np.float64)
+    values = np.empty(grid_shape + (len(omega), 2, len(components), num_pt), dtype=dtype)
+    shared = (param, omega, domega, components, projection)
+    if num_workers == 1:
+        init_worker(*shared)
+        results = map(run_task, tasks)
+        for cases, force in results:
+            for (index, _), f in zip(cases, force):
+                values[index] = f
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=num_workers,
+                initializer=init_worker,
+                initargs=shared,
+                ) as executor:
+            for cases, force in executor.map(run_task, tasks):
+                for (index, _), f in zip(cases, force):
+                    values[index] = f
+
+    dims = names + ('omega', 'side', 'component', 'sample')
+    coords = {
+            **coords,
+            'omega'     : omega,
+            'side'      : ('left', 'right'),
+            'component' : components,
+            'sample'    : np.arange(num_pt),
+            }
+    return SweepResult(values, dims, coords)
+
+
+# Inputs shared by all of the tasks of a sweep, set once in each worker
+_shared = {}
+
+
+def init_worker(param, omega, domega, components, projection):
+    _shared.update({
+        'param'       : param,
+        'omega'       : omega,
+        'domega'      : domega,
+        'components'  : components,
+        'projection'  : projection,
+        })
+
+
+def run_task(cases):
+    """
+    Computes the forces for a list of (index, param) cases which share the
+    same waveform. Returns the cases and the (K,M,2,C,N) forces.
+    """
+    param = _shared['param']
+    components = _shared['components']
+    projection = _shared['projection']
+    omega = _shared['omega']
+    hsim = Halteres(param=dict(param))
+    shape = (len(cases), len(omega), 2, len(components), param['num_pt'])
+    force = np.empty(shape, dtype=param.get('dtype', np.float64))
+    for i, (_, case_param) in enumerate(cases):
+        hsim.param.update(case_param)
+        out = {
+                side: {projection: {c: force[i,:,j,k] for k, c in enumerate(components)}}
+                for j, side in enumerate(('left', 'right'))
+                }
+        hsim.force(
+                omega,
+                _shared['domega'],
+                batch=True,
+                components=components,
+                projections=(projection,),
+                vectors=False,
+                out=out,
+                )
+    return cases, force
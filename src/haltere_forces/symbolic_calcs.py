@@ -1,9 +1,8 @@
 import sympy
 
-sympy.init_printing()
-
 
 def simple_pitch_calc():
+    sympy.init_printing()
 
     t = sympy.Symbol('t')                  # time
     L = sympy.Symbol('L')                  # haltere length
@@ -105,3 +104,115 @@ def simple_pitch_calc():
 
 
 
+def general_force_calc():
+    """
+    Derives the forces on the left and right halteres for a general body
+    angular velocity, angular acceleration and linear acceleration, using the
+    same model as halteres.calc_haltere_force. 
+
+    The haltere angle and its derivatives are replaced by the symbols theta,
+    dtheta and ddtheta. Returns the input symbols, ordered as the arguments 
+    of the generated kernels, and a dictionary of expressions for each side,
+    {side: {component: (x, y, z), 'radial': {component: p}, 'lateral': ...}}.
+    """
+    t = sympy.Symbol('t')                  # time
+    L = sympy.Symbol('L')                  # haltere length
+    b = sympy.Symbol('b')                  # haltere base separation
+    m = sympy.Symbol('m')                  # haltere mass
+    g = sympy.Symbol('g')                  # gravitational acceleration
+    beta = sympy.Symbol('beta')            # haltere tilt angle
+    theta = sympy.Function('theta')(t)     # haltere angular position function
+
+    # Haltere angle and its derivatives as plain symbols
+    theta_s = sympy.Symbol('theta')
+    dtheta_s = sympy.Symbol('dtheta')
+    ddtheta_s = sympy.Symbol('ddtheta')
+
+    # Fly's angular velocity, angular acceleration and linear acceleration
+    omega = sympy.Matrix(sympy.symbols('omega_x omega_y omega_z'))
+    domega = sympy.Matrix(sympy.symbols('domega_x domega_y domega_z'))
+    lin_acc = sympy.Matrix(sympy.symbols('acc_x acc_y acc_z'))
+    gravity = sympy.Matrix([0, 0, -g])
+
+    symbols = (theta_s, dtheta_s, ddtheta_s, *omega, *domega, *lin_acc, 
+            m, L, b, beta, g)
+
+    def with_symbols(expr):
+        expr = expr.subs(sympy.Derivative(theta, (t, 2)), ddtheta_s)
+        expr = expr.subs(sympy.Derivative(theta, t), dtheta_s)
+        return expr.subs(theta, theta_s)
+
+    forces = {}
+    for side, sign in (('left', -1), ('right', 1)):
+        rot_mat = sympy.rot_ccw_axis3(-sign*beta)
+
+        # Stalk axis, before tilting, and position, velocity and acceleration 
+        axs = sympy.Matrix([sign*sympy.cos(theta), 0, sympy.sin(theta)])
+        pos = rot_mat*(L*axs) + sympy.Matrix([sign*b/2, 0, 0])
+        vel = sympy.diff(pos, t)
+        acc = sympy.diff(vel, t)
+        lat_axs = rot_mat*sympy.Matrix([0, 1, 0])
+
+        components = {
+                'gravity'     : m*gravity,
+                'primary'     : -m*acc,
+                'linear_acc'  : -m*lin_acc,
+                'angular_acc' : -m*domega.cross(pos),
+                'centrifugal' : -m*omega.cross(omega.cross(pos)),
+                'coriolis'    : -2*m*omega.cross(vel),
+                }
+        components = {'total': sum(components.values(), sympy.zeros(3, 1)), **components}
+        components = {k: with_symbols(v) for k, v in components.items()}
+        axes = {'radial': with_symbols(axs), 'lateral': lat_axs}
+
+        force = {k: tuple(v) for k, v in components.items()}
+        for proj_name, proj_axs in axes.items():
+            force[proj_name] = {k: v.dot(proj_axs) for k, v in components.items()}
+        forces[side] = force
+    return symbols, forces
+
+
+def generate_kernels():
+    """
+    Generates the source of a python module of numpy kernels for the forces
+    derived by general_force_calc, with common subexpressions eliminated. 
+
+    For each side the module defines force_<side>, returning every force
+    component vector (x, y, z) and projection, and lateral_<side>, returning 
+    the lateral projections only. The values are ordered as for 
+    halteres.FORCE_COMPONENTS. 
+    """
+    from sympy.printing.numpy import NumPyPrinter
+    from .halteres import FORCE_COMPONENTS
+    from .halteres import FORCE_PROJECTIONS
+
+    symbols, forces = general_force_calc()
+    printer = NumPyPrinter()
+    args = ', '.join(str(s) for s in symbols)
+
+    def kernel(name, exprs):
+        replacements, reduced = sympy.cse(exprs, optimizations='basic')
+        lines = [f'def {name}({args}):']
+        for sym, expr in replacements:
+            lines.append(f'    {sym} = {printer.doprint(expr)}')
+        values = ', '.join(printer.doprint(expr) for expr in reduced)
+        lines.append(f'    return ({values},)')
+        return '\n'.join(lines)
+
+    kernels = []
+    for side, force in forces.items():
+        exprs = []
+        for k in FORCE_COMPONENTS:
+            exprs.extend(force[k])
+        for proj_name in FORCE_PROJECTIONS:
+            exprs.extend(force[proj_name][k] for k in FORCE_COMPONENTS)
+        kernels.append(kernel(f'force_{side}', exprs))
+        exprs = [force['lateral'][k] for k in FORCE_COMPONENTS]
+        kernels.append(kernel(f'lateral_{side}', exprs))
+
+    header = [
+            '# Generated by haltere_forces.symbolic_calcs.generate_kernels, do not edit.',
+            'import numpy',
+            f'ARGS = {tuple(str(s) for s in symbols)}',
+            ]
+    return '\n\n\n'.join(['\n'.join(header)] + kernels) + '\n'
@@ -1,8 +1,16 @@
+import functools
 import numpy as np
-import scipy.signal as signal
+from . import profiling
 
+# scipy.signal is imported where it is used as it is slow to import
 
-def triangle(t, amplitude=1.0, period=1.0, shift=0.0):
+# Maximum number of waveforms kept by the filtered_triangle and
+# filtered_triangle_period caches
+FILTERED_TRIANGLE_CACHE_SIZE = 32
+
+
+@profiling.stage('waveform.triangle')
+def triangle(t, amplitude=1.0, period=1.0, shift=0.0, dtype=np.float64):
     """
     Generates a triangle waveform evaluated at the specified time points. 
 
@@ -16,6 +24,9 @@ def triangle(t, amplitude=1.0, period=1.0, shift=0.0):
         The period of triangle waveform
     shift: float
         The phase shift of the waveform as a fraction of the period.
+    dtype: data-type
+        The floating point type of the returned waveform values 
+        (default=np.float64). Values are computed in double precision.
     
     Returns
     ------
@@ -25,14 +36,55 @@ def triangle(t, amplitude=1.0, period=1.0, shift=0.0):
     """
     s = ((t + 0.25*period + shift*period) % period)/period
     x = amplitude*(np.where(s > 0.5, 1.0-s, s) - 0.25)/0.25
-    return x 
+    return x.astype(dtype, copy=False)
+
+
+def triangle_derivatives(t, amplitude=1.0, period=1.0, shift=0.0, dtype=np.float64):
+    """
+    Computes the first and second time derivatives of the triangle waveform
+    evaluated at the specified time points. The first derivative is piecewise
+    constant. The second derivative is zero except at the corners of the
+    waveform, where it is a Dirac delta, and is returned as zero.
+
+    Parameters
+    ----------
+    t:  array like
+        Input array of time points
+    amplitude: float
+        The amplitude (peak value) of the triangle waveform
+    period: float
+        The period of triangle waveform
+    shift: float
+        The phase shift of the waveform as a fraction of the period.
+    dtype: data-type
+        The floating point type of the returned waveform values 
+        (default=np.float64). Values are computed in double precision.
+    
+    Returns
+    ------
+    dx: array like
+       Output array of first derivative values evaluated at times t.
+
+    ddx: array like
+       Output array of second derivative values evaluated at times t.
+    
+    """
+    s = ((t + 0.25*period + shift*period) % period)/period
+    slope = amplitude/(0.25*period)
+    dx = np.where(s > 0.5, -slope, slope).astype(dtype, copy=False)
+    ddx = np.zeros_like(dx)
+    return dx, ddx
 
 
+@profiling.stage('waveform.filtered_triangle')
 def filtered_triangle(num_pt, num_cycle=1, amplitude=1.0, period=1.0, shift=0.0, 
-        cutoff_frequency=1.0, rescale=True):
+        cutoff_frequency=1.0, rescale=True, method='filtfilt', dtype=np.float64):
     """
     Generates a lowpass filtered (zero phase delay)  triangle waveform. 
 
+    Waveforms are kept in a bounded LRU cache keyed on the arguments, see 
+    cache_info and set_cache_size, and the returned arrays are read-only.
+
     Parameters
     ----------
     num_pt: int
@@ -48,6 +100,15 @@ def filtered_triangle(num_pt, num_cycle=1, amplitude=1.0, period=1.0, shift=0.0,
     rescale: bool
         whether or not to rescale the amplitude of the waveform
         so that it is equal to amplitude after filtering (default=True). 
+    method: str
+        'filtfilt' (default) to forward backward filter the waveform padded
+        by a copy on each side, or 'periodic' for the exact periodic steady 
+        state, see filtered_triangle_period. The periodic method requires
+        (num_pt - 1) to be a multiple of num_cycle.
+    dtype: data-type
+        The floating point type of the returned waveform values 
+        (default=np.float64). Values are computed in double precision and 
+        the times are always double precision.
 
     Returns
     ------
@@ -61,6 +122,33 @@ def filtered_triangle(num_pt, num_cycle=1, amplitude=1.0, period=1.0, shift=0.0,
 
     if not type(num_cycle) == int and num_cycle > 0:
         raise ValueError('num_cycle must be an integer > 0')
+    match method:
+        case 'filtfilt':
+            pass
+        case 'periodic':
+            pts_per_period = samples_per_period(num_pt, num_cycle)
+            t = np.linspace(0, num_cycle*period, num_pt)
+            x = filtered_triangle_period(pts_per_period, amplitude, period, 
+                    shift, cutoff_frequency, rescale, dtype)
+            x = x[np.arange(num_pt) % pts_per_period]
+            return t, x
+        case _:
+            raise ValueError(f'unknown filter method, {method}')
+    return _filtered_triangle_cached(
+            int(num_pt), 
+            num_cycle, 
+            float(amplitude), 
+            float(period), 
+            float(shift), 
+            float(cutoff_frequency), 
+            bool(rescale),
+            np.dtype(dtype),
+            )
+
+
+def _filtered_triangle(num_pt, num_cycle, amplitude, period, shift, 
+        cutoff_frequency, rescale, dtype):
+    """ Uncached filtered_triangle, the returned arrays are read-only. """
 
     # Create time points with padding (pre and nxt) to remove end effects. 
     t_mid = np.linspace(0,num_cycle*period, num_pt)
@@ -70,17 +158,215 @@ def filtered_triangle(num_pt, num_cycle=1, amplitude=1.0, period=1.0, shift=0.0,
     t_all = np.hstack((t_pre, t_mid, t_nxt))
 
     # Create Triangle waveform and filter it with forward backward filter. 
+    from scipy import signal
     x_all = triangle(t_all, amplitude, period, shift)
-    b, a  = signal.butter(1, 2*cutoff_frequency, btype='lowpass', output='ba', fs=1/dt)
+    b, a  = butter_lowpass(2*cutoff_frequency, 1/dt)
     x_filt_all = signal.filtfilt(b, a, x_all)
     x_filt_mid = x_filt_all[num_pt:2*num_pt]
 
     if rescale:
         x_filt_max = np.absolute(x_filt_mid).max()
         x_filt_mid = amplitude*x_filt_mid/x_filt_max
+    else:
+        x_filt_mid = x_filt_mid.copy()
+    x_filt_mid = x_filt_mid.astype(dtype, copy=False)
+    t_mid.flags.writeable = False
+    x_filt_mid.flags.writeable = False
     return t_mid, x_filt_mid
 
 
+_filtered_triangle_cached = functools.lru_cache(FILTERED_TRIANGLE_CACHE_SIZE)(
+        _filtered_triangle
+        )
+
+
+def samples_per_period(num_pt, num_cycle):
+    """ 
+    Number of samples per period of a num_cycle waveform sampled at num_pt 
+    points, which must be a whole number for the periodic filter method.
+    """
+    pts_per_period, remainder = divmod(num_pt - 1, num_cycle)
+    if remainder != 0 or pts_per_period < 2:
+        raise ValueError(
+                f'(num_pt - 1) must be a multiple of num_cycle for the periodic '
+                f'filter method, got num_pt={num_pt} and num_cycle={num_cycle}'
+                )
+    return pts_per_period
+
+
+@functools.lru_cache(maxsize=FILTERED_TRIANGLE_CACHE_SIZE)
+@profiling.stage('waveform.filtered_triangle_period')
+def filtered_triangle_period(num_pt, amplitude=1.0, period=1.0, shift=0.0, 
+        cutoff_frequency=1.0, rescale=True, dtype=np.float64):
+    """
+    Generates one period of the lowpass filtered (zero phase delay) triangle
+    waveform in exact periodic steady state. 
+
+    The period is sampled at the num_pt times k*period/num_pt and filtered
+    in the frequency domain by the magnitude squared response of the first
+    order Butterworth filter, i.e. the response of the forward backward
+    filter used by filtered_triangle applied to the periodic signal. The
+    cost is O(num_pt log num_pt) for any number of cycles. The returned 
+    array is read-only.
+
+    Parameters
+    ----------
+    num_pt: int
+        The number of points per period
+    amplitude: float
+        The amplitude (peak value) of the triangle waveform
+    period: float
+        The period of triangle waveform
+    shift: float
+        The phase shift of the waveform as a fraction of the period.
+    cutoff_frequency: float
+        the cutoff frequency of the lowpass filter
+    rescale: bool
+        whether or not to rescale the amplitude of the waveform
+        so that it is equal to amplitude after filtering (default=True). 
+    dtype: data-type
+        The floating point type of the returned waveform values 
+        (default=np.float64). Values are computed in double precision.
+
+    Returns
+    ------
+    x: array like
+       Output array of the filtered waveform values over one period. 
+
+    """
+    from scipy import signal
+    fs = num_pt/period
+    t = np.arange(num_pt)*(period/num_pt)
+    x = triangle(t, amplitude, period, shift)
+    b, a = butter_lowpass(2*cutoff_frequency, fs)
+    _, h = signal.freqz(b, a, worN=np.fft.rfftfreq(num_pt, d=1/fs), fs=fs)
+    x_filt = np.fft.irfft(np.fft.rfft(x)*np.absolute(h)**2, n=num_pt)
+    if rescale:
+        x_filt_max = np.absolute(x_filt).max()
+        x_filt = amplitude*x_filt/x_filt_max
+    x_filt = x_filt.astype(dtype, copy=False)
+    x_filt.flags.writeable = False
+    return x_filt
+
+
+@functools.lru_cache(maxsize=128)
+def butter_lowpass(cutoff_frequency, fs):
+    """ 
+    Cached first order lowpass Butterworth filter coefficients (b, a) for the
+    cutoff frequency and sample rate fs. 
+    """
+    from scipy import signal
+    b, a = signal.butter(1, cutoff_frequency, btype='lowpass', output='ba', fs=fs)
+    b.flags.writeable = False
+    a.flags.writeable = False
+    return b, a
+
+
+def set_cache_size(maxsize):
+    """
+    Sets the maximum number of entries kept by each of the waveform caches,
+    those of filtered_triangle, filtered_triangle_period and the Butterworth
+    coefficients, None for no limit or 0 to disable caching. Clears the
+    caches.
+    """
+    global _filtered_triangle_cached, filtered_triangle_period, butter_lowpass
+    _filtered_triangle_cached = functools.lru_cache(maxsize)(_filtered_triangle)
+    filtered_triangle_period = functools.lru_cache(maxsize)(filtered_triangle_period.__wrapped__)
+    butter_lowpass = functools.lru_cache(maxsize)(butter_lowpass.__wrapped__)
+
+
+def cache_info():
+    """ 
+    Hit and miss statistics of the filtered_triangle and Butterworth 
+    coefficient caches, see functools.lru_cache.
+    """
+    info = {
+            'filtered_triangle'        : _filtered_triangle_cached.cache_info(),
+            'filtered_triangle_period' : filtered_triangle_period.cache_info(),
+            'butter_lowpass'           : butter_lowpass.cache_info(),
+            }
+    return info
+
+
+def cache_clear():
+    """ Clears the filtered_triangle and Butterworth coefficient caches. """
+    _filtered_triangle_cached.cache_clear()
+    filtered_triangle_period.cache_clear()
+    butter_lowpass.cache_clear()
+
+
+@profiling.stage('waveform.filtered_triangle_analytic')
+def filtered_triangle_analytic(t, amplitude=1.0, period=1.0, shift=0.0, 
+        cutoff_frequency=1.0, rescale=True, dtype=np.float64):
+    """
+    Computes the lowpass filtered (zero phase delay) triangle waveform and its
+    first and second time derivatives in closed form at the specified time
+    points. 
+
+    This is the continuous time limit of filtered_triangle. The forward
+    backward first order Butterworth filter has impulse response 
+    h(t) = 0.5*wc*exp(-wc*|t|), where wc = 2*pi*(2*cutoff_frequency) matches
+    the digital filter design in filtered_triangle, and its output y for input
+    u satisfies y - y''/wc**2 = u. The filtered waveform and its derivatives 
+    are therefore found by filtering the analytic derivatives of the triangle
+    waveform: on each linear segment the output is the triangle plus a
+    hyperbolic sine correction. Unlike filtered_triangle the result does not
+    depend on the sample spacing, so accurate derivatives are obtained with
+    few samples and without numerical differentiation.
+
+    Parameters
+    ----------
+    t:  array like
+        Input array of time points
+    amplitude: float
+        The amplitude (peak value) of the triangle waveform
+    period: float
+        The period of triangle waveform
+    shift: float
+        The phase shift of the waveform as a fraction of the period.
+    cutoff_frequency: float
+        the cutoff frequency of the lowpass filter
+    rescale: bool
+        whether or not to rescale the amplitude of the waveform
+        so that it is equal to amplitude after filtering (default=True). 
+    dtype: data-type
+        The floating point type of the returned waveform values 
+        (default=np.float64). Values are computed in double precision.
+
+    Returns
+    ------
+    x: array like
+       Output array of filtered triangle waveform values at times t.
+
+    dx: array like
+       Output array of first derivative values at times t.
+
+    ddx: array like
+       Output array of second derivative values at times t.
+
+    """
+    wc = 2.0*np.pi*(2.0*cutoff_frequency)
+    half_period = 0.5*period
+    slope = amplitude/(0.25*period)
+
+    # Position within rising (sign=1) or falling (sign=-1) half of the cycle
+    s = ((t + 0.25*period + shift*period) % period)/period
+    sign = np.where(s > 0.5, -1.0, 1.0)
+    tau = np.where(s > 0.5, s - 0.5, s)*period
+    z = wc*(tau - 0.5*half_period)
+
+    # Triangle plus hyperbolic correction which keeps the slope continuous
+    k = -slope/(wc*np.cosh(0.5*wc*half_period))
+    x = triangle(t, amplitude, period, shift) + sign*k*np.sinh(z)
+    dx = sign*(slope + k*wc*np.cosh(z))
+    ddx = sign*k*wc**2*np.sinh(z)
+
+    if rescale:
+        scale = amplitude/(amplitude + k*np.sinh(0.5*wc*half_period))
+        x, dx, ddx = scale*x, scale*dx, scale*ddx
+    return tuple(a.astype(dtype, copy=False) for a in (x, dx, ddx))
+
+
 
     
 